@@ -5,7 +5,10 @@ from app.routes.relatorio_routes import router as relatorio_router
 from app.routes.orders_routes import router as orders_router
 from app.routes.sku_nicho_routes import router as sku_nicho_router
 from app.routes.websocket_routes import router as websocket_router
-from app.core.container import Container
+from app.routes.status_routes import router as status_router
+from app.routes.events_routes import router as events_router
+from app.core.compression import CompressionMiddleware
+from app.core.container import container
 from app.config.settings import settings
 from app.background_tasks.periodic_report_task import BackgroundTaskService
 from dependency_injector import providers
@@ -23,19 +26,29 @@ logger = logging.getLogger(__name__)
 async def lifespan(app: FastAPI):
     # Startup
     logger.info("Iniciando aplicação FastAPI")
-    app.state.background_task_service.start()
-
-    # Calculate initial report
-    initial_report = app.state.report_service.get_daily_report_data()
-    if initial_report:
-        app.state.current_daily_report = initial_report
+    # Reports computed by other workers are relayed to this worker's clients
+    app.state.report_bus.subscribe(app.state.background_task_service.relay_report)
+    await app.state.report_bus.start()
+    if settings.leader_election_enabled:
+        # Only the worker holding the lease runs the periodic ingestion
+        await app.state.leader_elector.start()
+    else:
+        app.state.background_task_service.start()
+
+    # Calculate initial report (shared snapshot served to new WebSocket clients)
+    if await app.state.report_cache.get():
         logger.info("Relatório inicial calculado")
 
     yield
 
     # Shutdown
     logger.info("Encerrando aplicação FastAPI")
-    app.state.background_task_service.stop()
+    if settings.leader_election_enabled:
+        await app.state.leader_elector.stop()
+    await app.state.background_task_service.stop()
+    await app.state.report_bus.stop()
+    await app.state.container.data_client().aclose()
+    app.state.container.database_writer().close()
     app.state.database_service.close()
 
 
@@ -51,16 +64,22 @@ def create_app() -> FastAPI:
     """
     app = FastAPI(lifespan=lifespan)
 
+    # Large report payloads are compressed off the event loop
+    if settings.compression_enabled:
+        app.add_middleware(CompressionMiddleware, compressor=container.response_compressor())
+
     # Mount static files
     app.mount("/static", StaticFiles(directory="static"), name="static")
 
-    # Initialize dependency container
-    container = Container()
+    # Initialize dependency container (shared with the routes, so singletons
+    # such as the pooled API client exist once per process)
     container.wire(modules=[
         "app.routes.relatorio_routes",
         "app.routes.orders_routes",
         "app.routes.sku_nicho_routes",
         "app.routes.websocket_routes",
+        "app.routes.status_routes",
+        "app.routes.events_routes",
     ])
 
     # Override providers that need app instance
@@ -70,7 +89,20 @@ def create_app() -> FastAPI:
             app=providers.Object(app),
             manager=container.connection_manager(),
             report_service=container.report_service(),
+            data_client=container.data_client(),
+            order_inserter=container.order_inserter(),
+            sync_state=container.sync_state_service(),
+            writer=container.database_writer(),
             update_interval_seconds=settings.report_update_interval,
+            batch_size=settings.ingest_batch_size,
+            fetch_concurrency=settings.pipeline_fetch_concurrency,
+            parse_concurrency=settings.pipeline_parse_concurrency,
+            write_concurrency=settings.pipeline_write_concurrency,
+            queue_size=settings.pipeline_queue_size,
+            scheduler=container.polling_scheduler(),
+            report_cache=container.report_cache(),
+            report_bus=container.report_bus(),
+            order_events=container.order_events(),
         )
     )
 
@@ -78,19 +110,41 @@ def create_app() -> FastAPI:
     database_service = container.database_service()
     database_service.connect()
     database_service.create_tables()
+    container.database_writer().connect()
 
     # Get background task service and store in app state
     background_task_service = container.background_task_service()
     app.state.background_task_service = background_task_service
 
-    # Store container in app state for access if needed
+    # New SKUs get a niche from the rules before the report is rebuilt; the
+    # rules run on the writer thread, whose connection they write on
+    if settings.niche_rules_at_ingest:
+        niche_rules = container.niche_rules()
+        writer = container.database_writer()
+        background_task_service.add_change_listener(
+            lambda changes: writer.run(niche_rules.classify_changes, changes)
+        )
+
+    # The elected worker starts the ingestion; it stops if the lease is lost
+    leader_elector = container.leader_elector()
+    leader_elector.on_elected = background_task_service.start
+    leader_elector.on_demoted = background_task_service.stop
+    app.state.leader_elector = leader_elector
+
+    # Store container and services used by the lifespan in app state
     app.state.container = container
+    app.state.database_service = database_service
+    app.state.report_service = container.report_service()
+    app.state.report_cache = container.report_cache()
+    app.state.report_bus = container.report_bus()
 
     # Include routers
     app.include_router(relatorio_router)
     app.include_router(orders_router)
     app.include_router(sku_nicho_router)
     app.include_router(websocket_router)
+    app.include_router(status_router)
+    app.include_router(events_router)
 
     logger.info("App criado e configurado com sucesso")
     return app
@@ -0,0 +1,50 @@
+"""
+Backfill historical orders from the external API, one day per request.
+
+Days already checkpointed as done in ``sync_state`` are skipped, so an
+interrupted run can simply be started again.
+
+Usage:
+    python -m app.backfill 2024-01-01 2024-03-31 [--concurrency 4] [--rps 2] [--force]
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+
+from app.core.container import container
+
+logger = logging.getLogger(__name__)
+
+
+async def main(args: argparse.Namespace) -> None:
+    database_service = container.database_service()
+    database_service.connect()
+    database_service.create_tables()
+    try:
+        summary = await container.backfill_service().run(
+            args.data_inicio,
+            args.data_fim,
+            force=args.force,
+            concurrency=args.concurrency,
+            requests_per_second=args.rps,
+        )
+        print(json.dumps(summary, ensure_ascii=False, indent=2))
+    finally:
+        await container.data_client().aclose()
+        container.database_writer().close()
+        database_service.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("data_inicio", help="First API day (YYYY-MM-DD)")
+    parser.add_argument("data_fim", help="Last API day (YYYY-MM-DD)")
+    parser.add_argument("--concurrency", type=int, default=None)
+    parser.add_argument(
+        "--rps", type=float, default=None, help="Max requests per second"
+    )
+    parser.add_argument("--force", action="store_true", help="Refetch completed days")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,182 @@
+import asyncio
+import inspect
+import logging
+import os
+import socket
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional
+
+from app.repositories.database_repository import DatabaseWriter
+
+logger = logging.getLogger(__name__)
+
+
+class LeaderElector:
+    """
+    Lease-based leader election over the ``leader_lease`` table.
+
+    Every worker tries to take or renew the lease named ``name`` each
+    ``heartbeat_seconds``. The lease is held for ``lease_seconds``; a worker
+    that stops renewing it (crashed, hung) loses it once it expires and the
+    next worker to try becomes leader. ``on_elected`` / ``on_demoted``
+    (sync or async) run on every transition. Releasing the lease on shutdown
+    lets another worker take over at its next heartbeat.
+
+    With a ``writer`` (``db`` must then be ``writer.database``), every lease
+    statement runs on the writer thread: the heartbeat neither blocks the
+    event loop nor commits on the connection shared with other services.
+    """
+
+    def __init__(
+        self,
+        db,
+        name: str = "ingestao",
+        lease_seconds: float = 30.0,
+        heartbeat_seconds: float = 10.0,
+        on_elected: Optional[Callable[[], Any]] = None,
+        on_demoted: Optional[Callable[[], Any]] = None,
+        identity: Optional[str] = None,
+        clock: Callable[[], float] = time.time,
+        writer: Optional[DatabaseWriter] = None,
+    ):
+        if heartbeat_seconds >= lease_seconds:
+            raise ValueError("heartbeat_seconds deve ser menor que lease_seconds")
+        self.db = db
+        self.name = name
+        self.lease_seconds = lease_seconds
+        self.heartbeat_seconds = heartbeat_seconds
+        self.on_elected = on_elected
+        self.on_demoted = on_demoted
+        self.identity = (
+            identity or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        )
+        self.clock = clock
+        self.writer = writer
+        self.current_holder: Optional[str] = None
+        self.is_leader = False
+        self.elected_at: Optional[datetime] = None
+        self.transitions = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def try_acquire(self) -> bool:
+        """Take the lease if it is free or expired, or renew it if ours."""
+        now = self.clock()
+        cursor = self.db.conn.cursor()
+        # One statement, so two workers cannot both win the same expired lease
+        cursor.execute(
+            """
+            INSERT INTO leader_lease (name, holder, expires_at, acquired_at)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT(name) DO UPDATE SET
+                holder = excluded.holder,
+                expires_at = excluded.expires_at,
+                acquired_at = CASE WHEN leader_lease.holder = excluded.holder
+                                   THEN leader_lease.acquired_at
+                                   ELSE excluded.acquired_at END
+            WHERE leader_lease.holder = excluded.holder OR leader_lease.expires_at < ?
+            """,
+            (self.name, self.identity, now + self.lease_seconds, now, now),
+        )
+        self.db.conn.commit()
+        self.current_holder = self.holder()
+        return self.current_holder == self.identity
+
+    def holder(self) -> Optional[str]:
+        cursor = self.db.conn.cursor()
+        cursor.execute(
+            "SELECT holder, expires_at FROM leader_lease WHERE name = ?", (self.name,)
+        )
+        row = cursor.fetchone()
+        if row is None or row[1] < self.clock():
+            return None
+        return row[0]
+
+    def release(self) -> None:
+        cursor = self.db.conn.cursor()
+        cursor.execute(
+            "DELETE FROM leader_lease WHERE name = ? AND holder = ?",
+            (self.name, self.identity),
+        )
+        self.db.conn.commit()
+
+    async def _run(self, fn: Callable[[], Any]) -> Any:
+        if self.writer is not None:
+            return await self.writer.run(fn)
+        return fn()
+
+    async def _run_callback(self, callback: Optional[Callable[[], Any]]) -> None:
+        if callback is None:
+            return
+        try:
+            result = callback()
+            if inspect.isawaitable(result):
+                await result
+        except Exception:
+            logger.exception("Erro ao executar a transição de liderança")
+
+    async def heartbeat(self) -> bool:
+        """Try to take or renew the lease once and run the transition callbacks."""
+        try:
+            leader = await self._run(self.try_acquire)
+        except Exception:
+            # Without the database we cannot prove we still hold the lease
+            logger.exception("Erro ao renovar a liderança")
+            leader = False
+        if leader and not self.is_leader:
+            self.is_leader = True
+            self.elected_at = datetime.now()
+            self.transitions += 1
+            logger.info(f"Worker {self.identity} eleito líder de '{self.name}'")
+            await self._run_callback(self.on_elected)
+        elif not leader and self.is_leader:
+            self.is_leader = False
+            self.elected_at = None
+            self.transitions += 1
+            logger.warning(
+                f"Worker {self.identity} perdeu a liderança de '{self.name}'"
+            )
+            await self._run_callback(self.on_demoted)
+        return leader
+
+    async def _loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.heartbeat_seconds)
+            await self.heartbeat()
+
+    async def start(self) -> None:
+        """Run a first election right away, then keep heartbeating in the background."""
+        if self._task is None:
+            await self.heartbeat()
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        """Stop heartbeating and hand the lease over."""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self.is_leader:
+            self.is_leader = False
+            await self._run_callback(self.on_demoted)
+        try:
+            await self._run(self.release)
+        except Exception:
+            logger.exception("Erro ao liberar a liderança")
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "lider": self.is_leader,
+            "worker": self.identity,
+            # As of the last heartbeat
+            "lider_atual": self.current_holder,
+            "eleito_em": (
+                self.elected_at.isoformat(timespec="seconds")
+                if self.elected_at
+                else None
+            ),
+            "transicoes": self.transitions,
+            "lease_s": self.lease_seconds,
+            "heartbeat_s": self.heartbeat_seconds,
+        }
@@ -1,104 +1,473 @@
 import asyncio
+import inspect
 import logging
+from dataclasses import dataclass, field
 from datetime import datetime, timedelta
-from app.core.connection_manager import ConnectionManager
-from app.services.data_service import Data
-from app.services.data_parser_service import DataParser
-from app.services.order_service import OrderInserter
-from app.config.settings import settings
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+from app.background_tasks.pipeline import PipelineStage
+from app.background_tasks.scheduler import AdaptivePollingScheduler
+from app.repositories.database_repository import DatabaseWriter
+from app.services.data_service import AsyncDataClient, PageBreak, current_api_day
+from app.services.data_parser_service import StreamingOrderParser
+from app.services.order_events import OrderEventHub
+from app.services.order_service import (
+    ChangeSet,
+    ChangeSummary,
+    OrderColumns,
+    OrderInserter,
+)
+from app.services.report_bus import ReportBus
+from app.services.report_cache import DailyReportCache
+from app.services.sync_state_service import SyncStateService
 
 logger = logging.getLogger(__name__)
 
 
+@dataclass
+class IngestCycle:
+    """One update cycle: the API days to sync and the aggregated outcome."""
+
+    done: asyncio.Future
+    pending: int
+    report: bool = True
+    started_at: float = 0.0
+    changes: ChangeSummary = field(default_factory=ChangeSummary)
+    errors: Dict[str, str] = field(default_factory=dict)
+
+
+@dataclass(eq=False)
+class IngestJob:
+    """One API day of a cycle, as it moves through fetch, parse and write."""
+
+    cycle: IngestCycle
+    day: str
+    closed: bool = False
+    parser: StreamingOrderParser = field(default_factory=StreamingOrderParser)
+    pending: List[Any] = field(default_factory=list)
+    changes: ChangeSummary = field(default_factory=ChangeSummary)
+    error: Optional[BaseException] = None
+
+
 class BackgroundTaskService:
-    def __init__(self, app, manager, report_service, update_interval_seconds=300):
+    """
+    Periodically syncs orders from the API and broadcasts the daily report.
+
+    Each cycle flows through pipeline stages connected by bounded queues:
+    fetcher (streams each API day) → parser (order batches) → writer
+    (incremental upsert, sync watermarks) → report (recompute when something
+    changed) → broadcaster. A slow API call no longer blocks writes of a day
+    already fetched, and full queues hold back the stages feeding them.
+    ``order_inserter`` and ``sync_state`` must be built on ``writer.database``:
+    their calls run on the writer thread, so a slow insert overlaps with
+    fetching and broadcasting instead of stalling the event loop.
+    """
+
+    STAGES = ("fetcher", "parser", "writer", "report", "broadcaster")
+
+    def __init__(
+        self,
+        app,
+        manager,
+        report_service,
+        data_client: AsyncDataClient,
+        order_inserter: OrderInserter,
+        sync_state: SyncStateService,
+        writer: DatabaseWriter,
+        update_interval_seconds=300,
+        batch_size=1000,
+        fetch_concurrency=2,
+        parse_concurrency=1,
+        write_concurrency=1,
+        queue_size=100,
+        scheduler: Optional[AdaptivePollingScheduler] = None,
+        report_cache: Optional[DailyReportCache] = None,
+        report_bus: Optional[ReportBus] = None,
+        order_events: Optional[OrderEventHub] = None,
+    ):
         self.app = app
         self.manager = manager
         self.report_service = report_service
+        self.data_client = data_client
+        self.order_inserter = order_inserter
+        self.sync_state = sync_state
+        self.writer = writer
         self.update_interval_seconds = update_interval_seconds
-        self.current_daily_report = None
+        self.batch_size = batch_size
+        self.fetch_concurrency = fetch_concurrency
+        self.parse_concurrency = parse_concurrency
+        self.write_concurrency = write_concurrency
+        self.queue_size = queue_size
+        # Without a scheduler, cycles keep the fixed update interval
+        self.scheduler = scheduler or AdaptivePollingScheduler.fixed(
+            update_interval_seconds
+        )
+        self.report_cache = report_cache or DailyReportCache(report_service)
+        self.report_bus = report_bus
+        self.order_events = order_events
+        self.reports_relayed = 0
+        self.last_changes = ChangeSummary()
+        self.cycles_completed = 0
+        self.last_cycle: Dict[str, Any] = {}
+        self._change_listeners: List[Callable[[ChangeSet], Any]] = []
+        self._stages: Dict[str, PipelineStage] = {}
+        self._pipeline_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._open_cycles: List[IngestCycle] = []
         self._task = None
 
-    async def _periodic_update_and_broadcast(self):
-        logger.info("Iniciando tarefa periódica de atualização e broadcast")
-        while True:
+    @property
+    def current_daily_report(self) -> Optional[Dict[str, Any]]:
+        snapshot = self.report_cache.snapshot
+        return snapshot.report if snapshot else None
+
+    @current_daily_report.setter
+    def current_daily_report(self, report: Optional[Dict[str, Any]]) -> None:
+        self.report_cache.publish(report)
+
+    def add_change_listener(self, callback: Callable[[ChangeSet], Any]) -> None:
+        """Register a (sync or async) callback that receives each written batch's ChangeSet."""
+        self._change_listeners.append(callback)
+
+    @staticmethod
+    def _current_api_day() -> datetime:
+        return current_api_day()
+
+    def _days_to_sync(self) -> List[Tuple[str, bool]]:
+        """
+        The current API day and, once per day, the previous one.
+
+        The previous day is refetched a last time after it ends so late orders
+        and status changes are captured; its watermark is then marked closed
+        and it is not fetched again.
+        """
+        api_day = self._current_api_day()
+        data_inicio = api_day.strftime("%Y-%m-%d")
+        dia_anterior = (api_day - timedelta(days=1)).strftime("%Y-%m-%d")
+        logger.info(f"Data ajustada para requisição: {data_inicio}")
+
+        days = []
+        if not self.sync_state.is_closed(dia_anterior):
+            logger.info(f"Fechando sincronização do dia {dia_anterior}")
+            days.append((dia_anterior, True))
+        days.append((data_inicio, False))
+        return days
+
+    # --- Pipeline stages -------------------------------------------------
+
+    async def _fetch_stage(self, job: IngestJob) -> None:
+        parser = self._stages["parser"]
+        try:
+            async for chunk in self.data_client.stream_sells(job.day):
+                if job.error is not None:
+                    break
+                await parser.put((job, chunk))
+        except Exception as e:
+            job.error = e
+        finally:
+            await parser.put((job, None))
+
+    async def _parse_stage(
+        self, item: Tuple[IngestJob, Union[bytes, PageBreak, None]]
+    ) -> None:
+        job, chunk = item
+        writer = self._stages["writer"]
+        # None ends the job's stream, PAGE_BREAK ends one page of it
+        flush = chunk is None or isinstance(chunk, PageBreak)
+        if job.error is None:
             try:
-                logger.info("Executando ciclo de atualização: obtendo pedidos...")
-                # 1. Update Orders (Call to external API and DB insertion)
+                if chunk is None or isinstance(chunk, PageBreak):
+                    job.pending.extend(job.parser.close_raw())
+                else:
+                    job.pending.extend(job.parser.feed_raw(chunk))
+                while len(job.pending) >= self.batch_size or (flush and job.pending):
+                    batch = job.pending[: self.batch_size]
+                    del job.pending[: self.batch_size]
+                    await writer.put((job, job.parser.to_columns(batch)))
+                if isinstance(chunk, PageBreak):
+                    job.parser = StreamingOrderParser()
+            except Exception as e:
+                job.error = e
+                job.pending.clear()
+        if chunk is None:
+            await writer.put((job, None))
+
+    async def _write_stage(
+        self, item: Tuple[IngestJob, Optional[OrderColumns]]
+    ) -> None:
+        job, batch = item
+        if batch is not None:
+            if job.error is None:
                 try:
-                    logger.info("Starting order update from external API.")
-                    # Adjust for API timezone (UTC, BRT is UTC-3)
-                    # If hour < 21, send today, else tomorrow
-                    agora = datetime.now()
-                    if agora.hour < 21:
-                        data_ajustada = agora
-                    else:
-                        data_ajustada = agora + timedelta(days=1)
-                    data_inicio = data_fim = data_ajustada.strftime("%Y-%m-%d")
-                    logger.info(f"Data ajustada para requisição: {data_inicio}")
-                    url = f"https://app.arpcommerce.com.br/sells?r={data_inicio}"
-                    logger.info(f"Fazendo requisição para URL: {url}")
-                    session_token = settings.api_session_token
-                    headers = {"session": session_token}
-
-                    data_obj = Data(url, headers)
-                    raw_json = data_obj.get_data()
-                    logger.info(
-                        f"Requisição concluída. Dados brutos obtidos: {len(raw_json)} registros"
+                    batch_changes = await self.writer.run(
+                        self.order_inserter.insert_changed_columns, batch
                     )
+                except Exception as e:
+                    job.error = e
+                    return
+                # The batch's rows go downstream here; only its summary is kept
+                job.changes.merge(batch_changes.summary())
+                await self._publish_order_events(batch_changes)
+                await self._notify_change_listeners(batch_changes)
+            return
 
-                    parser = DataParser(raw_json)
-                    pedidos = parser.parse_orders()
-                    logger.info(f"Pedidos parseados: {len(pedidos)} pedidos")
+        cycle = job.cycle
+        if job.error is None:
+            try:
+                await self.writer.run(
+                    self.sync_state.record_sync,
+                    job.day,
+                    job.changes.seen,
+                    len(job.changes),
+                    job.changes.max_payment_date(),
+                    closed=job.closed,
+                )
+                logger.info(
+                    f"Requisição concluída para {job.day}: {job.changes.seen} pedidos recebidos"
+                )
+            except Exception as e:
+                job.error = e
+        if job.error is not None:
+            logger.error(f"Failed to update orders for {job.day}: {job.error}")
+            cycle.errors[job.day] = str(job.error)
+        # Orders already written before a failure still count as changes
+        cycle.changes.merge(job.changes)
+        cycle.pending -= 1
+        if cycle.pending == 0:
+            await self._stages["report"].put(cycle)
 
-                    # Database insertion
-                    self.app.state.container.order_inserter().insert_orders(pedidos)
-                    logger.info(
-                        f"Update cycle: {len(pedidos)} orders inserted/updated in DB."
-                    )
-                except Exception as e:
-                    logger.error(f"Failed to update orders from external API: {e}")
-                    # Continues to report calculation, which can use old data
-
-                # 2. Calculate Daily Report
-                relatorio = self.report_service.get_daily_report_data()
-
-                # 3. Store and Broadcast
-                if (
-                    relatorio
-                    and relatorio.get("status") == "sucesso"
-                    and relatorio != self.current_daily_report
-                ):
-                    self.current_daily_report = relatorio
-                    await self.manager.broadcast(
-                        {"tipo": "relatorio_diario", "dados": relatorio}
-                    )
-                    logger.info(
-                        "New daily report calculated and broadcasted via WebSocket."
-                    )
-                elif relatorio and relatorio.get("status") == "sucesso":
-                    logger.info(
-                        "Daily report calculated, but no changes since last check. No broadcast."
-                    )
-                else:
-                    logger.warning(
-                        "Daily report could not be calculated (no data or error). No broadcast."
-                    )
+    async def _report_stage(self, cycle: IngestCycle) -> None:
+        relatorio = None
+        try:
+            changes = cycle.changes
+            logger.info(
+                f"Update cycle: {len(changes)} of {changes.seen} orders new or changed."
+            )
+            self.last_changes = changes
+
+            if not cycle.report:
+                pass
+            elif not changes and not self._report_is_stale():
+                logger.info("No new or changed orders. Daily report not recalculated.")
+            else:
+                # Off the event loop, so websocket and HTTP handlers keep running
+                relatorio = await asyncio.to_thread(
+                    self.report_service.get_daily_report_data
+                )
+        except Exception:
+            logger.exception("Erro ao calcular o relatório diário")
+        finally:
+            await self._stages["broadcaster"].put((cycle, relatorio))
+
+    async def _broadcast_stage(self, item: Tuple[IngestCycle, Optional[dict]]) -> None:
+        cycle, relatorio = item
+        try:
+            if relatorio is None:
+                return
+            if (
+                relatorio.get("status") == "sucesso"
+                and relatorio != self.current_daily_report
+            ):
+                snapshot = self.report_cache.publish(relatorio)
+                await self.manager.broadcast_report(snapshot, "relatorio_diario")
+                logger.info(
+                    "New daily report calculated and broadcasted via WebSocket."
+                )
+                await self._publish_to_bus(relatorio)
+            elif relatorio.get("status") == "sucesso":
+                logger.info(
+                    "Daily report calculated, but no changes since last check. No broadcast."
+                )
+            else:
+                logger.warning(
+                    "Daily report could not be calculated (no data or error). No broadcast."
+                )
+        finally:
+            self._finish_cycle(cycle)
+
+    async def _publish_order_events(self, changes: ChangeSet) -> None:
+        # Per-order events go out as each batch is written, before the report
+        if self.order_events is None or not changes:
+            return
+        try:
+            await self.order_events.publish(changes)
+        except Exception:
+            logger.exception("Erro ao publicar eventos de pedidos")
+
+    async def _publish_to_bus(self, relatorio: Dict[str, Any]) -> None:
+        if self.report_bus is None:
+            return
+        try:
+            await self.report_bus.publish(relatorio)
+        except Exception:
+            logger.exception("Erro ao publicar o relatório no barramento")
+
+    async def relay_report(self, relatorio: Dict[str, Any]) -> None:
+        """Publish and broadcast a report computed by another worker (ReportBus handler)."""
+        if (
+            relatorio.get("status") != "sucesso"
+            or relatorio == self.current_daily_report
+        ):
+            return
+        snapshot = self.report_cache.publish(relatorio)
+        await self.manager.broadcast_report(snapshot, "relatorio_diario")
+        self.reports_relayed += 1
+        logger.info("Relatório recebido de outro worker repassado via WebSocket.")
+
+    # --- Pipeline lifecycle ----------------------------------------------
 
+    def _finish_cycle(self, cycle: IngestCycle) -> None:
+        loop = asyncio.get_running_loop()
+        self.cycles_completed += 1
+        self.last_cycle = {
+            "duracao_s": round(loop.time() - cycle.started_at, 4),
+            "pedidos_recebidos": cycle.changes.seen,
+            "pedidos_alterados": len(cycle.changes),
+            "erros": dict(cycle.errors),
+            "concluido_em": datetime.now().isoformat(timespec="seconds"),
+        }
+        if cycle in self._open_cycles:
+            self._open_cycles.remove(cycle)
+        if not cycle.done.done():
+            cycle.done.set_result(cycle.changes)
+
+    def _ensure_pipeline(self) -> None:
+        # Queues and workers belong to the loop that created them
+        loop = asyncio.get_running_loop()
+        if self._stages and self._pipeline_loop is loop:
+            return
+        self._stages = {
+            "fetcher": PipelineStage(
+                "fetcher",
+                self._fetch_stage,
+                concurrency=self.fetch_concurrency,
+                maxsize=self.queue_size,
+            ),
+            "parser": PipelineStage(
+                "parser",
+                self._parse_stage,
+                concurrency=self.parse_concurrency,
+                maxsize=self.queue_size,
+                key=lambda item: item[0].day,
+            ),
+            "writer": PipelineStage(
+                "writer",
+                self._write_stage,
+                concurrency=self.write_concurrency,
+                maxsize=self.queue_size,
+                key=lambda item: item[0].day,
+            ),
+            "report": PipelineStage(
+                "report", self._report_stage, maxsize=self.queue_size
+            ),
+            "broadcaster": PipelineStage(
+                "broadcaster", self._broadcast_stage, maxsize=self.queue_size
+            ),
+        }
+        for stage in self._stages.values():
+            stage.start()
+        self._pipeline_loop = loop
+        self._open_cycles = []
+
+    async def run_cycle(self, report: bool = True) -> ChangeSummary:
+        """
+        Push one update cycle through the pipeline and wait for it to finish.
+
+        Args:
+            report: Recompute and broadcast the daily report when orders changed.
+
+        Returns:
+            The ChangeSummary of orders written during the cycle.
+        """
+        self._ensure_pipeline()
+        loop = asyncio.get_running_loop()
+        days = await self.writer.run(self._days_to_sync)
+        cycle = IngestCycle(
+            done=loop.create_future(),
+            pending=len(days),
+            report=report,
+            started_at=loop.time(),
+        )
+        self._open_cycles.append(cycle)
+        for day, closed in days:
+            await self._stages["fetcher"].put(IngestJob(cycle, day, closed))
+        return await cycle.done
+
+    def pipeline_status(self) -> Dict[str, Any]:
+        """Per-stage queue depth, throughput and latency, plus the last cycle."""
+        return {
+            "em_execucao": self._task is not None and not self._task.done(),
+            "agendamento": self.scheduler.snapshot(),
+            "relatorio": self.report_cache.status(),
+            "barramento": (
+                {**self.report_bus.status(), "repassados": self.reports_relayed}
+                if self.report_bus is not None
+                else None
+            ),
+            "eventos_pedidos": (
+                self.order_events.status() if self.order_events is not None else None
+            ),
+            "ciclos_concluidos": self.cycles_completed,
+            "ciclos_em_andamento": len(self._open_cycles),
+            "ultimo_ciclo": self.last_cycle,
+            "estagios": {
+                name: self._stages[name].snapshot()
+                for name in self.STAGES
+                if name in self._stages
+            },
+        }
+
+    async def _notify_change_listeners(self, changes: ChangeSet) -> None:
+        if not changes:
+            return
+        for callback in self._change_listeners:
+            try:
+                result = callback(changes)
+                if inspect.isawaitable(result):
+                    await result
+            except Exception:
+                logger.exception("Erro ao notificar consumidor de pedidos alterados")
+
+    def _report_is_stale(self) -> bool:
+        return not self.report_cache.is_fresh()
+
+    async def _periodic_update_and_broadcast(self):
+        logger.info("Iniciando tarefa periódica de atualização e broadcast")
+        while True:
+            try:
+                logger.info("Executando ciclo de atualização: obtendo pedidos...")
+                changes = await self.run_cycle()
+                self.scheduler.record(
+                    len(changes), failed=bool(self.last_cycle["erros"])
+                )
             except Exception as e:
                 logger.exception(
                     "Erro fatal na tarefa periódica de atualização e broadcast"
                 )
+                self.scheduler.record(0, failed=True)
 
-            # 4. Wait for next cycle
-            await asyncio.sleep(self.update_interval_seconds)
+            # Wait for next cycle
+            delay = self.scheduler.next_delay()
+            logger.info(
+                f"Próximo ciclo em {delay:.0f}s (intervalo adaptativo {self.scheduler.interval:.0f}s)"
+            )
+            await asyncio.sleep(delay)
 
     def start(self):
         if self._task is None:
+            self._ensure_pipeline()
             self._task = asyncio.create_task(self._periodic_update_and_broadcast())
             logger.info("Tarefa de atualização periódica iniciada.")
 
-    def stop(self):
+    async def stop(self):
+        """Cancel the periodic loop and every pipeline worker, then wait for them."""
         if self._task:
             self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
             logger.info("Tarefa de atualização periódica cancelada.")
+        for stage in self._stages.values():
+            await stage.stop()
+        for cycle in self._open_cycles:
+            if not cycle.done.done():
+                cycle.done.cancel()
+        self._open_cycles = []
+        self._stages = {}
@@ -0,0 +1,116 @@
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class StageMetrics:
+    """Counters and handler latencies of one pipeline stage."""
+
+    processed: int = 0
+    errors: int = 0
+    busy: int = 0
+    total_latency_s: float = 0.0
+    max_latency_s: float = 0.0
+    last_latency_s: float = 0.0
+
+    def observe(self, latency_s: float) -> None:
+        self.processed += 1
+        self.total_latency_s += latency_s
+        self.last_latency_s = latency_s
+        self.max_latency_s = max(self.max_latency_s, latency_s)
+
+    def snapshot(self) -> Dict[str, Any]:
+        average = self.total_latency_s / self.processed if self.processed else 0.0
+        return {
+            "processados": self.processed,
+            "erros": self.errors,
+            "em_andamento": self.busy,
+            "latencia_media_s": round(average, 4),
+            "latencia_max_s": round(self.max_latency_s, 4),
+            "ultima_latencia_s": round(self.last_latency_s, 4),
+        }
+
+
+class PipelineStage:
+    """
+    A named pool of workers consuming bounded asyncio queues.
+
+    ``put`` blocks while the stage's queue is full, which is what propagates
+    backpressure upstream. With a ``key`` function every worker gets its own
+    queue and items with the same key always reach the same worker, in order;
+    without it all workers share one queue.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        handler: Callable[[Any], Awaitable[None]],
+        concurrency: int = 1,
+        maxsize: int = 100,
+        key: Optional[Callable[[Any], Any]] = None,
+    ):
+        self.name = name
+        self.handler = handler
+        self.concurrency = max(1, concurrency)
+        self.maxsize = maxsize
+        self.key = key
+        self.metrics = StageMetrics()
+        self.queues: List[asyncio.Queue] = [
+            asyncio.Queue(maxsize) for _ in range(self.concurrency if key else 1)
+        ]
+        self._tasks: List[asyncio.Task] = []
+
+    async def put(self, item: Any) -> None:
+        if self.key is None:
+            queue = self.queues[0]
+        else:
+            queue = self.queues[hash(self.key(item)) % len(self.queues)]
+        await queue.put(item)
+
+    def queue_depth(self) -> int:
+        return sum(queue.qsize() for queue in self.queues)
+
+    def start(self) -> None:
+        if self._tasks:
+            return
+        for i in range(self.concurrency):
+            queue = self.queues[i % len(self.queues)]
+            self._tasks.append(
+                asyncio.create_task(self._worker(queue), name=f"{self.name}-{i}")
+            )
+
+    async def _worker(self, queue: asyncio.Queue) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            item = await queue.get()
+            started = loop.time()
+            self.metrics.busy += 1
+            try:
+                await self.handler(item)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                self.metrics.errors += 1
+                logger.exception(f"Erro no estágio '{self.name}' do pipeline")
+            finally:
+                self.metrics.busy -= 1
+                self.metrics.observe(loop.time() - started)
+                queue.task_done()
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            **self.metrics.snapshot(),
+            "workers": self.concurrency,
+            "fila": self.queue_depth(),
+            "capacidade_fila": self.maxsize * len(self.queues),
+        }
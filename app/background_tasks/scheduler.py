@@ -0,0 +1,125 @@
+import random
+from datetime import datetime, time, timedelta
+from typing import Any, Dict, Optional, Tuple
+
+
+def parse_quiet_hours(value: str) -> Optional[Tuple[time, time]]:
+    """Parse ``"HH:MM-HH:MM"`` (may wrap midnight, e.g. ``"23:00-07:00"``); empty disables."""
+    if not value or not value.strip():
+        return None
+    try:
+        start, end = (
+            datetime.strptime(part.strip(), "%H:%M").time() for part in value.split("-")
+        )
+    except ValueError as e:
+        raise ValueError(
+            f"Horário silencioso inválido '{value}', use HH:MM-HH:MM"
+        ) from e
+    return start, end
+
+
+class AdaptivePollingScheduler:
+    """
+    Decide how long to wait before the next update cycle.
+
+    The interval shrinks by ``speedup_factor`` after a cycle that found new or
+    changed orders and grows by ``backoff_factor`` after an idle or failed one,
+    always within ``[min_interval, max_interval]``. During quiet hours the wait
+    is ``max_interval``, but never past the end of the quiet window. A random
+    ``jitter`` fraction spreads instances that would otherwise poll in step.
+    """
+
+    def __init__(
+        self,
+        base_interval: float,
+        min_interval: float,
+        max_interval: float,
+        backoff_factor: float = 2.0,
+        speedup_factor: float = 0.5,
+        jitter: float = 0.1,
+        quiet_hours: Optional[Tuple[time, time]] = None,
+        rng: Optional[random.Random] = None,
+    ):
+        if min_interval > max_interval:
+            raise ValueError("min_interval deve ser menor ou igual a max_interval")
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff_factor = backoff_factor
+        self.speedup_factor = speedup_factor
+        self.jitter = jitter
+        self.quiet_hours = quiet_hours
+        self.rng = rng or random.Random()
+        self.interval = self._clamp(base_interval)
+        self.last_delay: Optional[float] = None
+        self.next_run_at: Optional[datetime] = None
+        self.idle_cycles = 0
+        self.failed_cycles = 0
+
+    @classmethod
+    def fixed(cls, interval: float) -> "AdaptivePollingScheduler":
+        """A scheduler that always waits ``interval`` seconds."""
+        return cls(interval, interval, interval, jitter=0.0)
+
+    def _clamp(self, interval: float) -> float:
+        return min(self.max_interval, max(self.min_interval, interval))
+
+    def record(self, changed: int, failed: bool = False) -> float:
+        """Adapt the interval to a finished cycle's outcome and return it."""
+        if changed:
+            self.idle_cycles = self.failed_cycles = 0
+            self.interval = self._clamp(self.interval * self.speedup_factor)
+        else:
+            if failed:
+                self.failed_cycles += 1
+            else:
+                self.idle_cycles += 1
+            self.interval = self._clamp(self.interval * self.backoff_factor)
+        return self.interval
+
+    def seconds_until_quiet_end(self, now: datetime) -> Optional[float]:
+        """Seconds left in the quiet window, or None when ``now`` is outside it."""
+        if self.quiet_hours is None:
+            return None
+        start, end = self.quiet_hours
+        current = now.time()
+        if start <= end:
+            inside = start <= current < end
+        else:
+            inside = current >= start or current < end
+        if not inside:
+            return None
+        end_at = datetime.combine(now.date(), end)
+        if end_at <= now:
+            end_at += timedelta(days=1)
+        return (end_at - now).total_seconds()
+
+    def next_delay(self, now: Optional[datetime] = None) -> float:
+        """Seconds to sleep before the next cycle; also records ``next_run_at``."""
+        now = now or datetime.now()
+        delay = self.interval
+        quiet_left = self.seconds_until_quiet_end(now)
+        if quiet_left is not None:
+            delay = max(self.min_interval, min(self.max_interval, quiet_left))
+        if self.jitter:
+            delay *= 1 + self.rng.uniform(-self.jitter, self.jitter)
+        delay = max(0.0, delay)
+        self.last_delay = delay
+        self.next_run_at = now + timedelta(seconds=delay)
+        return delay
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "intervalo_atual_s": round(self.interval, 1),
+            "intervalo_min_s": self.min_interval,
+            "intervalo_max_s": self.max_interval,
+            "ultimo_atraso_s": (
+                round(self.last_delay, 1) if self.last_delay is not None else None
+            ),
+            "proximo_ciclo_em": (
+                self.next_run_at.isoformat(timespec="seconds")
+                if self.next_run_at
+                else None
+            ),
+            "ciclos_sem_alteracao": self.idle_cycles,
+            "ciclos_com_erro": self.failed_cycles,
+        }
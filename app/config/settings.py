@@ -2,6 +2,7 @@ from pydantic_settings import BaseSettings
 from pydantic import Field
 import os
 from pathlib import Path
+from app.config.constants import API_BASE_URL
 
 
 class Settings(BaseSettings):
@@ -10,13 +11,76 @@ class Settings(BaseSettings):
 
     # API settings
     api_session_token: str = Field(..., env="API_SESSION_TOKEN")
+    api_base_url: str = Field(default=API_BASE_URL, env="API_BASE_URL")  # point at benchmarks.replay_server for offline runs
+    api_timeout_seconds: float = Field(default=30.0, env="API_TIMEOUT_SECONDS")
+    api_max_connections: int = Field(default=10, env="API_MAX_CONNECTIONS")
+    api_max_keepalive_connections: int = Field(default=5, env="API_MAX_KEEPALIVE_CONNECTIONS")
+    api_max_response_bytes: int = Field(default=50 * 1024 * 1024, env="API_MAX_RESPONSE_BYTES")
+    api_retry_attempts: int = Field(default=3, env="API_RETRY_ATTEMPTS")
+    api_retry_wait_min: float = Field(default=4.0, env="API_RETRY_WAIT_MIN")  # seconds
+    api_retry_wait_max: float = Field(default=10.0, env="API_RETRY_WAIT_MAX")  # seconds
+    api_max_pages: int = Field(default=1000, env="API_MAX_PAGES")  # X-Next-Page pages followed per request
 
     # Application settings
     debug: bool = Field(default=False, env="DEBUG")
     log_level: str = Field(default="INFO", env="LOG_LEVEL")
+    server_host: str = Field(default="127.0.0.1", env="SERVER_HOST")  # used by python -m app.main
+    server_port: int = Field(default=8000, env="SERVER_PORT")
 
     # Background task settings
-    report_update_interval: int = Field(default=3600, env="REPORT_UPDATE_INTERVAL")  # seconds
+    report_update_interval: int = Field(default=3600, env="REPORT_UPDATE_INTERVAL")  # seconds, initial polling interval
+    poll_min_interval: int = Field(default=60, env="POLL_MIN_INTERVAL")  # seconds
+    poll_max_interval: int = Field(default=3600, env="POLL_MAX_INTERVAL")  # seconds
+    poll_backoff_factor: float = Field(default=2.0, env="POLL_BACKOFF_FACTOR")  # interval multiplier after idle/failed cycles
+    poll_speedup_factor: float = Field(default=0.5, env="POLL_SPEEDUP_FACTOR")  # interval multiplier after cycles with changes
+    poll_jitter: float = Field(default=0.1, env="POLL_JITTER")  # +/- fraction of the interval
+    poll_quiet_hours: str = Field(default="", env="POLL_QUIET_HOURS")  # e.g. "00:00-07:00", polls at POLL_MAX_INTERVAL
+
+    # Ingest settings
+    ingest_batch_size: int = Field(default=1000, env="INGEST_BATCH_SIZE")  # orders per DB write while streaming
+    pipeline_fetch_concurrency: int = Field(default=2, env="PIPELINE_FETCH_CONCURRENCY")  # API days fetched at once
+    pipeline_parse_concurrency: int = Field(default=1, env="PIPELINE_PARSE_CONCURRENCY")
+    pipeline_write_concurrency: int = Field(default=1, env="PIPELINE_WRITE_CONCURRENCY")
+    pipeline_queue_size: int = Field(default=100, env="PIPELINE_QUEUE_SIZE")  # items per stage queue before backpressure
+
+    # WebSocket settings
+    ws_max_queue_size: int = Field(default=16, env="WS_MAX_QUEUE_SIZE")  # outbound messages queued per client
+    ws_send_timeout_seconds: float = Field(default=5.0, env="WS_SEND_TIMEOUT_SECONDS")  # slower clients are dropped
+    order_events_buffer_size: int = Field(default=1000, env="ORDER_EVENTS_BUFFER_SIZE")  # recent order events replayed to SSE clients via Last-Event-ID
+    order_events_queue_size: int = Field(default=256, env="ORDER_EVENTS_QUEUE_SIZE")  # pending events per SSE client before it is dropped
+    ws_per_message_deflate: bool = Field(default=False, env="WS_PER_MESSAGE_DEFLATE")  # uvicorn's permessage-deflate; off since gzip frames are already compressed
+
+    # Multi-worker settings
+    report_bus_backend: str = Field(default="memoria", env="REPORT_BUS_BACKEND")  # memoria (single worker), sqlite or redis
+    report_bus_poll_interval: float = Field(default=1.0, env="REPORT_BUS_POLL_INTERVAL")  # seconds, sqlite backend
+    report_bus_redis_url: str = Field(default="redis://localhost:6379/0", env="REPORT_BUS_REDIS_URL")
+    report_bus_channel: str = Field(default="arpsys:relatorio_diario", env="REPORT_BUS_CHANNEL")  # redis backend
+    leader_election_enabled: bool = Field(default=False, env="LEADER_ELECTION_ENABLED")  # turn on with several workers: only the leader runs the periodic ingestion
+    leader_lease_seconds: float = Field(default=30.0, env="LEADER_LEASE_SECONDS")  # failover time after a leader dies
+    leader_heartbeat_seconds: float = Field(default=10.0, env="LEADER_HEARTBEAT_SECONDS")
+
+    # SKU/niche import settings
+    sku_import_chunk_size: int = Field(default=5000, env="SKU_IMPORT_CHUNK_SIZE")  # rows validated and upserted per transaction
+    niche_rules_at_ingest: bool = Field(default=True, env="NICHE_RULES_AT_INGEST")  # new SKUs get a niche from the rules as orders are ingested
+    sku_import_max_errors: int = Field(default=1000, env="SKU_IMPORT_MAX_ERRORS")  # rejected rows listed in the response
+
+    # Order search settings
+    order_search_rank_window: int = Field(default=5000, env="ORDER_SEARCH_RANK_WINDOW")  # newest matches ranked by /orders/busca; relevance pages stop there
+
+    # Compression settings
+    compression_enabled: bool = Field(default=True, env="COMPRESSION_ENABLED")  # gzip/brotli HTTP responses for clients that accept them
+    compression_minimum_size: int = Field(default=1024, env="COMPRESSION_MINIMUM_SIZE")  # bytes; smaller bodies are sent as is
+    compression_gzip_level: int = Field(default=6, env="COMPRESSION_GZIP_LEVEL")  # 1 (fastest) to 9 (smallest)
+    compression_brotli_quality: int = Field(default=4, env="COMPRESSION_BROTLI_QUALITY")  # 0 to 11, needs pip install brotli
+
+    # Backfill settings
+    backfill_concurrency: int = Field(default=4, env="BACKFILL_CONCURRENCY")
+    backfill_requests_per_second: float = Field(default=2.0, env="BACKFILL_REQUESTS_PER_SECOND")
+
+    # ML settings
+    ml_model_partition: str = Field(default="global", env="ML_MODEL_PARTITION")  # global, nicho or store
+    ml_training_workers: int = Field(default=0, env="ML_TRAINING_WORKERS")  # 0 = one per CPU
+    ml_partition_min_samples: int = Field(default=200, env="ML_PARTITION_MIN_SAMPLES")
 
     class Config:
         env_file = ".env"
@@ -0,0 +1,235 @@
+import asyncio
+import gzip
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Tuple
+
+from starlette.datastructures import Headers, MutableHeaders
+
+try:
+    import brotli
+except ImportError:  # optional: without it responses are only gzipped
+    brotli = None
+
+ENCODING_BROTLI = "br"
+ENCODING_GZIP = "gzip"
+
+# Content types worth compressing (JSON reports, the dashboard's assets)
+COMPRESSIBLE_TYPES = (
+    "application/json",
+    "application/javascript",
+    "text/",
+    "image/svg+xml",
+)
+
+# Bodies up to this size gzip in about half a millisecond, so they are
+# compressed inline; larger ones (a month-long relatorio_flex takes ~160 ms)
+# are compressed in a worker thread, keeping the event loop responsive
+INLINE_MAX_BYTES = 32 * 1024
+
+
+def supported_encodings() -> Tuple[str, ...]:
+    """Encodings this server can produce, most preferred first."""
+    if brotli is not None:
+        return (ENCODING_BROTLI, ENCODING_GZIP)
+    return (ENCODING_GZIP,)
+
+
+@dataclass
+class EncodingMetrics:
+    """Counters of one content coding."""
+
+    respostas: int = 0
+    servidas_do_cache: int = 0
+    bytes_originais: int = 0
+    bytes_enviados: int = 0
+    cpu_s: float = 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        economia = self.bytes_originais - self.bytes_enviados
+        return {
+            "respostas": self.respostas,
+            "servidas_do_cache": self.servidas_do_cache,
+            "bytes_originais": self.bytes_originais,
+            "bytes_enviados": self.bytes_enviados,
+            "bytes_economizados": economia,
+            "taxa_compressao": (
+                round(self.bytes_originais / self.bytes_enviados, 2)
+                if self.bytes_enviados
+                else None
+            ),
+            "cpu_ms": round(self.cpu_s * 1000, 1),
+        }
+
+
+class ResponseCompressor:
+    """
+    Negotiates and applies HTTP response compression, and keeps its metrics.
+
+    Shared by ``CompressionMiddleware`` and by routes that serve
+    precompressed bodies (the daily report snapshot), so both honour the
+    same levels and threshold and add up in ``/status/compressao``. CPU time
+    is measured on the compressing thread, so it is the cost of compression
+    alone even when several responses are compressed at once.
+    """
+
+    def __init__(
+        self, minimum_size: int = 1024, gzip_level: int = 6, brotli_quality: int = 4
+    ):
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self._metrics = {
+            encoding: EncodingMetrics() for encoding in supported_encodings()
+        }
+        self._lock = threading.Lock()
+
+    def negotiate(self, accept_encoding: Optional[str]) -> Optional[str]:
+        """Best supported encoding of an ``Accept-Encoding`` header, if any."""
+        if not accept_encoding:
+            return None
+        accepted: Dict[str, float] = {}
+        for item in accept_encoding.split(","):
+            name, _, params = item.partition(";")
+            quality = 1.0
+            params = params.strip()
+            if params.startswith("q="):
+                try:
+                    quality = float(params[2:])
+                except ValueError:
+                    quality = 0.0
+            accepted[name.strip().lower()] = quality
+        best: Optional[Tuple[str, float]] = None
+        for encoding in supported_encodings():
+            quality = accepted.get(encoding, accepted.get("*", 0.0))
+            if quality > 0 and (best is None or quality > best[1]):
+                best = (encoding, quality)
+        return best[0] if best else None
+
+    def accepts(self, status: int, headers: Headers) -> bool:
+        """Whether a response may be compressed, judging by its status and headers."""
+        # A byte range is a slice of the identity body: compressing it would
+        # hand the client bytes its Content-Range does not describe
+        if status in (204, 206, 304) or "content-encoding" in headers:
+            return False
+        if "content-range" in headers:
+            return False
+        content_type = headers.get("content-type", "")
+        return content_type.startswith(
+            COMPRESSIBLE_TYPES
+        ) and not content_type.startswith("text/event-stream")
+
+    def compress(self, data: bytes, encoding: str) -> bytes:
+        """Compress ``data`` with ``encoding`` on the calling thread."""
+        start = time.thread_time()
+        if encoding == ENCODING_BROTLI:
+            compressed = brotli.compress(data, quality=self.brotli_quality)
+        else:
+            compressed = gzip.compress(data, self.gzip_level, mtime=0)
+        cpu_s = time.thread_time() - start
+        with self._lock:
+            metrics = self._metrics[encoding]
+            metrics.respostas += 1
+            metrics.bytes_originais += len(data)
+            metrics.bytes_enviados += len(compressed)
+            metrics.cpu_s += cpu_s
+        return compressed
+
+    async def compress_async(self, data: bytes, encoding: str) -> bytes:
+        """``compress`` without blocking the event loop on large bodies."""
+        if len(data) <= INLINE_MAX_BYTES:
+            return self.compress(data, encoding)
+        return await asyncio.to_thread(self.compress, data, encoding)
+
+    def record_cached(self, encoding: str, original: int, sent: int) -> None:
+        """Count a precompressed body served again, at no CPU cost."""
+        with self._lock:
+            metrics = self._metrics[encoding]
+            metrics.servidas_do_cache += 1
+            metrics.bytes_originais += original
+            metrics.bytes_enviados += sent
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "tamanho_minimo": self.minimum_size,
+                "nivel_gzip": self.gzip_level,
+                "qualidade_brotli": (
+                    self.brotli_quality if brotli is not None else None
+                ),
+                "codificacoes": {
+                    encoding: metrics.as_dict()
+                    for encoding, metrics in self._metrics.items()
+                },
+            }
+
+
+class CompressionMiddleware:
+    """
+    ASGI middleware compressing responses with brotli or gzip.
+
+    Only complete bodies are compressed: streamed responses (SSE, large static
+    files) and responses that already carry a ``Content-Encoding`` pass
+    through untouched, as do bodies below the compressor's minimum size.
+    Strong ETags are weakened, since the encoded bytes differ from the
+    representation they were computed for.
+    """
+
+    def __init__(self, app, compressor: ResponseCompressor):
+        self.app = app
+        self.compressor = compressor
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = self.compressor.negotiate(
+            Headers(scope=scope).get("accept-encoding")
+        )
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message: Optional[Dict[str, Any]] = None
+        passthrough = False
+
+        async def send_compressed(message):
+            nonlocal start_message, passthrough
+            if passthrough:
+                await send(message)
+                return
+            if message["type"] == "http.response.start":
+                if not self.compressor.accepts(
+                    message["status"], Headers(raw=message["headers"])
+                ):
+                    # Sent right away: SSE clients must not wait for a first event
+                    passthrough = True
+                    await send(message)
+                    return
+                start_message = message
+                return
+            initial, start_message = start_message, None
+            passthrough = True
+            body = message.get("body", b"")
+            if (
+                message["type"] != "http.response.body"
+                or message.get("more_body", False)
+                or len(body) < self.compressor.minimum_size
+            ):
+                await send(initial)
+                await send(message)
+                return
+            compressed = await self.compressor.compress_async(body, encoding)
+            headers = MutableHeaders(raw=list(initial["headers"]))
+            initial["headers"] = headers.raw
+            headers["Content-Encoding"] = encoding
+            headers["Content-Length"] = str(len(compressed))
+            headers.add_vary_header("Accept-Encoding")
+            etag = headers.get("etag")
+            if etag and not etag.startswith("W/"):
+                headers["ETag"] = f"W/{etag}"
+            await send(initial)
+            await send({"type": "http.response.body", "body": compressed})
+
+        await self.app(scope, receive, send_compressed)
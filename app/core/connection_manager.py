@@ -1,40 +1,429 @@
+import asyncio
+import gzip
+import json
 import logging
+from collections import deque
+from dataclasses import dataclass, field
 from fastapi import WebSocket
-from typing import List, Dict, Any
+from typing import Any, Callable, Deque, Dict, Hashable, List, Optional, Tuple, Union
+
+try:
+    import msgpack
+except ImportError:  # optional: only needed by clients that ask for ?formato=msgpack
+    msgpack = None
+
+COMPRESSION_GZIP = "gzip"
+
+FORMAT_JSON = "json"
+FORMAT_COLUMNAR = "colunar"
+FORMAT_MSGPACK = "msgpack"
+
+# Keys of a list of records rewritten as columns by ``to_columnar``
+COLUMNS_KEY = "$colunas"
+ROWS_KEY = "$linhas"
+
+
+def supported_formats() -> Tuple[str, ...]:
+    formats = (FORMAT_JSON, FORMAT_COLUMNAR)
+    return formats + (FORMAT_MSGPACK,) if msgpack is not None else formats
+
+
+def negotiate_format(requested: Optional[str]) -> str:
+    """First supported format of a comma-separated preference list (default json)."""
+    for formato in (requested or "").split(","):
+        formato = formato.strip().lower()
+        if formato in supported_formats():
+            return formato
+    return FORMAT_JSON
+
+
+def to_columnar(value: Any) -> Any:
+    """
+    Rewrite every list of records sharing the same keys as
+    ``{"$colunas": [keys], "$linhas": [[values], ...]}`` so keys are sent once.
+    """
+    if isinstance(value, dict):
+        return {key: to_columnar(item) for key, item in value.items()}
+    if isinstance(value, list):
+        if len(value) > 1 and all(isinstance(item, dict) for item in value):
+            keys = list(value[0])
+            if all(list(item) == keys for item in value):
+                return {
+                    COLUMNS_KEY: keys,
+                    ROWS_KEY: [
+                        [to_columnar(item[key]) for key in keys] for item in value
+                    ],
+                }
+        return [to_columnar(item) for item in value]
+    return value
+
+
+@dataclass
+class EncodedMessage:
+    """
+    A message serialized once and shared by every recipient.
+
+    ``text`` matches what ``WebSocket.send_json`` would produce. Other frames
+    (columnar JSON, MessagePack, gzip of any of them) are built on first use
+    and cached, so each is produced once per message, not once per client.
+    """
+
+    tipo: Optional[str]
+    text: str
+    message: Optional[Dict[str, Any]] = field(default=None, repr=False)
+    _frames: Dict[Tuple[str, Optional[str]], Union[str, bytes]] = field(
+        default_factory=dict, repr=False
+    )
+
+    @classmethod
+    def encode(cls, message: Dict[str, Any]) -> "EncodedMessage":
+        text = json.dumps(message, separators=(",", ":"), ensure_ascii=False)
+        return cls(message.get("tipo"), text, message)
+
+    def gzipped(self) -> bytes:
+        frame = self.frame(FORMAT_JSON, COMPRESSION_GZIP)
+        # Compressed frames are always binary
+        assert isinstance(frame, bytes)
+        return frame
+
+    def frame(
+        self, formato: str = FORMAT_JSON, compression: Optional[str] = None
+    ) -> Union[str, bytes]:
+        """The message as sent to a client: text for JSON formats, bytes otherwise."""
+        if formato == FORMAT_JSON and compression is None:
+            return self.text
+        key = (formato, compression)
+        if key not in self._frames:
+            if compression == COMPRESSION_GZIP:
+                raw = self.frame(formato)
+                data = raw.encode("utf-8") if isinstance(raw, str) else raw
+                frame: Union[str, bytes] = gzip.compress(data, mtime=0)
+            else:
+                message = self.message
+                if message is None:
+                    message = json.loads(self.text)
+                if formato == FORMAT_MSGPACK:
+                    frame = msgpack.packb(to_columnar(message), use_bin_type=True)
+                else:
+                    frame = json.dumps(
+                        to_columnar(message), separators=(",", ":"), ensure_ascii=False
+                    )
+            self._frames[key] = frame
+        return self._frames[key]
+
+
+@dataclass
+class BroadcastMetrics:
+    """Fan-out counters of a ConnectionManager."""
+
+    broadcasts: int = 0
+    messages_sent: int = 0
+    coalesced: int = 0
+    evictions: int = 0
+    last_fanout_s: float = 0.0
+    last_encode_s: float = 0.0
+    last_message_chars: int = 0
+    total_delivery_s: float = 0.0
+    max_delivery_s: float = 0.0
+    last_delivery_s: float = 0.0
+
+    def observe_delivery(self, latency_s: float) -> None:
+        self.messages_sent += 1
+        self.total_delivery_s += latency_s
+        self.last_delivery_s = latency_s
+        self.max_delivery_s = max(self.max_delivery_s, latency_s)
+
+    def snapshot(self) -> Dict[str, Any]:
+        average = (
+            self.total_delivery_s / self.messages_sent if self.messages_sent else 0.0
+        )
+        return {
+            "broadcasts": self.broadcasts,
+            "mensagens_enviadas": self.messages_sent,
+            "mensagens_agrupadas": self.coalesced,
+            "clientes_removidos": self.evictions,
+            "ultimo_fanout_s": round(self.last_fanout_s, 6),
+            "ultima_serializacao_s": round(self.last_encode_s, 6),
+            "ultima_mensagem_caracteres": self.last_message_chars,
+            "entrega_media_s": round(average, 4),
+            "entrega_max_s": round(self.max_delivery_s, 4),
+            "ultima_entrega_s": round(self.last_delivery_s, 4),
+        }
+
+
+class ClientChannel:
+    """
+    Outbound queue and sender task of one WebSocket client.
+
+    The queue is bounded: when it is full, queued messages of the same
+    ``tipo`` as the new one are dropped in its favour (reports are full
+    snapshots, so only the latest matters). A client whose queue is full of
+    other messages cannot keep up and is evicted by the manager.
+    """
+
+    def __init__(
+        self,
+        websocket: WebSocket,
+        max_queue_size: int,
+        send_timeout_seconds: float,
+        metrics: BroadcastMetrics,
+        compression: Optional[str] = None,
+        formato: str = FORMAT_JSON,
+    ):
+        self.websocket = websocket
+        self.compression = compression
+        self.formato = formato
+        # What the client subscribed to (see app.services.report_subscription)
+        self.subscription: Optional[Hashable] = None
+        self.max_queue_size = max_queue_size
+        self.send_timeout_seconds = send_timeout_seconds
+        self.metrics = metrics
+        self.pending: Deque[Tuple[float, EncodedMessage]] = deque()
+        self.task: Optional[asyncio.Task] = None
+        self._wakeup = asyncio.Event()
+        self._idle = asyncio.Event()
+        self._idle.set()
+
+    def offer(self, message: EncodedMessage, enqueued_at: float) -> bool:
+        """Queue ``message``; False means the client is too far behind to keep."""
+        if len(self.pending) >= self.max_queue_size:
+            kept = deque(item for item in self.pending if item[1].tipo != message.tipo)
+            dropped = len(self.pending) - len(kept)
+            if not dropped:
+                return False
+            self.pending = kept
+            self.metrics.coalesced += dropped
+        self.pending.append((enqueued_at, message))
+        self._idle.clear()
+        self._wakeup.set()
+        return True
+
+    async def run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            while not self.pending:
+                self._idle.set()
+                self._wakeup.clear()
+                await self._wakeup.wait()
+            enqueued_at, message = self.pending.popleft()
+            frame = message.frame(self.formato, self.compression)
+            if isinstance(frame, bytes):
+                send = self.websocket.send_bytes(frame)
+            else:
+                send = self.websocket.send_text(frame)
+            await asyncio.wait_for(send, self.send_timeout_seconds)
+            self.metrics.observe_delivery(loop.time() - enqueued_at)
+
+    async def wait_idle(self) -> None:
+        await self._idle.wait()
+
+    def close(self) -> None:
+        """Stop the sender task and discard whatever is still queued."""
+        if self.task is not None and self.task is not asyncio.current_task():
+            self.task.cancel()
+        self.pending.clear()
+        self._idle.set()
 
 
 class ConnectionManager:
-    def __init__(self, logger: logging.Logger):
+    """
+    Tracks WebSocket clients and fans messages out to them concurrently.
+
+    ``broadcast`` only enqueues: every client has its own bounded queue and
+    sender task, so a slow client delays nobody else. Sends that exceed
+    ``send_timeout_seconds``, fail, or overflow the queue evict the client.
+    """
+
+    def __init__(
+        self,
+        logger: Optional[logging.Logger] = None,
+        max_queue_size: int = 16,
+        send_timeout_seconds: float = 5.0,
+    ):
         self.active_connections: List[WebSocket] = []
-        self.logger = logger
+        self.logger = logger or logging.getLogger(__name__)
+        self.max_queue_size = max_queue_size
+        self.send_timeout_seconds = send_timeout_seconds
+        self.metrics = BroadcastMetrics()
+        self._channels: Dict[WebSocket, ClientChannel] = {}
 
-    async def connect(self, websocket: WebSocket):
+    async def connect(
+        self,
+        websocket: WebSocket,
+        compression: Optional[str] = None,
+        formato: Optional[str] = None,
+    ):
+        """
+        Accept ``websocket``; with ``compression="gzip"`` it receives gzipped
+        binary frames. ``formato`` is a preference list such as
+        ``"msgpack,colunar"``; when given, the first frame is a plain JSON
+        ``{"tipo": "formato", ...}`` naming the format actually used.
+        """
         await websocket.accept()
+        compression = compression if compression == COMPRESSION_GZIP else None
+        negotiated = negotiate_format(formato)
+        if formato is not None:
+            await websocket.send_text(
+                json.dumps(
+                    {
+                        "tipo": "formato",
+                        "formato": negotiated,
+                        "compressao": compression,
+                    }
+                )
+            )
+        channel = ClientChannel(
+            websocket,
+            self.max_queue_size,
+            self.send_timeout_seconds,
+            self.metrics,
+            compression=compression,
+            formato=negotiated,
+        )
+        channel.task = asyncio.create_task(self._run_channel(channel))
+        self._channels[websocket] = channel
         self.active_connections.append(websocket)
         self.logger.info(
             f"Nova conexão WebSocket. Total: {len(self.active_connections)}"
         )
 
     def disconnect(self, websocket: WebSocket):
+        channel = self._channels.pop(websocket, None)
+        if channel is not None:
+            channel.close()
         if websocket in self.active_connections:
             self.active_connections.remove(websocket)
             self.logger.info(
                 f"Conexão WebSocket encerrada. Total: {len(self.active_connections)}"
             )
 
-    async def send_personal_message(self, message: str, websocket: WebSocket):
-        await websocket.send_json(message)
+    async def _run_channel(self, channel: ClientChannel) -> None:
+        try:
+            await channel.run()
+        except asyncio.CancelledError:
+            raise
+        except asyncio.TimeoutError:
+            self._evict(channel, "tempo de envio esgotado")
+        except RuntimeError as e:
+            self.logger.warning(f"Erro ao enviar broadcast para uma conexão: {e}")
+            self._evict(channel, str(e))
+        except Exception as e:
+            self.logger.error(f"Erro inesperado ao enviar broadcast: {e}")
+            self._evict(channel, str(e))
+
+    def _evict(self, channel: ClientChannel, reason: str) -> None:
+        if channel.websocket not in self._channels:
+            return
+        self.metrics.evictions += 1
+        self.logger.warning(f"Cliente WebSocket removido: {reason}")
+        self.disconnect(channel.websocket)
+        # 1013 = try again later; closing must not hold up the caller
+        asyncio.create_task(self._close_quietly(channel.websocket, 1013))
 
-    async def broadcast(self, message: Dict[str, Any]):
+    async def _close_quietly(self, websocket: WebSocket, code: int) -> None:
+        try:
+            await asyncio.wait_for(
+                websocket.close(code=code), self.send_timeout_seconds
+            )
+        except Exception:
+            pass
+
+    async def send_personal_message(
+        self, message: Union[Dict[str, Any], EncodedMessage], websocket: WebSocket
+    ):
+        if not isinstance(message, EncodedMessage):
+            message = EncodedMessage.encode(message)
+        channel = self._channels.get(websocket)
+        if channel is None:
+            await websocket.send_text(message.text)
+        elif not channel.offer(message, asyncio.get_running_loop().time()):
+            self._evict(channel, "fila de envio cheia")
+
+    def set_subscription(
+        self, websocket: WebSocket, subscription: Optional[Hashable]
+    ) -> None:
+        """Record what ``websocket`` subscribed to; None restores the full report."""
+        channel = self._channels.get(websocket)
+        if channel is not None:
+            channel.subscription = subscription
+
+    async def broadcast(self, message: Union[Dict[str, Any], EncodedMessage]):
+        """Serialize ``message`` once and queue the same buffer for every client."""
+        if not isinstance(message, EncodedMessage):
+            message = EncodedMessage.encode(message)
+        await self.broadcast_projected(lambda subscription: message)
+
+    async def broadcast_report(self, snapshot: Any, tipo: str):
+        """Queue ``snapshot`` (a ReportSnapshot) projected for each client's subscription."""
+        await self.broadcast_projected(
+            lambda subscription: snapshot.message(tipo, subscription)
+        )
+
+    async def broadcast_projected(
+        self, render: Callable[[Optional[Hashable]], Optional[EncodedMessage]]
+    ):
+        """
+        Queue ``render(subscription)`` for every client. ``render`` runs once
+        per distinct subscription, so clients that subscribed to the same
+        thing share the same buffer; it returns None when a subscription gets
+        nothing.
+        """
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        groups: Dict[Optional[Hashable], List[ClientChannel]] = {}
+        for channel in self._channels.values():
+            groups.setdefault(channel.subscription, []).append(channel)
+        messages: Dict[Optional[Hashable], Optional[EncodedMessage]] = {}
+        for subscription, channels in groups.items():
+            message = messages[subscription] = render(subscription)
+            if message is None:
+                continue
+            # Build every frame variant this group needs once, before fan-out
+            for variant in {(c.formato, c.compression) for c in channels}:
+                message.frame(*variant)
+        encoded = loop.time()
+        total = 0
+        for subscription, channels in groups.items():
+            message = messages[subscription]
+            if message is None:
+                continue
+            for channel in channels:
+                total += 1
+                if not channel.offer(message, started):
+                    self._evict(channel, "fila de envio cheia")
+        sent = [message for message in messages.values() if message is not None]
+        tipo = sent[0].tipo if sent else None
+        self.metrics.broadcasts += 1
+        self.metrics.last_encode_s = encoded - started
+        self.metrics.last_fanout_s = loop.time() - encoded
+        self.metrics.last_message_chars = max(
+            (len(message.text) for message in sent), default=0
+        )
         self.logger.info(
-            f"Broadcast enviado para {len(self.active_connections)} conexões: {message.get('tipo')}"
+            f"Broadcast enviado para {total} conexões "
+            f"({len(groups)} inscrições): {tipo}"
         )
-        for connection in list(self.active_connections):
-            try:
-                await connection.send_json(message)
-            except RuntimeError as e:
-                self.logger.warning(f"Erro ao enviar broadcast para uma conexão: {e}")
-                self.disconnect(connection)
-            except Exception as e:
-                self.logger.error(f"Erro inesperado ao enviar broadcast: {e}")
-                self.disconnect(connection)
+
+    async def drain(self) -> None:
+        """Wait until every client's queue has been sent."""
+        await asyncio.gather(
+            *(channel.wait_idle() for channel in list(self._channels.values()))
+        )
+
+    def status(self) -> Dict[str, Any]:
+        depths = [len(channel.pending) for channel in self._channels.values()]
+        return {
+            **self.metrics.snapshot(),
+            "conexoes": len(self._channels),
+            "inscricoes_distintas": len(
+                {channel.subscription for channel in self._channels.values()}
+            ),
+            "fila_total": sum(depths),
+            "fila_max": max(depths, default=0),
+            "capacidade_fila_por_cliente": self.max_queue_size,
+            "timeout_envio_s": self.send_timeout_seconds,
+            "formatos": {
+                formato: sum(c.formato == formato for c in self._channels.values())
+                for formato in supported_formats()
+            },
+        }
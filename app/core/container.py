@@ -1,11 +1,26 @@
 from dependency_injector import containers, providers
 from app.config.settings import settings
 from app.services.database_service import DatabaseService
+from app.repositories.database_repository import DatabaseWriter
+from app.services.data_service import AsyncDataClient
 from app.services.report_service import ReportService
+from app.services.sku_nicho_cache import SkuNichoCache
+from app.services.report_cache import DailyReportCache
+from app.services.report_bus import create_report_bus
+from app.services.order_events import OrderEventHub
 from app.services.order_service import OrderInserter
+from app.services.order_search_service import OrderSearchService
+from app.services.data_version import DataVersionService
 from app.services.sku_nicho_service import SkuNichoInserter
+from app.services.sku_import_service import SkuNichoImporter
+from app.services.niche_rules import NicheRuleEngine
+from app.services.sync_state_service import SyncStateService
+from app.services.backfill_service import BackfillService
 from app.core.connection_manager import ConnectionManager
+from app.core.compression import ResponseCompressor
 from app.background_tasks.periodic_report_task import BackgroundTaskService
+from app.background_tasks.leader import LeaderElector
+from app.background_tasks.scheduler import AdaptivePollingScheduler, parse_quiet_hours
 
 
 class Container(containers.DeclarativeContainer):
@@ -20,24 +35,133 @@ class Container(containers.DeclarativeContainer):
         db_path=config.provided.database_path,
     )
 
+    sku_nicho_cache = providers.Singleton(
+        SkuNichoCache,
+        db=database_service.provided.database,
+    )
+
     report_service = providers.Singleton(
         ReportService,
         database=database_service.provided.database,
+        sku_nichos=sku_nicho_cache,
+    )
+
+    data_versions = providers.Singleton(
+        DataVersionService,
+        db=database_service.provided.database,
+    )
+
+    report_cache = providers.Singleton(
+        DailyReportCache,
+        report_service=report_service,
+        data_versions=data_versions,
+    )
+
+    # Ingestion (and lease/bus) writes run on their own thread and connection
+    database_writer = providers.Singleton(
+        DatabaseWriter,
+        db_path=config.provided.database_path,
+    )
+
+    report_bus = providers.Singleton(
+        create_report_bus,
+        backend=config.provided.report_bus_backend,
+        db=database_service.provided.database,
+        poll_interval=config.provided.report_bus_poll_interval,
+        redis_url=config.provided.report_bus_redis_url,
+        channel=config.provided.report_bus_channel,
+        cross_process=config.provided.leader_election_enabled,
+        writer=database_writer,
     )
 
     order_inserter = providers.Singleton(
         OrderInserter,
-        database=database_service.provided.database,
+        db=database_writer.provided.database,
+    )
+
+    order_search = providers.Singleton(
+        OrderSearchService,
+        db=database_service.provided.database,
+        sku_nichos=sku_nicho_cache,
+        rank_window=config.provided.order_search_rank_window,
     )
 
     sku_nicho_inserter = providers.Singleton(
         SkuNichoInserter,
-        database=database_service.provided.database,
+        db=database_service.provided.database,
+    )
+
+    # Niches assigned by rules or imported in bulk are written on the writer's connection
+    sku_nicho_batch_inserter = providers.Singleton(
+        SkuNichoInserter,
+        db=database_writer.provided.database,
+    )
+
+    sku_nicho_importer = providers.Singleton(
+        SkuNichoImporter,
+        inserter=sku_nicho_batch_inserter,
+        writer=database_writer,
+        chunk_size=config.provided.sku_import_chunk_size,
+        max_errors=config.provided.sku_import_max_errors,
+    )
+
+    niche_rules = providers.Singleton(
+        NicheRuleEngine,
+        db=database_service.provided.database,
+        inserter=sku_nicho_batch_inserter,
+        sku_nichos=sku_nicho_cache,
+    )
+
+    data_client = providers.Singleton(
+        AsyncDataClient,
+        session_token=config.provided.api_session_token,
+        base_url=config.provided.api_base_url,
+        timeout_seconds=config.provided.api_timeout_seconds,
+        max_connections=config.provided.api_max_connections,
+        max_keepalive_connections=config.provided.api_max_keepalive_connections,
+        max_response_bytes=config.provided.api_max_response_bytes,
+        retry_attempts=config.provided.api_retry_attempts,
+        retry_wait_min=config.provided.api_retry_wait_min,
+        retry_wait_max=config.provided.api_retry_wait_max,
+        max_pages=config.provided.api_max_pages,
+    )
+
+    sync_state_service = providers.Singleton(
+        SyncStateService,
+        db=database_writer.provided.database,
+    )
+
+    backfill_service = providers.Singleton(
+        BackfillService,
+        data_client=data_client,
+        inserter=order_inserter,
+        sync_state=sync_state_service,
+        writer=database_writer,
+        concurrency=config.provided.backfill_concurrency,
+        requests_per_second=config.provided.backfill_requests_per_second,
+        batch_size=config.provided.ingest_batch_size,
     )
 
     connection_manager = providers.Singleton(
         ConnectionManager,
-        logger=providers.Object(None),  # Will be set later or use logging
+        logger=providers.Object(None),  # Falls back to the module logger
+        max_queue_size=config.provided.ws_max_queue_size,
+        send_timeout_seconds=config.provided.ws_send_timeout_seconds,
+    )
+
+    response_compressor = providers.Singleton(
+        ResponseCompressor,
+        minimum_size=config.provided.compression_minimum_size,
+        gzip_level=config.provided.compression_gzip_level,
+        brotli_quality=config.provided.compression_brotli_quality,
+    )
+
+    order_events = providers.Singleton(
+        OrderEventHub,
+        manager=connection_manager,
+        sku_nichos=sku_nicho_cache,
+        buffer_size=config.provided.order_events_buffer_size,
+        subscriber_queue_size=config.provided.order_events_queue_size,
     )
 
     database = providers.Singleton(
@@ -45,12 +169,47 @@ class Container(containers.DeclarativeContainer):
         db_service=database_service,
     )
 
+    polling_scheduler = providers.Singleton(
+        AdaptivePollingScheduler,
+        base_interval=config.provided.report_update_interval,
+        min_interval=config.provided.poll_min_interval,
+        max_interval=config.provided.poll_max_interval,
+        backoff_factor=config.provided.poll_backoff_factor,
+        speedup_factor=config.provided.poll_speedup_factor,
+        jitter=config.provided.poll_jitter,
+        quiet_hours=providers.Callable(
+            parse_quiet_hours, config.provided.poll_quiet_hours
+        ),
+    )
+
+    # Callbacks (start/stop the ingestion) are attached in app_factory
+    leader_elector = providers.Singleton(
+        LeaderElector,
+        db=database_writer.provided.database,
+        lease_seconds=config.provided.leader_lease_seconds,
+        heartbeat_seconds=config.provided.leader_heartbeat_seconds,
+        writer=database_writer,
+    )
+
     background_task_service = providers.Singleton(
         BackgroundTaskService,
         app=providers.Object(None),  # Will be set in app_factory
         manager=connection_manager,
         report_service=report_service,
+        data_client=data_client,
+        order_inserter=order_inserter,
+        sync_state=sync_state_service,
+        writer=database_writer,
         update_interval_seconds=config.provided.report_update_interval,
+        batch_size=config.provided.ingest_batch_size,
+        fetch_concurrency=config.provided.pipeline_fetch_concurrency,
+        parse_concurrency=config.provided.pipeline_parse_concurrency,
+        write_concurrency=config.provided.pipeline_write_concurrency,
+        queue_size=config.provided.pipeline_queue_size,
+        scheduler=polling_scheduler,
+        report_cache=report_cache,
+        report_bus=report_bus,
+        order_events=order_events,
     )
 
 
@@ -1,3 +1,17 @@
 from app.app_factory import create_app
+from app.config.settings import settings
 
 app = create_app()
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    # Other launch paths: gunicorn -k app.workers.UvicornWorker, or
+    # uvicorn app.main:app --ws-per-message-deflate false (see README)
+    uvicorn.run(
+        "app.main:app",
+        host=settings.server_host,
+        port=settings.server_port,
+        ws_per_message_deflate=settings.ws_per_message_deflate,
+    )
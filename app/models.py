@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field, validator
-from typing import Optional
+from typing import Literal, Optional
 from datetime import datetime
 
 
@@ -49,3 +49,59 @@ class ReportQuery(BaseModel):
         except ValueError:
             raise ValueError("Date must be in YYYY-MM-DD format")
         return v
+
+
+class BackfillQuery(BaseModel):
+    data_inicio: str = Field(
+        ..., description="First API day YYYY-MM-DD", example="2024-01-01"
+    )
+    data_fim: str = Field(
+        ..., description="Last API day YYYY-MM-DD", example="2024-03-31"
+    )
+    concorrencia: Optional[int] = Field(
+        None, ge=1, le=32, description="Parallel day fetches (default from settings)"
+    )
+    forcar: bool = Field(False, description="Refetch days already completed")
+
+    @validator("data_inicio", "data_fim")
+    def validate_date(cls, v):
+        try:
+            datetime.strptime(v, "%Y-%m-%d")
+        except ValueError:
+            raise ValueError("Date must be in YYYY-MM-DD format")
+        return v
+
+
+class SkuNichoListQuery(BaseModel):
+    pagina: int = Field(1, ge=1, description="Page number, from 1")
+    por_pagina: int = Field(50, ge=1, le=500, description="Rows per page")
+    ordenar: Literal["sku", "nicho", "created_at"] = Field(
+        "sku", description="Sort column"
+    )
+    ordem: Literal["asc", "desc"] = Field("asc", description="Sort direction")
+    nicho: Optional[str] = Field(None, description="Only SKUs of this niche")
+    busca: Optional[str] = Field(None, description="SKU search text", example="CAS-")
+    modo: Literal["prefixo", "contem"] = Field(
+        "prefixo", description="Match SKUs starting with or containing busca"
+    )
+
+
+class OrderSearchQuery(BaseModel):
+    q: str = Field(
+        ...,
+        min_length=1,
+        description="Words to find in title, SKU or ad",
+        example="tapete",
+    )
+    data_inicio: Optional[str] = Field(
+        None, description="First payment date (YYYY-MM-DD)", example="2024-01-01"
+    )
+    data_fim: Optional[str] = Field(
+        None, description="Last payment date (YYYY-MM-DD)", example="2024-01-31"
+    )
+    nicho: Optional[str] = Field(None, description="Only orders of this niche")
+    pagina: int = Field(1, ge=1, description="Page number, from 1")
+    por_pagina: int = Field(50, ge=1, le=200, description="Orders per page")
+    ordenar: Literal["relevancia", "data"] = Field(
+        "relevancia", description="Best matches or newest orders first"
+    )
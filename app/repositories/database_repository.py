@@ -1,25 +1,33 @@
+import asyncio
+import functools
 import sqlite3
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from threading import Lock
-from typing import Dict, Type, Any, Optional
+from typing import Callable, Dict, Type, Any, Optional
 from app.core.exceptions import DatabaseException
 
 
 class SingletonMeta(type):
-    _instances: Dict[Type[Any], Any] = {}
+    """One shared instance per class and constructor arguments (e.g. per db_path)."""
+
+    _instances: Dict[Any, Any] = {}
     _lock: Lock = Lock()
 
     def __call__(cls, *args, **kwargs):
+        key = (cls, args, tuple(sorted(kwargs.items())))
         with cls._lock:
-            if cls not in cls._instances:
+            if key not in cls._instances:
                 instance = super().__call__(*args, **kwargs)
-                cls._instances[cls] = instance
-        return cls._instances[cls]
+                cls._instances[key] = instance
+        return cls._instances[key]
 
 
 class Database(metaclass=SingletonMeta):
-    def __init__(self, db_path: str):
+    def __init__(self, db_path: str, role: str = "main"):
+        # A role other than "main" is a separate instance with its own connection
         self.db_path = db_path
+        self.role = role
         self.conn: Optional[sqlite3.Connection] = None
         self.cursor: Optional[sqlite3.Cursor] = None
         self.logger = logging.getLogger(__name__)
@@ -53,6 +61,57 @@ class Database(metaclass=SingletonMeta):
             raise DatabaseException(f"Failed to close database connection: {e}") from e
 
 
+class DatabaseWriter:
+    """
+    Runs database writes one at a time on a dedicated thread and connection.
+
+    Ingestion (order upserts, sync checkpoints) writes through here, so a
+    slow insert does not block the event loop, and its transactions never
+    mix with writes made on the shared connection. Services that write here
+    are built on ``writer.database``.
+    """
+
+    def __init__(self, db_path: str):
+        self.database = Database(db_path, role="writer")
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = Lock()
+        self.logger = logging.getLogger(__name__)
+
+    def connect(self) -> None:
+        with self._lock:
+            if self._executor is not None:
+                return
+            self.database.connect()
+            self._executor = ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix="db-writer"
+            )
+            self.logger.info("Escritor do banco de dados iniciado")
+
+    async def run(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """Run ``fn(*args, **kwargs)`` on the writer thread and await its result."""
+        self.connect()
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor, functools.partial(fn, *args, **kwargs)
+        )
+
+    def call(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """``run`` for sync code off the event loop (e.g. a threadpool route); blocks until done."""
+        self.connect()
+        assert self._executor is not None
+        return self._executor.submit(fn, *args, **kwargs).result()
+
+    def close(self) -> None:
+        """Wait for queued writes, then close the writer's connection."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is None:
+            return
+        executor.shutdown(wait=True)
+        self.database.close()
+        self.logger.info("Escritor do banco de dados encerrado")
+
+
 class TableCreator:
     def __init__(self, db: Database):
         self.db = db
@@ -93,6 +152,52 @@ class TableCreator:
             self.logger.exception(f"Erro ao criar tabela 'orders': {e}")
             raise DatabaseException(f"Failed to create orders table: {e}") from e
 
+    def create_orders_search_index(self):
+        """Indexes behind /orders/busca: payment date range and FTS5 over title, SKU and ad."""
+        try:
+            self.logger.info("Criando índices de busca de 'orders' se não existirem")
+            # Covers the date range and niche (sku) filters of searches sorted by date
+            self.db.cursor.execute(
+                "CREATE INDEX IF NOT EXISTS idx_orders_payment_date ON orders (payment_date, sku)"
+            )
+            self.db.commit()
+        except sqlite3.Error as e:
+            self.logger.exception(f"Erro ao criar índices de 'orders': {e}")
+            raise DatabaseException(f"Failed to create orders indexes: {e}") from e
+        try:
+            exists = self.db.cursor.execute(
+                "SELECT 1 FROM sqlite_master WHERE name = 'orders_fts'"
+            ).fetchone()
+            # External-content index keyed by orders.rowid; a manual VACUUM may
+            # renumber rowids, so run 'rebuild' on orders_fts after one
+            self.db.cursor.execute(
+                """
+            CREATE VIRTUAL TABLE IF NOT EXISTS orders_fts USING fts5(
+                title, sku, ad, content='orders', content_rowid='rowid',
+                tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+            )
+            """
+            )
+            # OrderInserter indexes the orders it writes, one statement per
+            # batch; this trigger covers orders deleted by hand
+            self.db.cursor.execute(
+                """
+            CREATE TRIGGER IF NOT EXISTS orders_fts_delete AFTER DELETE ON orders
+            BEGIN
+                INSERT INTO orders_fts (orders_fts, rowid, title, sku, ad)
+                VALUES ('delete', old.rowid, old.title, old.sku, old.ad);
+            END
+            """
+            )
+            if not exists:
+                # Index the orders stored before the search index existed
+                self.db.cursor.execute("INSERT INTO orders_fts (orders_fts) VALUES ('rebuild')")
+            self.db.commit()
+            self.logger.info("Índices de busca de 'orders' criados ou já existentes")
+        except sqlite3.OperationalError as e:
+            # SQLite without FTS5: /orders/busca falls back to LIKE scans
+            self.logger.warning(f"Busca FTS5 de pedidos indisponível: {e}")
+
     def create_sku_nichos_table(self):
         try:
             self.logger.info("Criando tabela 'sku_nichos' se não existir")
@@ -110,3 +215,243 @@ class TableCreator:
         except sqlite3.Error as e:
             self.logger.exception(f"Erro ao criar tabela 'sku_nichos': {e}")
             raise DatabaseException(f"Failed to create sku_nichos table: {e}") from e
+
+    def create_sku_nichos_search_index(self):
+        """Indexes behind /sku_nicho/listar: niche filter/sort and FTS5 trigram substring search."""
+        try:
+            self.logger.info("Criando índices de busca de 'sku_nichos' se não existirem")
+            self.db.cursor.execute(
+                "CREATE INDEX IF NOT EXISTS idx_sku_nichos_nicho ON sku_nichos (nicho, sku)"
+            )
+            self.db.cursor.execute(
+                "CREATE INDEX IF NOT EXISTS idx_sku_nichos_created_at ON sku_nichos (created_at, sku)"
+            )
+            self.db.commit()
+        except sqlite3.Error as e:
+            self.logger.exception(f"Erro ao criar índices de 'sku_nichos': {e}")
+            raise DatabaseException(f"Failed to create sku_nichos indexes: {e}") from e
+        try:
+            exists = self.db.cursor.execute(
+                "SELECT 1 FROM sqlite_master WHERE name = 'sku_nichos_fts'"
+            ).fetchone()
+            # External-content index over sku_nichos.sku, kept in sync by triggers
+            self.db.cursor.execute(
+                """
+            CREATE VIRTUAL TABLE IF NOT EXISTS sku_nichos_fts USING fts5(
+                sku, content='sku_nichos', content_rowid='rowid', tokenize='trigram'
+            )
+            """
+            )
+            self.db.cursor.executescript(
+                """
+            CREATE TRIGGER IF NOT EXISTS sku_nichos_fts_insert AFTER INSERT ON sku_nichos
+            BEGIN
+                INSERT INTO sku_nichos_fts (rowid, sku) VALUES (new.rowid, new.sku);
+            END;
+            CREATE TRIGGER IF NOT EXISTS sku_nichos_fts_delete AFTER DELETE ON sku_nichos
+            BEGIN
+                INSERT INTO sku_nichos_fts (sku_nichos_fts, rowid, sku) VALUES ('delete', old.rowid, old.sku);
+            END;
+            CREATE TRIGGER IF NOT EXISTS sku_nichos_fts_update AFTER UPDATE OF sku ON sku_nichos
+            BEGIN
+                INSERT INTO sku_nichos_fts (sku_nichos_fts, rowid, sku) VALUES ('delete', old.rowid, old.sku);
+                INSERT INTO sku_nichos_fts (rowid, sku) VALUES (new.rowid, new.sku);
+            END;
+            """
+            )
+            if not exists:
+                # Index the SKUs registered before the search index existed
+                self.db.cursor.execute(
+                    "INSERT INTO sku_nichos_fts (sku_nichos_fts) VALUES ('rebuild')"
+                )
+            self.db.commit()
+            self.logger.info("Índices de busca de 'sku_nichos' criados ou já existentes")
+        except sqlite3.OperationalError as e:
+            # SQLite without FTS5 or the trigram tokenizer (< 3.34): substring search scans
+            self.logger.warning(f"Busca FTS5 de SKUs indisponível: {e}")
+
+    def create_sync_state_table(self):
+        try:
+            self.logger.info("Criando tabela 'sync_state' se não existir")
+            self.db.cursor.execute(
+                """
+            CREATE TABLE IF NOT EXISTS sync_state (
+                day TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                orders_count INTEGER DEFAULT 0,
+                attempts INTEGER DEFAULT 0,
+                last_error TEXT,
+                changed_count INTEGER DEFAULT 0,
+                max_payment_date TEXT,
+                last_synced_at TIMESTAMP,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+            """
+            )
+            self.db.commit()
+            self.logger.info("Tabela 'sync_state' criada ou já existente")
+        except sqlite3.Error as e:
+            self.logger.exception(f"Erro ao criar tabela 'sync_state': {e}")
+            raise DatabaseException(f"Failed to create sync_state table: {e}") from e
+
+    def create_order_hashes_table(self):
+        try:
+            self.logger.info("Criando tabela 'order_hashes' se não existir")
+            self.db.cursor.execute(
+                """
+            CREATE TABLE IF NOT EXISTS order_hashes (
+                order_id TEXT PRIMARY KEY,
+                content_hash TEXT NOT NULL
+            )
+            """
+            )
+            self.db.commit()
+            self.logger.info("Tabela 'order_hashes' criada ou já existente")
+        except sqlite3.Error as e:
+            self.logger.exception(f"Erro ao criar tabela 'order_hashes': {e}")
+            raise DatabaseException(f"Failed to create order_hashes table: {e}") from e
+
+    def create_report_bus_table(self):
+        try:
+            self.logger.info("Criando tabela 'report_bus' se não existir")
+            self.db.cursor.execute(
+                """
+            CREATE TABLE IF NOT EXISTS report_bus (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                origin TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                published_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+            """
+            )
+            self.db.commit()
+            self.logger.info("Tabela 'report_bus' criada ou já existente")
+        except sqlite3.Error as e:
+            self.logger.exception(f"Erro ao criar tabela 'report_bus': {e}")
+            raise DatabaseException(f"Failed to create report_bus table: {e}") from e
+
+    def create_leader_lease_table(self):
+        try:
+            self.logger.info("Criando tabela 'leader_lease' se não existir")
+            self.db.cursor.execute(
+                """
+            CREATE TABLE IF NOT EXISTS leader_lease (
+                name TEXT PRIMARY KEY,
+                holder TEXT NOT NULL,
+                expires_at REAL NOT NULL,
+                acquired_at REAL NOT NULL
+            )
+            """
+            )
+            self.db.commit()
+            self.logger.info("Tabela 'leader_lease' criada ou já existente")
+        except sqlite3.Error as e:
+            self.logger.exception(f"Erro ao criar tabela 'leader_lease': {e}")
+            raise DatabaseException(f"Failed to create leader_lease table: {e}") from e
+
+    def create_nicho_rules_table(self):
+        try:
+            self.logger.info("Criando tabela 'nicho_rules' se não existir")
+            self.db.cursor.execute(
+                """
+            CREATE TABLE IF NOT EXISTS nicho_rules (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                tipo TEXT NOT NULL CHECK (tipo IN ('prefixo', 'regex', 'palavra_chave')),
+                padrao TEXT NOT NULL,
+                nicho TEXT NOT NULL,
+                prioridade INTEGER NOT NULL DEFAULT 0,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+            """
+            )
+            self.db.commit()
+            self.logger.info("Tabela 'nicho_rules' criada ou já existente")
+        except sqlite3.Error as e:
+            self.logger.exception(f"Erro ao criar tabela 'nicho_rules': {e}")
+            raise DatabaseException(f"Failed to create nicho_rules table: {e}") from e
+
+    def create_cache_versions_table(self):
+        try:
+            self.logger.info("Criando tabela 'cache_versions' se não existir")
+            self.db.cursor.execute(
+                """
+            CREATE TABLE IF NOT EXISTS cache_versions (
+                name TEXT PRIMARY KEY,
+                version INTEGER NOT NULL DEFAULT 0
+            )
+            """
+            )
+            # Any write to these tables invalidates their in-memory copy
+            # (the SKU -> niche map, the compiled niche rules)
+            for table in ("sku_nichos", "nicho_rules"):
+                self.db.cursor.execute(
+                    "INSERT OR IGNORE INTO cache_versions (name, version) VALUES (?, 0)",
+                    (table,),
+                )
+                for event in ("INSERT", "UPDATE", "DELETE"):
+                    self.db.cursor.execute(
+                        f"""
+                    CREATE TRIGGER IF NOT EXISTS {table}_version_{event.lower()}
+                    AFTER {event} ON {table}
+                    BEGIN
+                        UPDATE cache_versions SET version = version + 1 WHERE name = '{table}';
+                    END
+                    """
+                    )
+            self.db.commit()
+            self.logger.info("Tabela 'cache_versions' criada ou já existente")
+        except sqlite3.Error as e:
+            self.logger.exception(f"Erro ao criar tabela 'cache_versions': {e}")
+            raise DatabaseException(f"Failed to create cache_versions table: {e}") from e
+
+    def create_order_day_versions_table(self):
+        """Per-day data version of orders, behind the ETags of range endpoints."""
+        try:
+            self.logger.info("Criando tabela 'order_day_versions' se não existir")
+            exists = self.db.cursor.execute(
+                "SELECT 1 FROM sqlite_master WHERE name = 'order_day_versions'"
+            ).fetchone()
+            self.db.cursor.execute(
+                """
+            CREATE TABLE IF NOT EXISTS order_day_versions (
+                dia TEXT PRIMARY KEY,
+                versao INTEGER NOT NULL,
+                pedidos INTEGER NOT NULL,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+            """
+            )
+            # Write sequence of orders: OrderInserter bumps it once per batch
+            # and stamps it on every day the batch touched
+            self.db.cursor.execute(
+                "INSERT OR IGNORE INTO cache_versions (name, version) VALUES ('orders', 0)"
+            )
+            # Orders deleted by hand bump their day as well
+            self.db.cursor.execute(
+                """
+            CREATE TRIGGER IF NOT EXISTS order_day_versions_delete AFTER DELETE ON orders
+            WHEN old.payment_date IS NOT NULL
+            BEGIN
+                UPDATE cache_versions SET version = version + 1 WHERE name = 'orders';
+                UPDATE order_day_versions
+                SET versao = (SELECT version FROM cache_versions WHERE name = 'orders'),
+                    pedidos = pedidos - 1,
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE dia = date(old.payment_date);
+            END
+            """
+            )
+            if not exists:
+                # Version the days of orders stored before the table existed
+                self.db.cursor.execute(
+                    """
+                INSERT INTO order_day_versions (dia, versao, pedidos)
+                SELECT date(payment_date), 0, COUNT(*) FROM orders
+                WHERE payment_date IS NOT NULL GROUP BY date(payment_date)
+                """
+                )
+            self.db.commit()
+            self.logger.info("Tabela 'order_day_versions' criada ou já existente")
+        except sqlite3.Error as e:
+            self.logger.exception(f"Erro ao criar tabela 'order_day_versions': {e}")
+            raise DatabaseException(f"Failed to create order_day_versions table: {e}") from e
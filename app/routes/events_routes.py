@@ -0,0 +1,68 @@
+import asyncio
+import json
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from app.core.container import container
+from app.core.exceptions import ValidationException
+from app.services.order_events import EventSubscriber, OrderEventHub
+from app.services.report_subscription import Subscription
+import logging
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+# Seconds between keep-alive comments on an idle stream
+SSE_HEARTBEAT_SECONDS = 15.0
+
+
+def _sse_event(event: dict) -> str:
+    data = json.dumps(event, ensure_ascii=False, separators=(",", ":"))
+    return f"id: {event['seq']}\nevent: pedido\ndata: {data}\n\n"
+
+
+async def _stream(
+    request: Request, order_events: OrderEventHub, subscriber: EventSubscriber
+):
+    try:
+        while not subscriber.dropped:
+            try:
+                event = await asyncio.wait_for(
+                    subscriber.queue.get(), SSE_HEARTBEAT_SECONDS
+                )
+            except asyncio.TimeoutError:
+                if await request.is_disconnected():
+                    break
+                yield ": ping\n\n"
+                continue
+            yield _sse_event(event)
+    finally:
+        order_events.unsubscribe(subscriber)
+        logger.info("Cliente SSE de pedidos desconectado")
+
+
+# ROUTE: Server-Sent Events stream of new/changed orders (?nichos=...&loja=...)
+@router.get("/eventos/pedidos")
+async def eventos_pedidos(
+    request: Request,
+    last_event_id: Optional[str] = Header(default=None),
+    order_events: OrderEventHub = Depends(lambda: container.order_events()),
+):
+    try:
+        subscription = Subscription.from_message(request.query_params)
+    except ValidationException as e:
+        return JSONResponse(status_code=400, content={"erro": str(e)})
+    try:
+        resume_from = int(last_event_id) if last_event_id else None
+    except ValueError:
+        resume_from = None
+    subscriber = order_events.subscribe(
+        None if subscription.is_everything else subscription, resume_from
+    )
+    logger.info(f"Cliente SSE de pedidos conectado: {subscription.to_dict()}")
+    return StreamingResponse(
+        _stream(request, order_events, subscriber),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -1,8 +1,12 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Request, Response
 from fastapi.responses import JSONResponse
 from datetime import datetime
 import pandas as pd
 from app.repositories.database_repository import Database
+from app.core.exceptions import ValidationException
+from app.services.order_search_service import OrderSearchService
+from app.services.data_version import DataVersionService
+from app.models import OrderSearchQuery
 from app.core.container import container
 import logging
 
@@ -35,20 +39,27 @@ def listar_orders(database: Database = Depends(lambda: container.database())):
 
 @router.get("/orders/periodo")
 def listar_orders_periodo(
-    database: Database = Depends(lambda: container.database())
+    data_inicio: str,
+    data_fim: str,
+    request: Request,
+    response: Response,
+    database: Database = Depends(lambda: container.database()),
+    data_versions: DataVersionService = Depends(lambda: container.data_versions()),
 ):
     logger.info(f"Listando pedidos entre {data_inicio} e {data_fim}")
     try:
         # Validar formato
         try:
-            inicio = datetime.strptime(data_inicio, "%Y-%m-%d")
-            fim = datetime.strptime(data_fim, "%Y-%m-%d")
+            version = data_versions.orders_version(data_inicio, data_fim)
         except ValueError:
             logger.warning("Datas inválidas fornecidas")
             return JSONResponse(
                 status_code=400,
                 content={"erro": "Datas inválidas, use formato YYYY-MM-DD"},
             )
+        # Nenhum pedido do período mudou desde a cópia do cliente
+        if version.matches(request.headers.get("if-none-match")):
+            return Response(status_code=304, headers=version.headers())
 
         db = database
         assert db.conn is not None
@@ -65,6 +76,7 @@ def listar_orders_periodo(
         df = df.fillna(0).replace({pd.NA: 0}).astype(object)
 
         logger.info(f"{len(df)} pedidos encontrados no período")
+        response.headers.update(version.headers())
         return {
             "periodo": {"inicio": data_inicio, "fim": data_fim},
             "total_pedidos": len(df),
@@ -73,3 +85,47 @@ def listar_orders_periodo(
     except Exception as e:
         logger.exception("Erro ao listar pedidos por período")
         return JSONResponse(status_code=500, content={"erro": str(e)})
+
+
+@router.get("/orders/busca")
+def buscar_orders(
+    query: OrderSearchQuery = Depends(),
+    search: OrderSearchService = Depends(lambda: container.order_search()),
+):
+    logger.info(f"Buscando pedidos por '{query.q}'")
+    try:
+        for data in (query.data_inicio, query.data_fim):
+            if data is not None:
+                datetime.strptime(data, "%Y-%m-%d")
+    except ValueError:
+        logger.warning("Datas inválidas fornecidas")
+        return JSONResponse(
+            status_code=400,
+            content={"erro": "Datas inválidas, use formato YYYY-MM-DD"},
+        )
+    try:
+        pedidos, total = search.search(
+            query.q,
+            data_inicio=query.data_inicio,
+            data_fim=query.data_fim,
+            nicho=query.nicho,
+            pagina=query.pagina,
+            por_pagina=query.por_pagina,
+            ordenar=query.ordenar,
+        )
+        # Relevance pages stop at the rank window; total_pedidos stays exact
+        paginaveis = search.pageable(total, query.ordenar)
+        return {
+            "busca": query.q,
+            "total_pedidos": total,
+            "pagina": query.pagina,
+            "por_pagina": query.por_pagina,
+            "paginas": (paginaveis + query.por_pagina - 1) // query.por_pagina,
+            "pedidos": pedidos,
+        }
+    except ValidationException as e:
+        logger.warning(f"Busca de pedidos recusada: {e}")
+        return JSONResponse(status_code=400, content={"erro": str(e)})
+    except Exception as e:
+        logger.exception("Erro ao buscar pedidos")
+        return JSONResponse(status_code=500, content={"erro": str(e)})
@@ -1,15 +1,23 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Request, Response
 from fastapi.responses import JSONResponse
 from datetime import datetime, timedelta
 import asyncio
-from app.services.data_service import Data
-from app.services.data_parser_service import DataParser
+from app.services.data_service import AsyncDataClient
+from app.services.data_parser_service import aiter_order_batches
+from app.services.niche_rules import NicheRuleEngine
+from app.services.order_events import OrderEventHub
 from app.services.order_service import OrderInserter
+from app.repositories.database_repository import DatabaseWriter
 from app.services.report_service import ReportService
+from app.services.report_cache import DailyReportCache
+from app.services.report_bus import ReportBus
 from app.core.connection_manager import ConnectionManager
-from app.models import DateRangeQuery, ReportQuery
-from app.config.settings import settings
+from app.core.compression import ResponseCompressor
+from app.services.backfill_service import BackfillService
+from app.services.data_version import DataVersionService
+from app.models import BackfillQuery, DateRangeQuery, ReportQuery
 from app.core.container import container
+from app.config.settings import settings
 import logging
 
 router = APIRouter()
@@ -21,8 +29,13 @@ logger = logging.getLogger(__name__)
 async def atualizar_pedidos(
     query: DateRangeQuery = Depends(),
     inserter: OrderInserter = Depends(lambda: container.order_inserter()),
-    report_service: ReportService = Depends(lambda: container.report_service()),
+    writer: DatabaseWriter = Depends(lambda: container.database_writer()),
+    report_cache: DailyReportCache = Depends(lambda: container.report_cache()),
     manager: ConnectionManager = Depends(lambda: container.connection_manager()),
+    data_client: AsyncDataClient = Depends(lambda: container.data_client()),
+    report_bus: ReportBus = Depends(lambda: container.report_bus()),
+    order_events: OrderEventHub = Depends(lambda: container.order_events()),
+    niche_rules: NicheRuleEngine = Depends(lambda: container.niche_rules()),
 ):
     logger.info(f"Chamada para /atualizar_pedidos com data={query.data}")
     try:
@@ -60,39 +73,43 @@ async def atualizar_pedidos(
                     "erro": "Formato de data inválido. Use DD/MM/YYYY ou DD/MM/YYYY/DD/MM/YYYY."
                 }
 
-        url = (
-            f"https://app.arpcommerce.com.br/sells?r={data_inicio}"
-            if data_inicio == data_fim
-            else f"https://app.arpcommerce.com.br/sells?r={data_inicio}/{data_fim}"
+        logger.info(
+            f"Path gerado para API externa: {data_client.sells_path(data_inicio, data_fim)}"
         )
-        logger.info(f"URL gerada para API externa: {url}")
-
-        session_token = settings.api_session_token
-        data_obj = Data(url, {"session": session_token})
-        raw_json = data_obj.get_data()
-        logger.info(f"Dados brutos obtidos: {len(raw_json)} registros")
 
-        parser = DataParser(raw_json)
-        pedidos = parser.parse_orders()
-        logger.info(f"Pedidos parseados: {len(pedidos)} pedidos")
+        async def on_changes(batch_changes):
+            # Clients see each written order before the report is rebuilt
+            await order_events.publish(batch_changes)
+            if settings.niche_rules_at_ingest:
+                await writer.run(niche_rules.classify_changes, batch_changes)
 
-        inserter.insert_orders(pedidos)
-        logger.info(f"{len(pedidos)} pedidos inseridos no DB com sucesso")
+        changes = await inserter.insert_changed_batches(
+            aiter_order_batches(
+                data_client.stream_sells(data_inicio, data_fim),
+                settings.ingest_batch_size,
+            ),
+            on_changes=on_changes,
+            writer=writer,
+        )
+        logger.info(f"Pedidos parseados: {changes.seen} pedidos")
+        logger.info(f"{len(changes)} pedidos novos ou alterados gravados no DB")
 
         # --- MANUAL UPDATE AFTER REQUEST ---
         # Recalculates the report and broadcasts after a manual update
-        novo_relatorio = report_service.get_daily_report_data()
-        if novo_relatorio and novo_relatorio.get("status") == "sucesso":
+        # and publishes it as the shared snapshot served to new WebSocket clients
+        snapshot = await report_cache.refresh() if changes else None
+        if snapshot and snapshot.ok:
             # Creates a task for broadcast to not block HTTP response
-            asyncio.create_task(
-                manager.broadcast({"tipo": "relatorio_diario", "dados": novo_relatorio})
-            )
+            asyncio.create_task(manager.broadcast_report(snapshot, "relatorio_diario"))
+            # Other workers relay it to their own clients
+            asyncio.create_task(report_bus.publish(snapshot.report))
             logger.info("Broadcast after manual API update.")
 
         # ----------------------------------------------------
 
         return {
-            "mensagem": f"{len(pedidos)} pedidos atualizados com sucesso.",
+            "mensagem": f"{changes.seen} pedidos atualizados com sucesso.",
+            "pedidos_alterados": len(changes),
             "data_inicio": data_inicio,
             "data_fim": data_fim,
         }
@@ -102,14 +119,105 @@ async def atualizar_pedidos(
         return JSONResponse(status_code=500, content={"erro": str(e)})
 
 
+# ROUTE: Historical backfill, one API request per day with resume checkpoints
+@router.post("/backfill_pedidos", status_code=202)
+async def backfill_pedidos(
+    query: BackfillQuery = Depends(),
+    backfill_service: BackfillService = Depends(lambda: container.backfill_service()),
+):
+    logger.info(
+        f"Chamada para /backfill_pedidos de {query.data_inicio} a {query.data_fim}"
+    )
+    try:
+        dias = backfill_service.days_in_range(query.data_inicio, query.data_fim)
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"erro": str(e)})
+    try:
+        backfill_service.start(
+            query.data_inicio,
+            query.data_fim,
+            force=query.forcar,
+            concurrency=query.concorrencia,
+        )
+    except RuntimeError as e:
+        return JSONResponse(status_code=409, content={"erro": str(e)})
+    return {
+        "mensagem": f"Backfill de {len(dias)} dias iniciado.",
+        "data_inicio": query.data_inicio,
+        "data_fim": query.data_fim,
+    }
+
+
+@router.get("/backfill_pedidos/status")
+async def backfill_status(
+    query: ReportQuery = Depends(),
+    backfill_service: BackfillService = Depends(lambda: container.backfill_service()),
+):
+    status = {
+        "em_andamento": backfill_service.running,
+        "ultimo_resultado": backfill_service.last_summary,
+    }
+    if query.data_inicio and query.data_fim:
+        status["checkpoints"] = await backfill_service.writer.run(
+            backfill_service.sync_state.summary, query.data_inicio, query.data_fim
+        )
+    return status
+
+
+# RELATÓRIO DIÁRIO: the shared snapshot, serialized and compressed once per encoding
+@router.get("/relatorio_diario")
+async def relatorio_diario(
+    request: Request,
+    report_cache: DailyReportCache = Depends(lambda: container.report_cache()),
+    compressor: ResponseCompressor = Depends(lambda: container.response_compressor()),
+):
+    snapshot = await report_cache.get()
+    if snapshot is None:
+        return JSONResponse(
+            status_code=503, content={"erro": "Relatório diário indisponível"}
+        )
+    # The first request serializes and hashes the report, off the event loop
+    version = await asyncio.to_thread(lambda: snapshot.validator)
+    if version.matches(request.headers.get("if-none-match")):
+        return Response(status_code=304, headers=version.headers())
+    headers = version.headers()
+    encoding = None
+    if settings.compression_enabled and len(snapshot.body()) >= compressor.minimum_size:
+        encoding = compressor.negotiate(request.headers.get("accept-encoding"))
+        headers["Vary"] = "Accept-Encoding"
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    if snapshot.has_body(encoding):
+        body = snapshot.body(encoding, compressor)
+    else:
+        body = await asyncio.to_thread(snapshot.body, encoding, compressor)
+    return Response(body, media_type="application/json", headers=headers)
+
+
 # RELATÓRIO FLEX (ML + KPIs + Rankings)
 @router.get("/relatorio_flex")
 def relatorio_flex(
+    request: Request,
+    response: Response,
     query: ReportQuery = Depends(),
     report_service: ReportService = Depends(lambda: container.report_service()),
+    data_versions: DataVersionService = Depends(lambda: container.data_versions()),
 ):
     try:
-        return report_service.generate_relatorio_flex(query.data_inicio, query.data_fim)
+        version = data_versions.report_version(query.data_inicio, query.data_fim)
+    except ValueError:
+        return JSONResponse(
+            status_code=400, content={"erro": "Datas inválidas, use formato YYYY-MM-DD"}
+        )
+    # Nothing in the range changed since the client's copy: skip the report
+    if version.matches(request.headers.get("if-none-match")):
+        return Response(status_code=304, headers=version.headers())
+    try:
+        relatorio = report_service.generate_relatorio_flex(
+            query.data_inicio, query.data_fim
+        )
+        response.headers.update(version.headers())
+        return relatorio
     except ValueError as e:
         return JSONResponse(status_code=400, content={"erro": str(e)})
     except Exception as e:
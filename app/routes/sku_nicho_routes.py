@@ -1,9 +1,13 @@
 from fastapi import APIRouter, Depends, UploadFile, File
 from fastapi.responses import JSONResponse
 from app.services.sku_nicho_service import SkuNichoInserter
+from app.services.sku_import_service import SkuNichoImporter
+from app.services.niche_rules import NicheRuleEngine
+from app.repositories.database_repository import DatabaseWriter
 from app.core.container import container
+from app.core.exceptions import ValidationException
+from app.models import SkuNichoListQuery
 import logging
-import pandas as pd
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
@@ -20,10 +24,12 @@ def inserir_sku_nicho(
     return {"mensagem": f"SKU {sku} inserido no nicho {nicho} com sucesso."}
 
 
+# Bulk writes run on the writer thread, like catalog imports
 @router.post("/sku_nicho/inserir_varios")
-def inserir_varios_sku_nicho(
+async def inserir_varios_sku_nicho(
     sku_nicho_lista: list[dict],
-    inserter: SkuNichoInserter = Depends(lambda: container.sku_nicho_inserter()),
+    inserter: SkuNichoInserter = Depends(lambda: container.sku_nicho_batch_inserter()),
+    writer: DatabaseWriter = Depends(lambda: container.database_writer()),
 ):
     logger.info(f"Inserindo {len(sku_nicho_lista)} registros de SKU/nicho")
     for item in sku_nicho_lista:
@@ -33,34 +39,35 @@ def inserir_varios_sku_nicho(
                 status_code=400,
                 content={"erro": "Cada item deve conter 'sku' e 'nicho'"},
             )
-    inserter.insert_many(sku_nicho_lista)
+    await writer.run(inserter.insert_many, sku_nicho_lista)
     logger.info("Inserção múltipla concluída")
     return {"mensagem": f"{len(sku_nicho_lista)} registros inseridos com sucesso."}
 
 
+# Streams XLSX or CSV catalogs; existing SKUs are moved to the niche in the file
 @router.post("/sku_nicho/inserir_xlsx")
-async def inserir_xlsx(
+def inserir_xlsx(
     file: UploadFile = File(...),
-    inserter: SkuNichoInserter = Depends(lambda: container.sku_nicho_inserter()),
+    importer: SkuNichoImporter = Depends(lambda: container.sku_nicho_importer()),
 ):
-    logger.info(f"Inserindo SKUs de XLSX: {file.filename}")
+    logger.info(f"Importando SKUs do arquivo: {file.filename}")
     try:
-        df = pd.read_excel(file.file)
-        sku_nicho_lista = df.to_dict(orient="records")
-        for item in sku_nicho_lista:
-            if "sku" not in item or "nicho" not in item:
-                logger.warning(f"Registro inválido no XLSX: {item}")
-                return JSONResponse(
-                    status_code=400,
-                    content={"erro": "Cada linha deve conter colunas 'sku' e 'nicho'"},
-                )
-        inserter.insert_many(sku_nicho_lista)
-        logger.info(f"Inserção de XLSX concluída: {len(sku_nicho_lista)} registros")
+        report = importer.import_file(file.file, file.filename or "")
+        logger.info(
+            f"Importação concluída: {report.processadas} linhas processadas, "
+            f"{report.alteradas} registros gravados"
+        )
         return {
-            "mensagem": f"{len(sku_nicho_lista)} registros inseridos com sucesso do XLSX."
+            "mensagem": f"{report.processadas} linhas processadas de {file.filename}, "
+            f"{report.alteradas} registros novos ou alterados"
+            + (f" ({report.rejeitadas} linhas rejeitadas)." if report.rejeitadas else "."),
+            **report.to_dict(),
         }
+    except ValidationException as e:
+        logger.warning(f"Arquivo de SKUs inválido: {e}")
+        return JSONResponse(status_code=400, content={"erro": str(e)})
     except Exception as e:
-        logger.exception("Erro ao processar XLSX")
+        logger.exception("Erro ao processar arquivo de SKUs")
         return JSONResponse(status_code=500, content={"erro": str(e)})
 
 
@@ -86,9 +93,73 @@ def deletar_sku_nicho(
     return {"mensagem": f"{deletados} registro(s) apagado(s)."}
 
 
+# Paginated listing: ?pagina=&por_pagina=&ordenar=&ordem=&nicho=&busca=&modo=prefixo|contem
 @router.get("/sku_nicho/listar")
-def listar_sku_nicho(inserter: SkuNichoInserter = Depends(lambda: container.sku_nicho_inserter())):
-    logger.info("Listando todos os SKU/nichos")
-    rows = inserter.list_all()
-    logger.info(f"{len(rows)} registros retornados")
-    return {"dados": rows}
+def listar_sku_nicho(
+    query: SkuNichoListQuery = Depends(),
+    inserter: SkuNichoInserter = Depends(lambda: container.sku_nicho_inserter()),
+):
+    logger.info(f"Listando SKU/nichos: pagina {query.pagina}, busca={query.busca}, nicho={query.nicho}")
+    rows, total = inserter.search(
+        pagina=query.pagina,
+        por_pagina=query.por_pagina,
+        ordenar=query.ordenar,
+        ordem=query.ordem,
+        nicho=query.nicho,
+        busca=query.busca,
+        modo=query.modo,
+    )
+    logger.info(f"{len(rows)} de {total} registros retornados")
+    return {
+        "dados": rows,
+        "total": total,
+        "pagina": query.pagina,
+        "por_pagina": query.por_pagina,
+        "paginas": (total + query.por_pagina - 1) // query.por_pagina,
+    }
+
+
+# Rotas de regras de nicho (prefixo de SKU, regex de SKU, palavra-chave do título)
+@router.get("/sku_nicho/regras/listar")
+def listar_regras(engine: NicheRuleEngine = Depends(lambda: container.niche_rules())):
+    regras = engine.list_rules()
+    return {"dados": [regra.to_dict() for regra in regras]}
+
+
+@router.post("/sku_nicho/regras/inserir")
+def inserir_regra(
+    tipo: str,
+    padrao: str,
+    nicho: str,
+    prioridade: int = 0,
+    engine: NicheRuleEngine = Depends(lambda: container.niche_rules()),
+):
+    try:
+        regra = engine.add_rule(tipo, padrao, nicho, prioridade)
+    except ValidationException as e:
+        logger.warning(f"Regra de nicho inválida: {e}")
+        return JSONResponse(status_code=400, content={"erro": str(e)})
+    return {"mensagem": f"Regra {regra.id} criada com sucesso.", "regra": regra.to_dict()}
+
+
+@router.delete("/sku_nicho/regras/deletar")
+def deletar_regra(regra_id: int, engine: NicheRuleEngine = Depends(lambda: container.niche_rules())):
+    deletadas = engine.delete_rule(regra_id)
+    return {"mensagem": f"{deletadas} regra(s) apagada(s)."}
+
+
+# Dry run: what the rules would assign to the SKUs without a niche
+@router.post("/sku_nicho/regras/simular")
+def simular_regras(engine: NicheRuleEngine = Depends(lambda: container.niche_rules())):
+    return engine.classify_unmapped(dry_run=True)
+
+
+# Runs on the writer thread, whose connection the rules write on
+@router.post("/sku_nicho/regras/aplicar")
+async def aplicar_regras(
+    engine: NicheRuleEngine = Depends(lambda: container.niche_rules()),
+    writer: DatabaseWriter = Depends(lambda: container.database_writer()),
+):
+    resultado = await writer.run(engine.classify_unmapped, dry_run=False)
+    logger.info(f"{resultado['gravados']} SKUs classificados por regra")
+    return resultado
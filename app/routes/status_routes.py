@@ -0,0 +1,40 @@
+from fastapi import APIRouter, Depends
+from app.background_tasks.leader import LeaderElector
+from app.background_tasks.periodic_report_task import BackgroundTaskService
+from app.core.compression import ResponseCompressor
+from app.core.connection_manager import ConnectionManager
+from app.core.container import container
+import logging
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+
+# ROUTE: Ingestion pipeline status (queues, latencies, last cycle)
+@router.get("/status/ingestao")
+async def status_ingestao(
+    background_task_service: BackgroundTaskService = Depends(
+        lambda: container.background_task_service()
+    ),
+    leader_elector: LeaderElector = Depends(lambda: container.leader_elector()),
+):
+    return {
+        **background_task_service.pipeline_status(),
+        "lideranca": leader_elector.status(),
+    }
+
+
+# ROUTE: WebSocket fan-out status (clients, queues, evictions)
+@router.get("/status/websocket")
+async def status_websocket(
+    manager: ConnectionManager = Depends(lambda: container.connection_manager()),
+):
+    return manager.status()
+
+
+# ROUTE: HTTP compression status (bytes saved, CPU spent per encoding)
+@router.get("/status/compressao")
+async def status_compressao(
+    compressor: ResponseCompressor = Depends(lambda: container.response_compressor()),
+):
+    return compressor.status()
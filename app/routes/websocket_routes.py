@@ -1,32 +1,109 @@
+import json
+
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
 from app.core.connection_manager import ConnectionManager
-from app.services.report_service import ReportService
 from app.core.container import container
+from app.core.exceptions import ValidationException
+from app.services.report_cache import DailyReportCache
+from app.services.report_subscription import (
+    ACTION_SUBSCRIBE,
+    ACTION_UNSUBSCRIBE,
+    Subscription,
+)
 import logging
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
 
+def _subscribe(
+    manager: ConnectionManager, websocket: WebSocket, subscription: Subscription
+):
+    # Full-report clients share the unsubscribed group
+    manager.set_subscription(
+        websocket, None if subscription.is_everything else subscription
+    )
+
+
+async def _send_report(
+    manager: ConnectionManager,
+    report_cache: DailyReportCache,
+    websocket: WebSocket,
+    subscription: Subscription,
+):
+    # Served from the shared snapshot; recomputed at most once if missing
+    snapshot = await report_cache.get()
+    if snapshot and snapshot.ok:
+        await manager.send_personal_message(
+            snapshot.message("relatorio_diario_inicial", subscription), websocket
+        )
+        logger.info("Relatório atual enviado para o cliente WebSocket.")
+
+
+async def _handle_client_message(
+    manager: ConnectionManager,
+    report_cache: DailyReportCache,
+    websocket: WebSocket,
+    text: str,
+):
+    """Handle ``{"acao": "inscrever", ...}`` / ``{"acao": "cancelar_inscricao"}``; anything else is ignored."""
+    try:
+        message = json.loads(text)
+    except ValueError:
+        return
+    if not isinstance(message, dict):
+        return
+    acao = message.get("acao")
+    if acao == ACTION_UNSUBSCRIBE:
+        subscription = Subscription()
+    elif acao == ACTION_SUBSCRIBE:
+        try:
+            subscription = Subscription.from_message(message)
+        except ValidationException as e:
+            await manager.send_personal_message(
+                {"tipo": "erro_inscricao", "erro": str(e)}, websocket
+            )
+            return
+    else:
+        return
+    _subscribe(manager, websocket, subscription)
+    await manager.send_personal_message(
+        {"tipo": "inscricao_confirmada", "inscricao": subscription.to_dict()}, websocket
+    )
+    logger.info(f"Cliente WebSocket inscrito: {subscription.to_dict()}")
+    await _send_report(manager, report_cache, websocket, subscription)
+
+
 # Rotas relacionadas a WebSocket
 @router.websocket("/ws/relatorio_diario")
 async def websocket_endpoint(websocket: WebSocket):
     manager = container.connection_manager()
-    report_service = container.report_service()
-    await manager.connect(websocket)
+    report_cache = container.report_cache()
+    # ?compressao=gzip: reports arrive as gzipped binary frames
+    # ?formato=msgpack,colunar: compact encodings, in order of preference
+    await manager.connect(
+        websocket,
+        websocket.query_params.get("compressao"),
+        websocket.query_params.get("formato"),
+    )
     try:
-        # Envia o relatório atual imediatamente após a conexão
-        current_report = report_service.get_daily_report_data()
-        if current_report and current_report.get("status") == "sucesso":
-            await websocket.send_json(
-                {"tipo": "relatorio_diario_inicial", "dados": current_report}
+        # ?secoes=...&nichos=...&loja=...: subscribe before the first report
+        try:
+            subscription = Subscription.from_message(websocket.query_params)
+        except ValidationException as e:
+            await manager.send_personal_message(
+                {"tipo": "erro_inscricao", "erro": str(e)}, websocket
             )
-            logger.info("Relatório inicial enviado para o novo cliente WebSocket.")
+            subscription = Subscription()
+        _subscribe(manager, websocket, subscription)
+
+        # Envia o relatório atual imediatamente após a conexão
+        await _send_report(manager, report_cache, websocket, subscription)
 
-        # Mantém a conexão aberta esperando por mensagens (ou apenas para receber o broadcast)
+        # Mantém a conexão aberta esperando por inscrições (ou apenas para receber o broadcast)
         while True:
-            # Apenas espera (pode receber pings/pongs ou mensagens do cliente, se necessário)
-            await websocket.receive_text()
+            text = await websocket.receive_text()
+            await _handle_client_message(manager, report_cache, websocket, text)
 
     except WebSocketDisconnect:
         manager.disconnect(websocket)
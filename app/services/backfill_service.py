@@ -0,0 +1,170 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from app.repositories.database_repository import DatabaseWriter
+from app.services.data_parser_service import aiter_order_batches
+from app.services.data_service import AsyncDataClient, current_api_day
+from app.services.order_service import OrderInserter
+from app.services.sync_state_service import SyncStateService
+
+
+class RateLimiter:
+    """Spaces request starts at least ``1 / requests_per_second`` apart."""
+
+    def __init__(self, requests_per_second: float):
+        self.interval = 1.0 / requests_per_second if requests_per_second > 0 else 0.0
+        self._next_slot = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self) -> None:
+        if not self.interval:
+            return
+        async with self._lock:
+            loop = asyncio.get_running_loop()
+            now = loop.time()
+            delay = self._next_slot - now
+            self._next_slot = max(now, self._next_slot) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+class BackfillService:
+    """
+    Load historical orders day by day from the ``sells?r=`` API.
+
+    Days are fetched concurrently (bounded by ``concurrency`` and a request rate
+    limit) and each response is parsed and inserted in batches while it streams. Every day is
+    checkpointed in ``sync_state``, so a rerun skips the days already done. Days
+    that have not ended yet (the current API day) stay open, so the periodic task
+    keeps fetching their later orders. Writes run on ``writer``, which
+    ``inserter`` and ``sync_state`` must be built on.
+    """
+
+    def __init__(
+        self,
+        data_client: AsyncDataClient,
+        inserter: OrderInserter,
+        sync_state: SyncStateService,
+        writer: DatabaseWriter,
+        concurrency: int = 4,
+        requests_per_second: float = 2.0,
+        batch_size: int = 1000,
+    ):
+        self.data_client = data_client
+        self.inserter = inserter
+        self.sync_state = sync_state
+        self.writer = writer
+        self.concurrency = concurrency
+        self.requests_per_second = requests_per_second
+        self.batch_size = batch_size
+        self.last_summary: Optional[Dict[str, Any]] = None
+        self._task: Optional[asyncio.Task] = None
+        self.logger = logging.getLogger(__name__)
+
+    @staticmethod
+    def days_in_range(data_inicio: str, data_fim: str) -> List[str]:
+        start = datetime.strptime(data_inicio, "%Y-%m-%d")
+        end = datetime.strptime(data_fim, "%Y-%m-%d")
+        if end < start:
+            raise ValueError("data_fim deve ser maior ou igual a data_inicio")
+        return [
+            (start + timedelta(days=i)).strftime("%Y-%m-%d")
+            for i in range((end - start).days + 1)
+        ]
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def _backfill_day(
+        self, day: str, semaphore: asyncio.Semaphore, limiter: RateLimiter
+    ) -> int:
+        async with semaphore:
+            await limiter.wait()
+            await self.writer.run(self.sync_state.mark_running, day)
+            try:
+                changes = await self.inserter.insert_changed_batches(
+                    aiter_order_batches(
+                        self.data_client.stream_sells(day), self.batch_size
+                    ),
+                    writer=self.writer,
+                )
+            except Exception as e:
+                await self.writer.run(self.sync_state.mark_error, day, str(e))
+                raise
+            # The current API day still receives orders: it is left open
+            closed = day < current_api_day().strftime("%Y-%m-%d")
+            await self.writer.run(
+                self.sync_state.record_sync,
+                day,
+                changes.seen,
+                len(changes),
+                changes.max_payment_date(),
+                closed=closed,
+            )
+            self.logger.info(
+                f"Backfill do dia {day}: {changes.seen} pedidos, {len(changes)} gravados"
+                + ("" if closed else " (dia em aberto)")
+            )
+            return len(changes)
+
+    async def run(
+        self,
+        data_inicio: str,
+        data_fim: str,
+        force: bool = False,
+        concurrency: Optional[int] = None,
+        requests_per_second: Optional[float] = None,
+    ) -> Dict[str, Any]:
+        """
+        Backfill every day between ``data_inicio`` and ``data_fim`` (API dates, inclusive).
+
+        Args:
+            force: Refetch days already checkpointed as done.
+
+        Returns:
+            A summary with the days processed, skipped and failed.
+        """
+        days = self.days_in_range(data_inicio, data_fim)
+        done = (
+            set()
+            if force
+            else await self.writer.run(self.sync_state.completed_days, days)
+        )
+        pending = [day for day in days if day not in done]
+        self.logger.info(
+            f"Backfill de {data_inicio} a {data_fim}: {len(pending)} dias pendentes, "
+            f"{len(done)} já concluídos"
+        )
+        semaphore = asyncio.Semaphore(concurrency or self.concurrency)
+        limiter = RateLimiter(requests_per_second or self.requests_per_second)
+        results = await asyncio.gather(
+            *(self._backfill_day(day, semaphore, limiter) for day in pending),
+            return_exceptions=True,
+        )
+        failed = {
+            day: str(result)
+            for day, result in zip(pending, results)
+            if isinstance(result, BaseException)
+        }
+        summary = {
+            "data_inicio": data_inicio,
+            "data_fim": data_fim,
+            "dias_totais": len(days),
+            "dias_ignorados": len(done),
+            "dias_concluidos": len(pending) - len(failed),
+            "dias_com_erro": failed,
+            "pedidos_gravados": sum(r for r in results if isinstance(r, int)),
+        }
+        self.last_summary = summary
+        self.logger.info(f"Backfill finalizado: {summary}")
+        return summary
+
+    def start(self, data_inicio: str, data_fim: str, **kwargs: Any) -> asyncio.Task:
+        """Run ``run`` as a background task; only one backfill may run at a time."""
+        if self.running:
+            raise RuntimeError("Já existe um backfill em andamento")
+        self._task = asyncio.create_task(self.run(data_inicio, data_fim, **kwargs))
+        return self._task
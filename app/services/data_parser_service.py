@@ -1,5 +1,91 @@
+import codecs
+import json
 import logging
+from operator import itemgetter
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence, Union
 from app.core.exceptions import ValidationException
+from app.services.data_service import PageBreak
+from app.services.order_service import ORDER_COLUMNS, OrderColumns, to_local_payment_dates
+
+# Payload keys that {cart_id: [order, ...]} payloads must always carry
+CART_REQUIRED_KEYS = frozenset((
+    "order", "ad", "sku", "profit", "title", "quantity",
+    "total_value", "payment_date", "status", "store"
+))
+
+# ORDER_COLUMNS column -> (payload key, default when the key is missing)
+ORDER_FIELDS = {
+    "order_id": ("order", ""),
+    "cart_id": ("cart", ""),
+    "ad": ("ad", ""),
+    "sku": ("sku", ""),
+    "title": ("title", ""),
+    "quantity": ("quantity", 0),
+    "total_value": ("total_value", 0),
+    "payment_date": ("payment_date", ""),
+    "status": ("status", ""),
+    "cost": ("cost", 0),
+    "gross_profit": ("gross_profit", 0),
+    "taxes": ("taxes", 0),
+    "freight": ("freight", 0),
+    "committee": ("committee", 0),
+    "fraction": ("fraction", 1),
+    "profitability": ("profitability", 0),
+    "rentability": ("rentability", 0),
+    "store": ("store", 0),
+    "profit": ("profit", 0),
+}
+
+
+def normalize_cart_order(cart_id: str, order: dict) -> Dict[str, Any]:
+    """Normalize an order nested under its cart id ({cart_id: [order, ...]} payloads)."""
+    return {
+        "order_id": order["order"],
+        "cart_id": cart_id,
+        "ad": order["ad"],
+        "sku": order["sku"],
+        "profit": order["profit"],
+        "title": order["title"],
+        "quantity": order["quantity"],
+        "total_value": order["total_value"],
+        "payment_date": order["payment_date"],
+        "status": order["status"],
+        "cost": order.get("cost", 0),
+        "gross_profit": order.get("gross_profit", 0),
+        "taxes": order.get("taxes", 0),
+        "freight": order.get("freight", 0),
+        "committee": order.get("committee", 0),
+        "fraction": order.get("fraction", 1),
+        "profitability": order.get("profitability", 0),
+        "rentability": order.get("rentability", 0),
+        "store": order["store"]
+    }
+
+
+def normalize_list_order(order: dict) -> Dict[str, Any]:
+    """Normalize an order from a flat [order, ...] payload."""
+    return {
+        "order_id": order.get("order", ""),
+        "cart_id": order.get("cart", ""),
+        "ad": order.get("ad", ""),
+        "sku": order.get("sku", ""),
+        "profit": order.get("profit", 0),
+        "title": order.get("title", ""),
+        "quantity": order.get("quantity", 0),
+        "total_value": order.get("total_value", 0),
+        "payment_date": order.get("payment_date", ""),
+        "status": order.get("status", ""),
+        "cost": order.get("cost", 0),
+        "gross_profit": order.get("gross_profit", 0),
+        "taxes": order.get("taxes", 0),
+        "freight": order.get("freight", 0),
+        "committee": order.get("committee", 0),
+        "fraction": order.get("fraction", 1),
+        "profitability": order.get("profitability", 0),
+        "rentability": order.get("rentability", 0),
+        "store": order.get("store", 0)
+    }
+
 
 class DataParser:
     def __init__(self, raw_data: dict):
@@ -14,54 +100,268 @@ class DataParser:
             if isinstance(self.raw_data, dict):
                 for cart_id, orders in self.raw_data.items():
                     for order in orders:
-                        orders_list.append({
-                            "order_id": order["order"],
-                            "cart_id": cart_id,
-                            "ad": order["ad"],
-                            "sku": order["sku"],
-                            "profit": order["profit"],
-                            "title": order["title"],
-                            "quantity": order["quantity"],
-                            "total_value": order["total_value"],
-                            "payment_date": order["payment_date"],
-                            "status": order["status"],
-                            "cost": order.get("cost", 0),
-                            "gross_profit": order.get("gross_profit", 0),
-                            "taxes": order.get("taxes", 0),
-                            "freight": order.get("freight", 0),
-                            "committee": order.get("committee", 0),
-                            "fraction": order.get("fraction", 1),
-                            "profitability": order.get("profitability", 0),
-                            "rentability": order.get("rentability", 0),
-                            "store": order["store"]
-                        })
+                        orders_list.append(normalize_cart_order(cart_id, order))
                         total_orders += 1
             elif isinstance(self.raw_data, list):
                 for order in self.raw_data:
-                    orders_list.append({
-                        "order_id": order.get("order", ""),
-                        "cart_id": order.get("cart", ""),
-                        "ad": order.get("ad", ""),
-                        "sku": order.get("sku", ""),
-                        "profit": order.get("profit", 0),
-                        "title": order.get("title", ""),
-                        "quantity": order.get("quantity", 0),
-                        "total_value": order.get("total_value", 0),
-                        "payment_date": order.get("payment_date", ""),
-                        "status": order.get("status", ""),
-                        "cost": order.get("cost", 0),
-                        "gross_profit": order.get("gross_profit", 0),
-                        "taxes": order.get("taxes", 0),
-                        "freight": order.get("freight", 0),
-                        "committee": order.get("committee", 0),
-                        "fraction": order.get("fraction", 1),
-                        "profitability": order.get("profitability", 0),
-                        "rentability": order.get("rentability", 0),
-                        "store": order.get("store", 0)
-                    })
+                    orders_list.append(normalize_list_order(order))
                     total_orders += 1
             self.logger.info(f"Parse concluído: {total_orders} pedidos extraídos")
         except Exception as e:
             self.logger.exception(f"Erro ao parsear pedidos: {e}")
             raise ValidationException(f"Failed to parse order data: {e}") from e
         return orders_list
+
+    def parse_orders_columnar(self) -> OrderColumns:
+        """
+        Parse into one list per ORDER_COLUMNS column instead of a dict per order.
+
+        Defaults are applied and payment dates shifted to local time in bulk,
+        so the result goes to ``OrderInserter.insert_changed_columns`` as is.
+        """
+        cart_ids: Optional[List[Any]]
+        if isinstance(self.raw_data, dict):
+            orders: List[dict] = []
+            cart_keys: List[Any] = []
+            for cart_id, cart_orders in self.raw_data.items():
+                orders.extend(cart_orders)
+                cart_keys.extend([cart_id] * len(cart_orders))
+            cart_ids = cart_keys
+        elif isinstance(self.raw_data, list):
+            orders, cart_ids = self.raw_data, None
+        else:
+            orders, cart_ids = [], None
+        columns = order_columns(orders, cart_ids)
+        self.logger.info(f"Parse em colunas concluído: {len(columns)} pedidos extraídos")
+        return columns
+
+
+def order_columns(orders: Sequence[dict], cart_ids: Optional[Sequence[Any]] = None) -> OrderColumns:
+    """
+    Build an OrderColumns batch straight from raw API orders, one column at a time.
+
+    With ``cart_ids`` (one per order) the orders come from a {cart_id: [...]}
+    payload and its required keys are enforced; otherwise every key is optional,
+    as in ``normalize_list_order``.
+    """
+    columns: Dict[str, List[Any]] = {}
+    try:
+        for column in ORDER_COLUMNS:
+            key, default = ORDER_FIELDS[column]
+            if column == "cart_id" and cart_ids is not None:
+                columns[column] = list(cart_ids)
+            elif cart_ids is not None and key in CART_REQUIRED_KEYS:
+                columns[column] = list(map(itemgetter(key), orders))
+            else:
+                columns[column] = [order.get(key, default) for order in orders]
+        columns["payment_date"] = to_local_payment_dates(columns["payment_date"])
+    except (KeyError, TypeError, AttributeError, ValueError) as e:
+        raise ValidationException(f"Failed to parse order data: {e}") from e
+    return OrderColumns(columns)
+
+
+_WHITESPACE = " \t\n\r"
+
+
+class StreamingOrderParser:
+    """
+    Incremental parser for ``sells`` payloads fed as raw byte chunks.
+
+    Understands both ``{cart_id: [order, ...]}`` and ``[order, ...]`` bodies and
+    returns normalized orders as soon as each order object is complete, so only
+    the unparsed tail of the stream is held in memory.
+    """
+
+    def __init__(self, max_item_chars: int = 1024 * 1024):
+        self.max_item_chars = max_item_chars
+        self.total_orders = 0
+        self._decoder = json.JSONDecoder()
+        self._utf8 = codecs.getincrementaldecoder("utf-8")()
+        self._buffer = ""
+        self._pos = 0
+        # value, key, colon, cart, item, item_sep, cart_sep, done
+        self._state = "value"
+        self._mode: Optional[str] = None
+        self._cart_id: Optional[str] = None
+
+    def _skip_whitespace(self) -> bool:
+        buffer, pos = self._buffer, self._pos
+        while pos < len(buffer) and buffer[pos] in _WHITESPACE:
+            pos += 1
+        self._pos = pos
+        return pos < len(buffer)
+
+    def _decode_value(self) -> Any:
+        """Decode one complete JSON value at the cursor, or raise _Incomplete."""
+        try:
+            value, end = self._decoder.raw_decode(self._buffer, self._pos)
+        except json.JSONDecodeError:
+            if len(self._buffer) - self._pos > self.max_item_chars:
+                raise ValidationException("Objeto JSON inválido ou grande demais no payload")
+            raise _Incomplete()
+        self._pos = end
+        return value
+
+    def _expect(self, char: str) -> None:
+        found = self._buffer[self._pos]
+        if found != char:
+            raise ValidationException(
+                f"JSON inesperado na posição {self._pos}: esperado '{char}', obtido '{found}'"
+            )
+        self._pos += 1
+
+    def _emit(self, order: Any, out: List[Any]) -> None:
+        out.append((self._cart_id, order))
+
+    def _step(self, out: List[Any]) -> None:
+        state = self._state
+        if state == "value":
+            char = self._buffer[self._pos]
+            if char == "{":
+                self._mode, self._state = "dict", "key"
+            elif char == "[":
+                self._mode, self._state = "list", "item"
+            else:
+                raise ValidationException("Payload deve ser um objeto ou uma lista JSON")
+            self._pos += 1
+        elif state == "key":
+            if self._buffer[self._pos] == "}":
+                self._pos += 1
+                self._state = "done"
+                return
+            self._cart_id = self._decode_value()
+            self._state = "colon"
+        elif state == "colon":
+            self._expect(":")
+            self._state = "cart"
+        elif state == "cart":
+            if self._buffer[self._pos] == "[":
+                self._pos += 1
+                self._state = "item"
+            else:
+                # Not a list of orders: decode it whole and treat it as one
+                value = self._decode_value()
+                for order in value if isinstance(value, list) else [value]:
+                    self._emit(order, out)
+                self._state = "cart_sep"
+        elif state == "item":
+            if self._buffer[self._pos] == "]":
+                self._pos += 1
+                self._state = "cart_sep" if self._mode == "dict" else "done"
+                return
+            self._emit(self._decode_value(), out)
+            self._state = "item_sep"
+        elif state == "item_sep":
+            char = self._buffer[self._pos]
+            self._pos += 1
+            if char == ",":
+                self._state = "item"
+            elif char == "]":
+                self._state = "cart_sep" if self._mode == "dict" else "done"
+            else:
+                raise ValidationException(f"JSON inesperado na posição {self._pos - 1}")
+        elif state == "cart_sep":
+            char = self._buffer[self._pos]
+            self._pos += 1
+            if char == ",":
+                self._state = "key"
+            elif char == "}":
+                self._state = "done"
+            else:
+                raise ValidationException(f"JSON inesperado na posição {self._pos - 1}")
+        else:
+            raise ValidationException("Dados após o fim do payload JSON")
+
+    @property
+    def by_cart(self) -> bool:
+        """Whether the payload is a {cart_id: [order, ...]} object."""
+        return self._mode == "dict"
+
+    def feed_raw(self, chunk: bytes) -> List[Any]:
+        """Consume a chunk and return the ``(cart_id, order)`` pairs it completed, undecoded."""
+        try:
+            text = self._utf8.decode(chunk)
+        except UnicodeDecodeError as e:
+            raise ValidationException(f"Payload não é UTF-8 válido: {e}") from e
+        self._buffer = self._buffer[self._pos:] + text
+        self._pos = 0
+        out: List[Any] = []
+        try:
+            while self._skip_whitespace():
+                self._step(out)
+        except _Incomplete:
+            pass
+        self.total_orders += len(out)
+        return out
+
+    def close_raw(self) -> List[Any]:
+        """Flush the stream end; raises ValidationException if the payload is truncated."""
+        try:
+            tail = self._utf8.decode(b"", final=True)
+        except UnicodeDecodeError as e:
+            raise ValidationException(f"Payload não é UTF-8 válido: {e}") from e
+        out = self.feed_raw(tail.encode())
+        if self._state != "done" or self._skip_whitespace():
+            if self._state == "value" and not self._buffer.strip():
+                return out  # empty body
+            raise ValidationException("Payload JSON incompleto")
+        return out
+
+    def _normalize(self, pairs: List[Any]) -> List[Dict[str, Any]]:
+        try:
+            if self.by_cart:
+                return [normalize_cart_order(cart_id, order) for cart_id, order in pairs]
+            return [normalize_list_order(order) for _, order in pairs]
+        except Exception as e:
+            raise ValidationException(f"Failed to parse order data: {e}") from e
+
+    def to_columns(self, pairs: List[Any]) -> OrderColumns:
+        """Build an OrderColumns batch from ``feed_raw``/``close_raw`` output."""
+        orders = [order for _, order in pairs]
+        cart_ids = [cart_id for cart_id, _ in pairs] if self.by_cart else None
+        return order_columns(orders, cart_ids)
+
+    def feed(self, chunk: bytes) -> List[Dict[str, Any]]:
+        """Consume a chunk and return the normalized orders it completed."""
+        return self._normalize(self.feed_raw(chunk))
+
+    def close(self) -> List[Dict[str, Any]]:
+        """``close_raw`` returning normalized orders."""
+        return self._normalize(self.close_raw())
+
+
+class _Incomplete(Exception):
+    """The buffer ends before the next JSON value is complete."""
+
+
+async def aiter_order_batches(
+    chunks: AsyncIterator[Union[bytes, PageBreak]], batch_size: int
+) -> AsyncIterator[OrderColumns]:
+    """
+    Parse a streamed ``sells`` body into OrderColumns batches of at most ``batch_size`` orders.
+
+    Each ``PAGE_BREAK`` ends one JSON document and starts the next, so the
+    orders of a finished page are flushed as a (possibly short) batch.
+    """
+    parser = StreamingOrderParser()
+    pending: List[Any] = []
+    total_orders = 0
+    async for chunk in chunks:
+        if isinstance(chunk, PageBreak):
+            pending.extend(parser.close_raw())
+            for start in range(0, len(pending), batch_size):
+                yield parser.to_columns(pending[start:start + batch_size])
+            pending = []
+            total_orders += parser.total_orders
+            parser = StreamingOrderParser()
+            continue
+        pending.extend(parser.feed_raw(chunk))
+        while len(pending) >= batch_size:
+            yield parser.to_columns(pending[:batch_size])
+            del pending[:batch_size]
+    pending.extend(parser.close_raw())
+    for start in range(0, len(pending), batch_size):
+        yield parser.to_columns(pending[start:start + batch_size])
+    logging.getLogger(__name__).info(
+        f"Parse em streaming concluído: {total_orders + parser.total_orders} pedidos extraídos"
+    )
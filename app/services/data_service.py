@@ -1,8 +1,31 @@
+import asyncio
+import json
+from datetime import datetime, timedelta
 import requests
+import httpx
 import logging
-from typing import Optional, Any, Dict
+from typing import Optional, Any, AsyncIterator, Dict, Union
 from app.core.exceptions import APIException
-from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
+from app.config.constants import API_BASE_URL, API_SELLS_ENDPOINT
+from tenacity import (
+    AsyncRetrying,
+    retry,
+    stop_after_attempt,
+    wait_exponential,
+    retry_if_exception_type,
+)
+
+
+def current_api_day() -> datetime:
+    """
+    The day the sells API is currently receiving orders for.
+
+    The API works in UTC (BRT is UTC-3): from 21h BRT on, it is already tomorrow.
+    """
+    agora = datetime.now()
+    if agora.hour < 21:
+        return agora
+    return agora + timedelta(days=1)
 
 
 class Data:
@@ -30,3 +53,232 @@ class Data:
         except requests.RequestException as e:
             self.logger.exception(f"Erro ao fazer requisição para {self.url}: {e}")
             raise APIException(f"Failed to fetch data from {self.url}: {e}") from e
+
+
+class RetryableAPIError(APIException):
+    """Raised for transient API responses (5xx, 429) that are worth retrying."""
+    pass
+
+
+# Response header carrying the path (or URL) of the next page of a paginated payload
+NEXT_PAGE_HEADER = "X-Next-Page"
+
+
+class PageBreak:
+    """Yielded by ``AsyncDataClient.stream_bytes`` between the pages of a paginated response."""
+
+    def __repr__(self) -> str:
+        return "PAGE_BREAK"
+
+
+PAGE_BREAK = PageBreak()
+
+
+class AsyncDataClient:
+    """
+    Non-blocking client for the external sells API.
+
+    Wraps a pooled ``httpx.AsyncClient`` (keep-alive connections, timeouts) and
+    retries transient failures with exponential backoff via ``asyncio.sleep``,
+    so fetches never block the event loop. Response bodies larger than
+    ``max_response_bytes`` are rejected while streaming.
+    """
+
+    def __init__(
+        self,
+        session_token: str,
+        base_url: str = API_BASE_URL,
+        timeout_seconds: float = 30.0,
+        max_connections: int = 10,
+        max_keepalive_connections: int = 5,
+        max_response_bytes: int = 50 * 1024 * 1024,
+        retry_attempts: int = 3,
+        retry_wait_min: float = 1.0,
+        retry_wait_max: float = 10.0,
+        max_pages: int = 1000,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        self.base_url = base_url
+        self.cookies = {"session": session_token}
+        self.timeout = httpx.Timeout(timeout_seconds)
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+        )
+        self.max_response_bytes = max_response_bytes
+        self.retry_attempts = retry_attempts
+        self.retry_wait_min = retry_wait_min
+        self.retry_wait_max = retry_wait_max
+        self.max_pages = max_pages
+        self.transport = transport
+        self._client: Optional[httpx.AsyncClient] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.logger = logging.getLogger(__name__)
+        self.logger.info(f"AsyncDataClient inicializado com URL base: {self.base_url}")
+
+    @staticmethod
+    def sells_path(data_inicio: str, data_fim: Optional[str] = None) -> str:
+        """Build the ``sells?r=`` path for a single day or a date range."""
+        if data_fim and data_fim != data_inicio:
+            return f"{API_SELLS_ENDPOINT}?r={data_inicio}/{data_fim}"
+        return f"{API_SELLS_ENDPOINT}?r={data_inicio}"
+
+    async def _get_client(self) -> httpx.AsyncClient:
+        # Pooled connections belong to the loop that opened them
+        loop = asyncio.get_running_loop()
+        client = self._client
+        if client is not None and not client.is_closed and self._loop is not loop:
+            await self._close_stale_client(client, self._loop)
+        if self._client is None or self._client.is_closed or self._loop is not loop:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                cookies=self.cookies,
+                timeout=self.timeout,
+                limits=self.limits,
+                transport=self.transport,
+            )
+            self._loop = loop
+        return self._client
+
+    async def _close_stale_client(
+        self, client: httpx.AsyncClient, loop: Optional[asyncio.AbstractEventLoop]
+    ) -> None:
+        """Close a pool opened on another event loop instead of leaking it."""
+        try:
+            if loop is not None and loop.is_running():
+                # Still serving another thread: close it on its own loop
+                asyncio.run_coroutine_threadsafe(client.aclose(), loop)
+            else:
+                await client.aclose()
+        except Exception as e:
+            self.logger.warning(f"Erro ao fechar cliente HTTP de outro event loop: {e}")
+        else:
+            self.logger.info("Cliente HTTP de outro event loop encerrado")
+
+    def _check_response(self, response: httpx.Response, path: str) -> None:
+        if response.status_code >= 500 or response.status_code == 429:
+            raise RetryableAPIError(
+                f"API respondeu {response.status_code} para {path}"
+            )
+        if response.status_code >= 400:
+            raise APIException(f"API respondeu {response.status_code} para {path}")
+        content_length = int(response.headers.get("content-length") or 0)
+        if content_length > self.max_response_bytes:
+            raise APIException(
+                f"Resposta de {content_length} bytes excede o limite de {self.max_response_bytes}"
+            )
+
+    def _retrying(self) -> AsyncRetrying:
+        return AsyncRetrying(
+            stop=stop_after_attempt(self.retry_attempts),
+            wait=wait_exponential(
+                multiplier=1, min=self.retry_wait_min, max=self.retry_wait_max
+            ),
+            retry=retry_if_exception_type((httpx.TransportError, RetryableAPIError)),
+            reraise=True,
+        )
+
+    async def _fetch(self, path: str) -> bytes:
+        client = await self._get_client()
+        async with client.stream("GET", path) as response:
+            self._check_response(response, path)
+            body = bytearray()
+            async for chunk in response.aiter_bytes():
+                body.extend(chunk)
+                if len(body) > self.max_response_bytes:
+                    raise APIException(
+                        f"Resposta excede o limite de {self.max_response_bytes} bytes"
+                    )
+            return bytes(body)
+
+    async def get_json(self, path: str) -> Any:
+        """GET ``path`` relative to the base URL and decode the JSON body."""
+        self.logger.info(f"Fazendo requisição GET assíncrona para {self.base_url}{path}")
+        try:
+            async for attempt in self._retrying():
+                with attempt:
+                    body = await self._fetch(path)
+        except (httpx.HTTPError, APIException) as e:
+            self.logger.exception(f"Erro ao fazer requisição para {path}: {e}")
+            if isinstance(e, APIException):
+                raise
+            raise APIException(f"Failed to fetch data from {path}: {e}") from e
+        self.logger.info(f"Requisição bem-sucedida: {len(body)} bytes recebidos")
+        try:
+            return json.loads(body)
+        except ValueError as e:
+            raise APIException(f"Invalid JSON received from {path}: {e}") from e
+
+    async def get_sells(self, data_inicio: str, data_fim: Optional[str] = None) -> Any:
+        """Fetch the raw sells payload for a day or date range."""
+        return await self.get_json(self.sells_path(data_inicio, data_fim))
+
+    async def _open_stream(self, path: str) -> httpx.Response:
+        client = await self._get_client()
+        async for attempt in self._retrying():
+            with attempt:
+                response = await client.send(client.build_request("GET", path), stream=True)
+                try:
+                    self._check_response(response, path)
+                except Exception:
+                    await response.aclose()
+                    raise
+        return response
+
+    async def stream_bytes(self, path: str) -> AsyncIterator[Union[bytes, PageBreak]]:
+        """
+        GET ``path`` and yield the raw body chunk by chunk.
+
+        Paginated responses (an ``X-Next-Page`` header with the next page's path
+        or URL) are followed, with ``PAGE_BREAK`` yielded between pages since
+        each page is a JSON document of its own. Only opening each page is
+        retried; once chunks have been yielded a failure is raised to the
+        caller, which may already have consumed them.
+        """
+        received = 0
+        pages = 0
+        next_path: Optional[str] = path
+        while next_path:
+            current = next_path
+            self.logger.info(f"Fazendo requisição GET em streaming para {self.base_url}{current}")
+            try:
+                response = await self._open_stream(current)
+            except (httpx.HTTPError, APIException) as e:
+                self.logger.exception(f"Erro ao fazer requisição para {current}: {e}")
+                if isinstance(e, APIException):
+                    raise
+                raise APIException(f"Failed to fetch data from {current}: {e}") from e
+            next_path = response.headers.get(NEXT_PAGE_HEADER)
+            try:
+                async for chunk in response.aiter_bytes():
+                    received += len(chunk)
+                    if received > self.max_response_bytes:
+                        raise APIException(
+                            f"Resposta excede o limite de {self.max_response_bytes} bytes"
+                        )
+                    yield chunk
+            except httpx.HTTPError as e:
+                raise APIException(f"Failed to stream data from {current}: {e}") from e
+            finally:
+                await response.aclose()
+            pages += 1
+            if next_path:
+                if pages >= self.max_pages:
+                    raise APIException(
+                        f"Paginação de {path} excede o limite de {self.max_pages} páginas"
+                    )
+                yield PAGE_BREAK
+        self.logger.info(f"Streaming concluído: {received} bytes recebidos em {pages} página(s)")
+
+    async def stream_sells(
+        self, data_inicio: str, data_fim: Optional[str] = None
+    ) -> AsyncIterator[Union[bytes, PageBreak]]:
+        """Stream the raw sells payload for a day or date range."""
+        async for chunk in self.stream_bytes(self.sells_path(data_inicio, data_fim)):
+            yield chunk
+
+    async def aclose(self) -> None:
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+            self.logger.info("AsyncDataClient encerrado")
+        self._client = None
@@ -0,0 +1,111 @@
+import hashlib
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from email.utils import format_datetime
+from typing import Any, Dict, Optional
+
+from app.services.ml_service import model_version
+from app.services.sku_nicho_cache import SKU_NICHOS_VERSION
+
+RANGE_VERSION_SQL = """
+    SELECT COALESCE(MAX(versao), 0), COALESCE(SUM(pedidos), 0), COUNT(*), MAX(updated_at)
+    FROM order_day_versions WHERE dia BETWEEN ? AND ?
+"""
+
+
+@dataclass(frozen=True)
+class DataVersion:
+    """Validators of a range response: a weak ETag and the last order write."""
+
+    etag: str
+    last_modified: Optional[datetime] = None
+
+    def matches(self, if_none_match: Optional[str]) -> bool:
+        """Whether an ``If-None-Match`` header names this version (weak comparison)."""
+        if not if_none_match:
+            return False
+        tags = [tag.strip() for tag in if_none_match.split(",")]
+        return "*" in tags or any(
+            tag.removeprefix("W/") == self.etag.removeprefix("W/") for tag in tags
+        )
+
+    def headers(self) -> Dict[str, str]:
+        # no-cache: browsers keep the body but revalidate it on every use
+        headers = {"ETag": self.etag, "Cache-Control": "private, no-cache"}
+        if self.last_modified is not None:
+            headers["Last-Modified"] = format_datetime(self.last_modified, usegmt=True)
+        return headers
+
+
+class DataVersionService:
+    """
+    Cheap data versions of date ranges, for conditional GETs.
+
+    ``OrderInserter`` stamps every day it writes in ``order_day_versions``
+    with the next write sequence of orders and the day's order count, so the
+    version of a range is one indexed aggregate over at most one row per day:
+    the highest sequence and the total count only move when an order of the
+    range was written, moved or deleted. Report versions also cover the
+    inputs of ``generate_relatorio_flex`` besides orders: the SKU/niche map,
+    the model files and the current day (forecasts start tomorrow).
+    """
+
+    def __init__(self, db):
+        self.db = db
+
+    @staticmethod
+    def _validate(data_inicio: str, data_fim: str) -> None:
+        datetime.strptime(data_inicio, "%Y-%m-%d")
+        datetime.strptime(data_fim, "%Y-%m-%d")
+
+    def _version(
+        self, kind: str, data_inicio: str, data_fim: str, *extra: Any
+    ) -> DataVersion:
+        cursor = self.db.conn.cursor()
+        cursor.execute(RANGE_VERSION_SQL, (data_inicio, data_fim))
+        versao, pedidos, dias, updated_at = cursor.fetchone()
+        parts = [kind, data_inicio, data_fim, versao, pedidos, dias, *extra]
+        digest = hashlib.blake2b(
+            ":".join(str(part) for part in parts).encode(), digest_size=12
+        ).hexdigest()
+        last_modified = None
+        if updated_at:
+            # CURRENT_TIMESTAMP is UTC
+            last_modified = datetime.strptime(updated_at, "%Y-%m-%d %H:%M:%S").replace(
+                tzinfo=timezone.utc
+            )
+        return DataVersion(f'W/"{digest}"', last_modified)
+
+    def orders_version(self, data_inicio: str, data_fim: str) -> DataVersion:
+        """
+        Version of the orders paid between ``data_inicio`` and ``data_fim``.
+
+        Raises:
+            ValueError: If a date is not YYYY-MM-DD.
+        """
+        self._validate(data_inicio, data_fim)
+        return self._version("pedidos", data_inicio, data_fim)
+
+    def report_version(
+        self, data_inicio: Optional[str] = None, data_fim: Optional[str] = None
+    ) -> DataVersion:
+        """
+        Version of ``generate_relatorio_flex(data_inicio, data_fim)``.
+
+        Missing dates default to today, as in the report.
+
+        Raises:
+            ValueError: If a date is not YYYY-MM-DD.
+        """
+        hoje = datetime.today().strftime("%Y-%m-%d")
+        if not data_inicio or not data_fim:
+            data_inicio = data_fim = hoje
+        self._validate(data_inicio, data_fim)
+        cursor = self.db.conn.cursor()
+        cursor.execute(
+            "SELECT version FROM cache_versions WHERE name = ?", (SKU_NICHOS_VERSION,)
+        )
+        sku_nichos = cursor.fetchone()[0]
+        return self._version(
+            "relatorio", data_inicio, data_fim, sku_nichos, model_version(), hoje
+        )
@@ -17,7 +17,16 @@ class DatabaseService:
         self.logger.info("Criando tabelas no banco de dados")
         table_creator = TableCreator(self.database)
         table_creator.create_orders_table()
+        table_creator.create_orders_search_index()
         table_creator.create_sku_nichos_table()
+        table_creator.create_sku_nichos_search_index()
+        table_creator.create_sync_state_table()
+        table_creator.create_order_hashes_table()
+        table_creator.create_report_bus_table()
+        table_creator.create_leader_lease_table()
+        table_creator.create_nicho_rules_table()
+        table_creator.create_cache_versions_table()
+        table_creator.create_order_day_versions_table()
         self.logger.info("Tabelas criadas/verificadas com sucesso")
 
     def close(self):
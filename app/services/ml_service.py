@@ -1,16 +1,53 @@
 import pandas as pd
+import numpy as np
 from joblib import dump, load
 import lightgbm as lgb
 import os
+import json
+import shutil
 import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
 from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+from app.config.settings import settings
 
 logger = logging.getLogger(__name__)
 PROJECT_ROOT = Path(__file__).resolve().parent.parent.parent
 MODEL_PATH = PROJECT_ROOT / "models" / "profit_forecast_model.pkl"
 MODEL_PATH_STR = str(MODEL_PATH)
+NATIVE_MODEL_PATH_STR = str(MODEL_PATH.with_suffix(".txt"))
+MODEL_METADATA_PATH_STR = str(MODEL_PATH.with_suffix(".json"))
+PARTITIONED_MODEL_DIR_STR = str(PROJECT_ROOT / "models" / "particoes")
+PARTITION_INDEX_FILENAME = "index.json"
+PARTITION_COLUMNS = ("nicho", "store")
 logger.info(f"Caminho absoluto do modelo definido como: {MODEL_PATH_STR}")
 
+FEATURES = [
+    "lucro_liquido",
+    "total_value",
+    "quantity",
+    "cost",
+    "freight",
+    "taxes",
+    "sku_avg_profit",
+    "nicho_avg_profit",
+    "store_avg_profit",
+    "weekday",
+    "hour",
+    "month",
+]
+
+LGBM_PARAMS: Dict[str, Any] = {
+    "n_estimators": 1000,
+    "learning_rate": 0.05,
+    "num_leaves": 31,
+}
+
+# Loaded models keyed by path, invalidated when the file's mtime changes
+_model_cache: Dict[str, Tuple[float, Any]] = {}
+
 
 def extract_features(df: pd.DataFrame) -> pd.DataFrame:
     logger.info("Extraindo features do dataframe")
@@ -28,8 +65,8 @@ def extract_features(df: pd.DataFrame) -> pd.DataFrame:
     return df
 
 
-def train_ml_model(df: pd.DataFrame):
-    logger.info("Iniciando treinamento do modelo ML de lucro_liquido")
+def _build_training_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """Extract features and attach each SKU's next-order profit as the target."""
     df_feat = extract_features(df)
     df_feat = df_feat.sort_values(["sku", "payment_date"])
     df_feat["target_lucro_liquido_next"] = df_feat.groupby("sku")[
@@ -37,28 +74,20 @@ def train_ml_model(df: pd.DataFrame):
     ].shift(-1)
     df_train = df_feat.dropna(subset=["target_lucro_liquido_next"])
     logger.info(f"{len(df_train)} registros disponíveis para treinar com target futuro")
+    return df_train
+
+
+def train_ml_model(df: pd.DataFrame):
+    logger.info("Iniciando treinamento do modelo ML de lucro_liquido")
+    df_train = _build_training_frame(df)
     if df_train.empty:
         logger.warning(
             "Nenhum SKU tem mais de um pedido. Treinamento não será possível."
         )
         return None
-    features = [
-        "lucro_liquido",
-        "total_value",
-        "quantity",
-        "cost",
-        "freight",
-        "taxes",
-        "sku_avg_profit",
-        "nicho_avg_profit",
-        "store_avg_profit",
-        "weekday",
-        "hour",
-        "month",
-    ]
-    X = df_train[features]
+    X = df_train[FEATURES]
     y = df_train["target_lucro_liquido_next"]
-    model = lgb.LGBMRegressor(n_estimators=1000, learning_rate=0.05, num_leaves=31)
+    model = lgb.LGBMRegressor(**LGBM_PARAMS)
     model.fit(X, y)
     logger.info("Modelo treinado com sucesso")
     model_dir = Path(MODEL_PATH_STR).parent
@@ -67,41 +96,303 @@ def train_ml_model(df: pd.DataFrame):
         logger.info(f"Pasta '{model_dir}' criada")
     dump(model, MODEL_PATH_STR)
     logger.info(f"Modelo salvo em {MODEL_PATH_STR}")
+    export_native_model(model, build_model_metadata(model, df_train, X, y))
     return model
 
 
-def predict_sales_for_df(df: pd.DataFrame):
-    logger.info("Iniciando previsão de lucro_liquido")
-    if not Path(MODEL_PATH_STR).exists():
-        logger.error(
-            f"Modelo ML não encontrado em {MODEL_PATH_STR}. Execute train_ml_model() primeiro."
-        )
-        raise FileNotFoundError(
-            f"Modelo ML não encontrado. Execute train_ml_model() primeiro. Esperado em: {MODEL_PATH_STR}"
+def _fit_partition_model(
+    model_path: str, X: pd.DataFrame, y: pd.Series, n_jobs: int
+) -> Dict[str, Any]:
+    """Fit and save one partition's booster. Runs inside a worker process."""
+    model = lgb.LGBMRegressor(**LGBM_PARAMS, n_jobs=n_jobs, verbose=-1)
+    model.fit(X, y)
+    model.booster_.save_model(model_path)
+    residuals = model.predict(X) - y.to_numpy()
+    return {
+        "amostras": int(len(y)),
+        "rmse": float(np.sqrt(np.mean(residuals**2))),
+        "mae": float(np.mean(np.abs(residuals))),
+    }
+
+
+def train_partitioned_models(
+    df: pd.DataFrame,
+    partition: str = "nicho",
+    max_workers: Optional[int] = None,
+    min_samples: Optional[int] = None,
+    model_dir: Optional[str] = None,
+) -> Optional[Dict[str, Any]]:
+    """
+    Train one model per niche (or store) concurrently on a process pool.
+
+    Partitions with fewer than ``min_samples`` training rows are skipped and
+    served by the global model at prediction time. The models are written to
+    a new versioned directory under ``model_dir``, then the ``index.json``
+    describing them replaces the previous one in a single rename, so a
+    reload during retraining sees either the old run or the new one. The
+    previous run's directory is kept for readers still loading it.
+
+    Returns:
+        The partition index, or None when there is nothing to train.
+    """
+    if partition not in PARTITION_COLUMNS:
+        raise ValueError(f"Partição inválida: {partition}. Use {PARTITION_COLUMNS}")
+    max_workers = max_workers or settings.ml_training_workers or os.cpu_count() or 1
+    min_samples = min_samples or settings.ml_partition_min_samples
+    model_dir = model_dir or PARTITIONED_MODEL_DIR_STR
+
+    df_train = _build_training_frame(df)
+    df_train = df_train.dropna(subset=[partition])
+    groups = df_train.groupby(partition, sort=False)
+    sizes = groups.size()
+    eligible = sizes[sizes >= min_samples].index.tolist()
+    logger.info(
+        f"Treinando {len(eligible)} modelos por {partition} "
+        f"({len(sizes) - len(eligible)} com menos de {min_samples} amostras usam o global)"
+    )
+    if not eligible:
+        return None
+
+    version = datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+    os.makedirs(os.path.join(model_dir, version))
+    # Split the cores between workers so concurrent boosters don't oversubscribe
+    n_jobs = max(1, (os.cpu_count() or 1) // max_workers)
+    index: Dict[str, Any] = {
+        "particao": partition,
+        "min_amostras": min_samples,
+        "features": FEATURES,
+        "treinado_em": datetime.now().isoformat(),
+        "versao": version,
+        "modelos": {},
+    }
+    # Spawned, not forked: the global model was just trained in this process,
+    # and a fork after LightGBM started its OpenMP threads can hang the workers
+    with ProcessPoolExecutor(
+        max_workers=max_workers, mp_context=multiprocessing.get_context("spawn")
+    ) as executor:
+        futures = {}
+        # One pass over the frame instead of a boolean scan per partition
+        partitions = (
+            (key, group) for key, group in groups if len(group) >= min_samples
         )
-    model = load(MODEL_PATH_STR)
-    logger.info("Modelo ML carregado com sucesso")
+        for i, (key, group) in enumerate(partitions):
+            filename = f"{version}/{partition}_{i:04d}.txt"
+            futures[str(key)] = (
+                filename,
+                executor.submit(
+                    _fit_partition_model,
+                    os.path.join(model_dir, filename),
+                    group[FEATURES],
+                    group["target_lucro_liquido_next"],
+                    n_jobs,
+                ),
+            )
+        for key, (filename, future) in futures.items():
+            index["modelos"][key] = {"arquivo": filename, **future.result()}
+
+    index_path = os.path.join(model_dir, PARTITION_INDEX_FILENAME)
+    previous = _index_version(index_path)
+    tmp_path = f"{index_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(index, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, index_path)
+    for entry in os.scandir(model_dir):
+        if entry.is_dir() and entry.name not in (version, previous):
+            shutil.rmtree(entry.path, ignore_errors=True)
+    logger.info(
+        f"{len(index['modelos'])} modelos por {partition} salvos em {model_dir}"
+    )
+    return index
+
+
+def _index_version(index_path: str) -> Optional[str]:
+    try:
+        with open(index_path, encoding="utf-8") as f:
+            return json.load(f).get("versao")
+    except (OSError, ValueError):
+        return None
+
+
+class PartitionedModelRouter:
+    """
+    Route each row to its partition's model, falling back to the global model.
+
+    ``predict`` takes the full feature frame, since it needs the partition
+    column to pick a model for each row.
+    """
+
+    def __init__(self, partition: str, models: Dict[str, Any], fallback: Any):
+        self.partition = partition
+        self.models = models
+        self.fallback = fallback
+
+    def predict(self, df_feat: pd.DataFrame) -> np.ndarray:
+        X = df_feat[FEATURES]
+        keys = df_feat[self.partition].astype(str).to_numpy()
+        predictions = np.empty(len(df_feat), dtype=float)
+        routed = np.zeros(len(df_feat), dtype=bool)
+        for key, model in self.models.items():
+            mask = keys == key
+            if mask.any():
+                predictions[mask] = model.predict(X[mask])
+                routed |= mask
+        if not routed.all():
+            predictions[~routed] = self.fallback.predict(X[~routed])
+        return predictions
+
+
+def load_partitioned_models(
+    model_dir: Optional[str] = None,
+) -> Optional[Tuple[str, Dict[str, Any]]]:
+    """Load the partition index and its boosters, cached until the index changes."""
+    index_path = os.path.join(
+        model_dir or PARTITIONED_MODEL_DIR_STR, PARTITION_INDEX_FILENAME
+    )
+    if not Path(index_path).exists():
+        return None
+    mtime = os.path.getmtime(index_path)
+    cached = _model_cache.get(index_path)
+    if cached and cached[0] == mtime:
+        return cached[1]
+    with open(index_path, encoding="utf-8") as f:
+        index = json.load(f)
+    base_dir = os.path.dirname(index_path)
+    models = {
+        key: lgb.Booster(model_file=os.path.join(base_dir, info["arquivo"]))
+        for key, info in index["modelos"].items()
+    }
+    loaded = (index["particao"], models)
+    _model_cache[index_path] = (mtime, loaded)
+    logger.info(
+        f"{len(models)} modelos por {index['particao']} carregados de {base_dir}"
+    )
+    return loaded
+
+
+def build_model_metadata(
+    model: lgb.LGBMRegressor, df_train: pd.DataFrame, X: pd.DataFrame, y: pd.Series
+) -> Dict[str, Any]:
+    """Describe a trained model: feature list, training window and fit metrics."""
+    residuals = model.predict(X) - y.to_numpy()
+    payment_dates = df_train["payment_date"].dropna()
+    return {
+        "features": list(X.columns),
+        "janela_treino": {
+            "inicio": (
+                payment_dates.min().isoformat() if not payment_dates.empty else None
+            ),
+            "fim": payment_dates.max().isoformat() if not payment_dates.empty else None,
+        },
+        "metricas": {
+            "amostras": int(len(y)),
+            "rmse": float(np.sqrt(np.mean(residuals**2))),
+            "mae": float(np.mean(np.abs(residuals))),
+        },
+        "params": model.get_params(),
+        "lightgbm_version": lgb.__version__,
+        "treinado_em": datetime.now().isoformat(),
+    }
+
+
+def export_native_model(
+    model: Any,
+    metadata: Optional[Dict[str, Any]] = None,
+    model_path: Optional[str] = None,
+    metadata_path: Optional[str] = None,
+) -> None:
+    """
+    Save the booster in LightGBM's native text format plus a JSON metadata sidecar.
+
+    The native file can be loaded with ``lgb.Booster`` alone, without unpickling
+    the sklearn wrapper.
+    """
+    model_path = model_path or NATIVE_MODEL_PATH_STR
+    metadata_path = metadata_path or MODEL_METADATA_PATH_STR
+    booster = model.booster_ if hasattr(model, "booster_") else model
+    booster.save_model(model_path)
+    metadata = dict(metadata or {})
+    metadata.setdefault("features", booster.feature_name())
+    with open(metadata_path, "w", encoding="utf-8") as f:
+        json.dump(metadata, f, ensure_ascii=False, indent=2, default=str)
+    logger.info(f"Modelo nativo salvo em {model_path} (metadados em {metadata_path})")
+
+
+def load_model_metadata(metadata_path: Optional[str] = None) -> Dict[str, Any]:
+    """Read the metadata sidecar written by ``export_native_model``."""
+    with open(metadata_path or MODEL_METADATA_PATH_STR, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def model_version() -> str:
+    """
+    Modification times of the model files forecasts may read.
+
+    Changes whenever a retrained model would be picked up by ``load_model`` or
+    ``load_partitioned_models``, without loading anything.
+    """
+    paths = (
+        NATIVE_MODEL_PATH_STR,
+        MODEL_PATH_STR,
+        os.path.join(PARTITIONED_MODEL_DIR_STR, PARTITION_INDEX_FILENAME),
+    )
+    return ":".join(
+        str(os.path.getmtime(path)) if Path(path).exists() else "-" for path in paths
+    )
+
+
+def load_model() -> Any:
+    """
+    Load the forecast model, preferring the native LightGBM file over the pickle.
+
+    Loaded models are cached per process and reloaded only when the file changes.
+    """
+    for path in (NATIVE_MODEL_PATH_STR, MODEL_PATH_STR):
+        if not Path(path).exists():
+            continue
+        mtime = os.path.getmtime(path)
+        cached = _model_cache.get(path)
+        if cached and cached[0] == mtime:
+            return cached[1]
+        if path == NATIVE_MODEL_PATH_STR:
+            model = lgb.Booster(model_file=path)
+            if model.feature_name() != FEATURES:
+                logger.warning(
+                    f"Features do modelo nativo divergem das esperadas: {model.feature_name()}"
+                )
+        else:
+            model = load(path)
+        _model_cache[path] = (mtime, model)
+        logger.info(f"Modelo ML carregado de {path}")
+        return model
+    logger.error(
+        f"Modelo ML não encontrado em {MODEL_PATH_STR}. Execute train_ml_model() primeiro."
+    )
+    raise FileNotFoundError(
+        f"Modelo ML não encontrado. Execute train_ml_model() primeiro. Esperado em: {MODEL_PATH_STR}"
+    )
+
+
+def predict_sales_for_df(df: pd.DataFrame, partition: Optional[str] = None):
+    logger.info("Iniciando previsão de lucro_liquido")
+    model = load_model()
+    partition = partition or settings.ml_model_partition
+    if partition != "global":
+        partitioned = load_partitioned_models()
+        if partitioned and partitioned[0] == partition:
+            model = PartitionedModelRouter(partition, partitioned[1], fallback=model)
+        else:
+            logger.warning(
+                f"Modelos por {partition} não encontrados, usando apenas o modelo global"
+            )
     df_feat = extract_features(df)
     df_feat = df_feat.dropna(subset=["sku"])
     df_feat = df_feat.fillna(0)
-    features = [
-        "lucro_liquido",
-        "total_value",
-        "quantity",
-        "cost",
-        "freight",
-        "taxes",
-        "sku_avg_profit",
-        "nicho_avg_profit",
-        "store_avg_profit",
-        "weekday",
-        "hour",
-        "month",
-    ]
 
     # Previsões para dados históricos (para conclusões)
-    X = df_feat[features]
-    df_feat["forecast_lucro_liquido_next"] = model.predict(X)
+    if isinstance(model, PartitionedModelRouter):
+        df_feat["forecast_lucro_liquido_next"] = model.predict(df_feat)
+    else:
+        df_feat["forecast_lucro_liquido_next"] = model.predict(df_feat[FEATURES])
     logger.info("Previsão concluída para todos os registros históricos")
 
     # Previsões para os próximos 7 dias baseadas na média histórica diária
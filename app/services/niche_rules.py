@@ -0,0 +1,359 @@
+import logging
+import re
+import unicodedata
+from collections import Counter
+from dataclasses import dataclass
+from threading import Lock
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import pandas as pd
+
+from app.core.exceptions import ValidationException
+from app.services.order_service import ChangeSet
+
+RULE_PREFIX = "prefixo"
+RULE_REGEX = "regex"
+RULE_KEYWORD = "palavra_chave"
+RULE_TYPES = (RULE_PREFIX, RULE_REGEX, RULE_KEYWORD)
+
+# Row of cache_versions bumped by the nicho_rules triggers
+NICHO_RULES_VERSION = "nicho_rules"
+
+# Assignments listed in a dry run; the rest are only counted
+PREVIEW_LIMIT = 200
+
+# Group names and numbered backreferences would clash inside the combined pattern
+_UNSUPPORTED_REGEX = re.compile(r"\(\?P[<=]|\\[1-9]")
+
+
+@dataclass(frozen=True)
+class NicheRule:
+    id: int
+    tipo: str
+    padrao: str
+    nicho: str
+    prioridade: int = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "tipo": self.tipo,
+            "padrao": self.padrao,
+            "nicho": self.nicho,
+            "prioridade": self.prioridade,
+        }
+
+
+def fold(text: str) -> str:
+    """Case- and accent-insensitive form used for keyword matching."""
+    decomposed = unicodedata.normalize("NFKD", text.casefold())
+    return "".join(c for c in decomposed if not unicodedata.combining(c))
+
+
+def validate_rule(tipo: str, padrao: str, nicho: str) -> None:
+    if tipo not in RULE_TYPES:
+        raise ValidationException(
+            f"Tipo de regra inválido '{tipo}', use {', '.join(RULE_TYPES)}"
+        )
+    if not padrao or not padrao.strip():
+        raise ValidationException("O padrão da regra não pode ser vazio")
+    if not nicho or not nicho.strip():
+        raise ValidationException("O nicho da regra não pode ser vazio")
+    if tipo == RULE_REGEX:
+        if _UNSUPPORTED_REGEX.search(padrao):
+            raise ValidationException(
+                "Regex com grupos nomeados ou referências (\\1) não é suportada"
+            )
+        try:
+            # Compiled as it will sit inside the combined pattern
+            re.compile(f".*?(?:{padrao})")
+        except re.error as e:
+            raise ValidationException(f"Regex inválida: {e}") from e
+
+
+# Characters that end the literal prefix of a pattern
+_REGEX_SPECIAL = set(".^$*+?{}[]()|\\")
+_QUANTIFIERS = set("*+?{")
+
+
+def literal_prefix(pattern: str) -> str:
+    """
+    Literal text every match of a ``^``-anchored pattern starts with
+    (``^ABC-\\d+`` -> ``ABC-``), or "" when there is none to rely on.
+    """
+    if not pattern.startswith("^") or "|" in pattern:
+        return ""
+    prefix: List[str] = []
+    i = 1
+    while i < len(pattern):
+        char = pattern[i]
+        if char == "\\" and i + 1 < len(pattern) and not pattern[i + 1].isalnum():
+            char, step = pattern[i + 1], 2
+        elif char in _REGEX_SPECIAL:
+            break
+        else:
+            step = 1
+        if i + step < len(pattern) and pattern[i + step] in _QUANTIFIERS:
+            break  # "AB?" only guarantees "A"
+        prefix.append(char)
+        i += step
+    return "".join(prefix)
+
+
+def _best(rules: Iterable[NicheRule]) -> Optional[NicheRule]:
+    return min(rules, key=lambda r: (-r.prioridade, r.id), default=None)
+
+
+class PrefixTrie:
+    """Values keyed by prefix in a character trie; a lookup walks the SKU once."""
+
+    _VALUES = ""  # Key of the values stored on a node; real keys are single characters
+
+    def __init__(self):
+        self.root: Dict[str, Any] = {}
+
+    def add(self, prefix: str, value: Any) -> None:
+        node = self.root
+        for char in prefix:
+            node = node.setdefault(char, {})
+        node.setdefault(self._VALUES, []).append(value)
+
+    def matches(self, key: str) -> List[List[Any]]:
+        """Values of every prefix of ``key``, shortest prefix first."""
+        node = self.root
+        found: List[List[Any]] = []
+        if self._VALUES in node:
+            found.append(node[self._VALUES])
+        for char in key:
+            child: Optional[Dict[str, Any]] = node.get(char)
+            if child is None:
+                break
+            node = child
+            if self._VALUES in node:
+                found.append(node[self._VALUES])
+        return found
+
+
+class CompiledRules:
+    """
+    Every rule compiled into matchers applied once per SKU, never one scan
+    per rule:
+
+    - prefix rules: a ``PrefixTrie`` on the SKU (longest prefix wins);
+    - anchored regex rules with a literal prefix (``^ABC-\\d+``): indexed by
+      that prefix in a second trie, so only the few whose prefix the SKU
+      starts with are tried;
+    - other regex rules: one alternation, anchored at the start and tried in
+      priority order, so the first alternative that matches is the best one;
+    - keyword rules: one word-boundary alternation over the folded title.
+
+    The candidate with the highest ``prioridade`` wins; ties go to the prefix,
+    then the regex, then the keyword rule.
+    """
+
+    def __init__(self, rules: Iterable[NicheRule]):
+        self.rules = sorted(rules, key=lambda r: (-r.prioridade, r.id))
+        self.trie = PrefixTrie()
+        self.regex_trie = PrefixTrie()
+        self._regex_rules: Dict[str, NicheRule] = {}
+        self._keyword_rules: Dict[str, NicheRule] = {}
+        alternatives = []
+        for rule in self.rules:
+            if rule.tipo == RULE_PREFIX:
+                self.trie.add(rule.padrao.strip(), rule)
+            elif rule.tipo == RULE_REGEX:
+                prefix = literal_prefix(rule.padrao)
+                if prefix:
+                    self.regex_trie.add(prefix, (re.compile(rule.padrao), rule))
+                else:
+                    group = f"r{rule.id}"
+                    self._regex_rules[group] = rule
+                    alternatives.append(f"(?P<{group}>.*?(?:{rule.padrao}))")
+            else:
+                self._keyword_rules.setdefault(fold(rule.padrao.strip()), rule)
+        self.regex = re.compile("|".join(alternatives)) if alternatives else None
+        # Longest keywords first, so "cama box" is preferred over "cama"
+        keywords = sorted(self._keyword_rules, key=len, reverse=True)
+        self.keywords = (
+            re.compile(r"\b(?:" + "|".join(map(re.escape, keywords)) + r")\b")
+            if keywords
+            else None
+        )
+
+    def __len__(self) -> int:
+        return len(self.rules)
+
+    def _match_prefix(self, sku: str) -> Optional[NicheRule]:
+        found = self.trie.matches(sku)
+        return _best(found[-1]) if found else None
+
+    def _match_regex(self, sku: str) -> Optional[NicheRule]:
+        candidates = [
+            rule
+            for values in self.regex_trie.matches(sku)
+            for pattern, rule in values
+            if pattern.search(sku)
+        ]
+        if self.regex is not None:
+            match = self.regex.match(sku)
+            # Every alternative is a named group, so a match always has one
+            if match and match.lastgroup is not None:
+                candidates.append(self._regex_rules[match.lastgroup])
+        return _best(candidates)
+
+    def _match_keyword(self, title: Optional[str]) -> Optional[NicheRule]:
+        if self.keywords is None or not title:
+            return None
+        found = {m.group(0) for m in self.keywords.finditer(fold(title))}
+        return _best(self._keyword_rules[k] for k in found)
+
+    def classify(self, sku: str, title: Optional[str] = None) -> Optional[NicheRule]:
+        best = None
+        for rule in (
+            self._match_prefix(sku),
+            self._match_regex(sku),
+            self._match_keyword(title),
+        ):
+            if rule is not None and (best is None or rule.prioridade > best.prioridade):
+                best = rule
+        return best
+
+
+class NicheRuleEngine:
+    """
+    Niche rules stored in ``nicho_rules`` and applied to SKUs without a niche.
+
+    The compiled rules are cached and rebuilt when the ``cache_versions`` row
+    bumped by the ``nicho_rules`` triggers changes. ``classify_unmapped``
+    labels every unmapped SKU seen in orders in one pass (or only reports
+    what it would do, as a dry run); ``classify_changes`` does the same for
+    the SKUs of freshly ingested orders. Existing mappings are never changed.
+    Rules that write (``classify_changes``, ``classify_unmapped`` outside a
+    dry run) are run on the writer thread, which ``inserter`` is built on.
+    """
+
+    def __init__(self, db, inserter, sku_nichos):
+        self.db = db
+        self.inserter = inserter
+        self.sku_nichos = sku_nichos
+        self.assigned = 0
+        self._compiled: Optional[Tuple[int, CompiledRules]] = None
+        self._lock = Lock()
+        self.logger = logging.getLogger(__name__)
+
+    def list_rules(self) -> List[NicheRule]:
+        cursor = self.db.conn.cursor()
+        cursor.execute(
+            "SELECT id, tipo, padrao, nicho, prioridade FROM nicho_rules ORDER BY id"
+        )
+        return [NicheRule(*row) for row in cursor.fetchall()]
+
+    def add_rule(
+        self, tipo: str, padrao: str, nicho: str, prioridade: int = 0
+    ) -> NicheRule:
+        validate_rule(tipo, padrao, nicho)
+        cursor = self.db.conn.cursor()
+        cursor.execute(
+            "INSERT INTO nicho_rules (tipo, padrao, nicho, prioridade) VALUES (?, ?, ?, ?)",
+            (tipo, padrao, nicho.strip(), prioridade),
+        )
+        self.db.conn.commit()
+        self.logger.info(f"Regra de nicho criada: {tipo} '{padrao}' -> '{nicho}'")
+        return NicheRule(cursor.lastrowid, tipo, padrao, nicho.strip(), prioridade)
+
+    def delete_rule(self, rule_id: int) -> int:
+        cursor = self.db.conn.cursor()
+        cursor.execute("DELETE FROM nicho_rules WHERE id = ?", (rule_id,))
+        self.db.conn.commit()
+        return cursor.rowcount
+
+    def _version(self) -> int:
+        cursor = self.db.conn.cursor()
+        cursor.execute(
+            "SELECT version FROM cache_versions WHERE name = ?", (NICHO_RULES_VERSION,)
+        )
+        row = cursor.fetchone()
+        return row[0] if row else 0
+
+    def compiled(self) -> CompiledRules:
+        version = self._version()
+        cached = self._compiled
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        with self._lock:
+            if self._compiled is None or self._compiled[0] != version:
+                self._compiled = (version, CompiledRules(self.list_rules()))
+            return self._compiled[1]
+
+    def _unmapped(self, skus: pd.Series, titles: pd.Series) -> pd.DataFrame:
+        frame = pd.DataFrame({"sku": skus, "title": titles}).dropna(subset=["sku"])
+        frame = frame.drop_duplicates("sku", keep="last")
+        return frame[pd.isna(self.sku_nichos.lookup(frame["sku"]))]
+
+    def _classify(self, frame: pd.DataFrame, dry_run: bool) -> Dict[str, Any]:
+        rules = self.compiled()
+        assignments = []
+        if len(rules):
+            for sku, title in zip(frame["sku"], frame["title"]):
+                rule = rules.classify(str(sku), title)
+                if rule is not None:
+                    assignments.append((sku, title, rule))
+        written = 0
+        if assignments and not dry_run:
+            written = self.inserter.insert_missing(
+                (sku, rule.nicho) for sku, _, rule in assignments
+            )
+            self.assigned += written
+        return {
+            "simulacao": dry_run,
+            "regras": len(rules),
+            "skus_sem_nicho": len(frame),
+            "classificados": len(assignments),
+            "gravados": written,
+            "por_nicho": dict(Counter(rule.nicho for _, _, rule in assignments)),
+            "atribuicoes": [
+                {"sku": sku, "title": title, "nicho": rule.nicho, "regra_id": rule.id}
+                for sku, title, rule in assignments[:PREVIEW_LIMIT]
+            ],
+        }
+
+    def classify_unmapped(self, dry_run: bool = True) -> Dict[str, Any]:
+        """Apply the rules to every SKU in ``orders`` that has no niche yet."""
+        cursor = self.db.conn.cursor()
+        cursor.execute(
+            "SELECT sku, MAX(title) FROM orders WHERE sku IS NOT NULL GROUP BY sku"
+        )
+        rows = cursor.fetchall()
+        frame = self._unmapped(
+            pd.Series([r[0] for r in rows], dtype=object),
+            pd.Series([r[1] for r in rows], dtype=object),
+        )
+        result = self._classify(frame, dry_run)
+        self.logger.info(
+            f"Regras de nicho {'simuladas' if dry_run else 'aplicadas'}: "
+            f"{result['classificados']} de {result['skus_sem_nicho']} SKUs sem nicho"
+        )
+        return result
+
+    def classify_changes(self, changes: ChangeSet) -> int:
+        """Ingest hook: give a niche to the new SKUs among freshly written orders."""
+        if not changes:
+            return 0
+        records = changes.records()
+        frame = self._unmapped(
+            pd.Series([r["sku"] for r in records], dtype=object),
+            pd.Series([r["title"] for r in records], dtype=object),
+        )
+        if frame.empty:
+            return 0
+        written = self._classify(frame, dry_run=False)["gravados"]
+        if written:
+            self.logger.info(f"{written} SKUs novos classificados por regra")
+        return written
+
+    def status(self) -> Dict[str, Any]:
+        compiled = self._compiled
+        return {
+            "regras": len(compiled[1]) if compiled else None,
+            "skus_atribuidos": self.assigned,
+        }
@@ -0,0 +1,160 @@
+import asyncio
+import logging
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional
+
+from app.core.connection_manager import EncodedMessage
+from app.services.order_service import ChangeSet
+from app.services.report_subscription import Subscription
+from app.services.sku_nicho_cache import SkuNichoCache
+
+EVENT_NEW = "novo"
+EVENT_CHANGED = "alterado"
+
+# Order fields carried by each event
+EVENT_FIELDS = (
+    "order_id",
+    "cart_id",
+    "sku",
+    "title",
+    "quantity",
+    "total_value",
+    "profit",
+    "payment_date",
+    "status",
+    "store",
+)
+
+
+class EventSubscriber:
+    """Bounded queue of one SSE client; ``dropped`` once it falls too far behind."""
+
+    def __init__(self, subscription: Optional[Subscription], maxsize: int):
+        self.subscription = subscription
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self.dropped = False
+
+    def offer(self, event: Dict[str, Any]) -> bool:
+        if self.subscription is not None and not self.subscription.matches(
+            event["pedido"]
+        ):
+            return True
+        try:
+            self.queue.put_nowait(event)
+            return True
+        except asyncio.QueueFull:
+            self.dropped = True
+            return False
+
+
+class OrderEventHub:
+    """
+    Stream of individual new or changed orders, emitted as soon as the ingest
+    writes them, between full daily report rebuilds.
+
+    Each written batch becomes one ``{"tipo": "pedidos", "eventos": [...]}``
+    WebSocket broadcast (filtered per client subscription) and one event per
+    order for SSE subscribers. Events carry an increasing ``seq``; the last
+    ``buffer_size`` are kept so SSE clients can resume with ``Last-Event-ID``.
+    A subscriber whose queue fills up is dropped and can reconnect to resume.
+    """
+
+    def __init__(
+        self,
+        manager,
+        sku_nichos: Optional[SkuNichoCache] = None,
+        buffer_size: int = 1000,
+        subscriber_queue_size: int = 256,
+    ):
+        self.manager = manager
+        self.sku_nichos = sku_nichos
+        self.subscriber_queue_size = subscriber_queue_size
+        self.seq = 0
+        self.published = 0
+        self.buffer: Deque[Dict[str, Any]] = deque(maxlen=buffer_size)
+        self.subscribers: List[EventSubscriber] = []
+        self.logger = logging.getLogger(__name__)
+
+    def _niches(self, skus: List[str]) -> Dict[str, str]:
+        if self.sku_nichos is None or not skus:
+            return {}
+        return self.sku_nichos.get_many(skus)
+
+    def build_events(self, changes: ChangeSet) -> List[Dict[str, Any]]:
+        records = changes.records()
+        niches = self._niches(sorted({r["sku"] for r in records if r["sku"]}))
+        events = []
+        for record in records:
+            self.seq += 1
+            pedido = {name: record.get(name) for name in EVENT_FIELDS}
+            pedido["nicho"] = niches.get(record["sku"])
+            events.append(
+                {
+                    "seq": self.seq,
+                    "evento": (
+                        EVENT_NEW
+                        if record["order_id"] in changes.new_order_ids
+                        else EVENT_CHANGED
+                    ),
+                    "pedido": pedido,
+                }
+            )
+        return events
+
+    async def publish(self, changes: ChangeSet) -> int:
+        """Emit one event per written order; returns how many were emitted."""
+        if not changes:
+            return 0
+        events = self.build_events(changes)
+        self.buffer.extend(events)
+        self.published += len(events)
+        for subscriber in list(self.subscribers):
+            for event in events:
+                if not subscriber.offer(event):
+                    self.logger.warning("Assinante SSE removido: fila cheia")
+                    self.unsubscribe(subscriber)
+                    break
+        if self.manager is not None:
+            await self.manager.broadcast_projected(
+                lambda subscription: self._render(events, subscription)
+            )
+        return len(events)
+
+    @staticmethod
+    def _render(
+        events: List[Dict[str, Any]], subscription: Optional[Subscription]
+    ) -> Optional[EncodedMessage]:
+        if subscription is not None:
+            if not subscription.wants_events:
+                return None
+            events = [e for e in events if subscription.matches(e["pedido"])]
+            if not events:
+                return None
+        return EncodedMessage.encode({"tipo": "pedidos", "eventos": events})
+
+    def subscribe(
+        self,
+        subscription: Optional[Subscription] = None,
+        last_event_id: Optional[int] = None,
+    ) -> EventSubscriber:
+        """Register an SSE client, replaying buffered events after ``last_event_id``."""
+        subscriber = EventSubscriber(subscription, self.subscriber_queue_size)
+        if last_event_id is not None:
+            for event in self.buffer:
+                if event["seq"] > last_event_id and not subscriber.offer(event):
+                    break
+        self.subscribers.append(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: EventSubscriber) -> None:
+        subscriber.dropped = True
+        if subscriber in self.subscribers:
+            self.subscribers.remove(subscriber)
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "ultimo_seq": self.seq,
+            "eventos_publicados": self.published,
+            "eventos_em_buffer": len(self.buffer),
+            "assinantes_sse": len(self.subscribers),
+        }
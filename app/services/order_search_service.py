@@ -0,0 +1,242 @@
+import logging
+import re
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core.exceptions import ValidationException
+from app.services.order_service import ORDER_COLUMNS
+
+# bm25 weights of the orders_fts columns (title, sku, ad): a hit on a code
+# is more specific than a word of the title
+ORDER_SEARCH_WEIGHTS = (1.0, 4.0, 4.0)
+ORDER_SEARCH_SORTS = ("relevancia", "data")
+
+_TERM_RE = re.compile(r"\w+")
+MATCHED_ROWIDS_SQL = (
+    "o.rowid IN (SELECT rowid FROM orders_fts WHERE orders_fts MATCH ?)"
+)
+
+
+def fts_query(text: str) -> Optional[str]:
+    """
+    FTS5 query matching orders that contain every word of ``text``.
+
+    Each word is quoted, so operators typed by users are plain text. The last
+    word is matched as a prefix (search as you type: "tapete lumin" finds
+    "Tapete Luminária"); the others must be whole words, as a prefix on a
+    common word makes FTS5 merge its whole doclist. Accents and case are
+    folded by the tokenizer. Returns None when ``text`` has no words.
+    """
+    terms = _TERM_RE.findall(text)
+    if not terms:
+        return None
+    return " ".join(f'"{term}"' for term in terms) + "*"
+
+
+class OrderSearchService:
+    """
+    Ranked full-text search over orders (``/orders/busca``).
+
+    Text matches come from the ``orders_fts`` index, which ``OrderInserter``
+    keeps in sync with every batch it writes, combined with a payment date
+    range (``idx_orders_payment_date``) and a niche filter.
+
+    Relevance (bm25) is computed over the ``rank_window`` most recently
+    stored matches: scoring every match of a word found in a large share of
+    millions of orders would cost far more than reading the newest ones from
+    the index, and beyond a few thousand matches ops narrow the search
+    rather than page through it. Every page is cut from that same window, so
+    pages never repeat or skip orders, and pages past it are refused. Sorting
+    by date walks ``idx_orders_payment_date`` from the newest payment and
+    stops once the page is filled. Totals are always exact. Niches of the
+    returned page are labelled from the shared SKU/niche map when one is
+    given.
+    """
+
+    def __init__(self, db, sku_nichos=None, rank_window: int = 5000):
+        self.db = db
+        self.sku_nichos = sku_nichos
+        self.rank_window = rank_window
+        self.logger = logging.getLogger(__name__)
+        self._fts: Optional[bool] = None
+
+    def _has_fts(self) -> bool:
+        if self._fts is None:
+            cursor = self.db.conn.cursor()
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'orders_fts'")
+            self._fts = cursor.fetchone() is not None
+        return self._fts
+
+    @staticmethod
+    def _filters(
+        data_inicio: Optional[str], data_fim: Optional[str], nicho: Optional[str]
+    ) -> Tuple[List[str], List[Any]]:
+        conditions: List[str] = []
+        params: List[Any] = []
+        # payment_date is stored as "YYYY-MM-DD HH:MM:SS", so ranges compare as text
+        if data_inicio:
+            conditions.append("o.payment_date >= ?")
+            params.append(data_inicio)
+        if data_fim:
+            day_after = datetime.strptime(data_fim, "%Y-%m-%d") + timedelta(days=1)
+            conditions.append("o.payment_date < ?")
+            params.append(day_after.strftime("%Y-%m-%d"))
+        if nicho:
+            conditions.append("o.sku IN (SELECT sku FROM sku_nichos WHERE nicho = ?)")
+            params.append(nicho)
+        return conditions, params
+
+    def pageable(self, total: int, ordenar: str = "relevancia") -> int:
+        """How many of ``total`` matches can be paged through when sorted by ``ordenar``."""
+        if ordenar == "relevancia" and self._has_fts():
+            return min(total, self.rank_window)
+        return total
+
+    def search(
+        self,
+        texto: str,
+        data_inicio: Optional[str] = None,
+        data_fim: Optional[str] = None,
+        nicho: Optional[str] = None,
+        pagina: int = 1,
+        por_pagina: int = 50,
+        ordenar: str = "relevancia",
+    ) -> Tuple[List[Dict[str, Any]], int]:
+        """
+        One page of orders matching ``texto`` and the filters, and their total.
+
+        ``data_inicio``/``data_fim`` (YYYY-MM-DD) bound the payment date, both
+        inclusive. ``ordenar="relevancia"`` puts the best bm25 matches first
+        (most recently stored first among ties); ``"data"`` lists the newest
+        payments first.
+
+        Raises:
+            ValidationException: If a relevance page starts past the rank window.
+        """
+        if ordenar not in ORDER_SEARCH_SORTS:
+            raise ValueError(f"Ordenação inválida: {ordenar}")
+        query = fts_query(texto)
+        if query is None:
+            return [], 0
+        filters, filter_params = self._filters(data_inicio, data_fim, nicho)
+        offset = (pagina - 1) * por_pagina
+        if ordenar == "relevancia" and self._has_fts() and offset >= self.rank_window:
+            raise ValidationException(
+                f"A ordenação por relevância cobre os {self.rank_window} resultados "
+                "mais recentes. Refine a busca (palavras, datas, nicho) ou use ordenar=data."
+            )
+        if self._has_fts():
+            total, ranked = self._search_fts(
+                query, filters, filter_params, ordenar, offset, por_pagina
+            )
+        else:
+            total, ranked = self._search_like(
+                texto, filters, filter_params, offset, por_pagina
+            )
+        pedidos = self._fetch(ranked)
+        self.logger.info(f"Busca de pedidos '{texto}': {total} resultados")
+        return pedidos, total
+
+    def _search_fts(
+        self,
+        query: str,
+        filters: List[str],
+        filter_params: List[Any],
+        ordenar: str,
+        offset: int,
+        limit: int,
+    ) -> Tuple[int, List[Tuple[int, Optional[float]]]]:
+        weights = ", ".join(str(w) for w in ORDER_SEARCH_WEIGHTS)
+        rank = f"bm25(orders_fts, {weights})"
+        # Orders are only joined when a filter needs their columns
+        source = "orders_fts"
+        if filters:
+            source += " JOIN orders o ON o.rowid = orders_fts.rowid"
+        where = " AND ".join(["orders_fts MATCH ?"] + filters)
+        params = [query] + filter_params
+
+        cursor = self.db.conn.cursor()
+        cursor.execute(f"SELECT COUNT(*) FROM {source} WHERE {where}", params)
+        total = cursor.fetchone()[0]
+        if ordenar == "data":
+            # Walk the (payment_date, sku) index newest first, keeping the
+            # rowids in the match set, until the page is filled
+            cursor.execute(
+                "SELECT o.rowid, NULL FROM orders o INDEXED BY idx_orders_payment_date "
+                f"WHERE {' AND '.join(filters + [MATCHED_ROWIDS_SQL])} "
+                "ORDER BY o.payment_date DESC LIMIT ? OFFSET ?",
+                filter_params + [query, limit, offset],
+            )
+        else:
+            # The index yields rowids newest first, so the window stops early;
+            # it is the same for every page, which keeps paging stable
+            cursor.execute(
+                f"SELECT id, relevancia FROM ("
+                f"SELECT orders_fts.rowid AS id, {rank} AS relevancia FROM {source} "
+                f"WHERE {where} ORDER BY orders_fts.rowid DESC LIMIT ?"
+                ") ORDER BY relevancia, id DESC LIMIT ? OFFSET ?",
+                params + [self.rank_window, limit, offset],
+            )
+        return total, cursor.fetchall()
+
+    def _search_like(
+        self,
+        texto: str,
+        filters: List[str],
+        filter_params: List[Any],
+        offset: int,
+        limit: int,
+    ) -> Tuple[int, List[Tuple[int, Optional[float]]]]:
+        # SQLite without FTS5: unranked scan, newest payments first
+        conditions, params = [], []
+        for term in _TERM_RE.findall(texto):
+            escaped = term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            conditions.append(
+                "(o.title LIKE ? ESCAPE '\\' OR o.sku LIKE ? ESCAPE '\\' OR o.ad LIKE ? ESCAPE '\\')"
+            )
+            params.extend([f"%{escaped}%"] * 3)
+        where = " AND ".join(conditions + filters)
+        params += filter_params
+
+        cursor = self.db.conn.cursor()
+        cursor.execute(f"SELECT COUNT(*) FROM orders o WHERE {where}", params)
+        total = cursor.fetchone()[0]
+        cursor.execute(
+            f"SELECT o.rowid, NULL FROM orders o WHERE {where} "
+            "ORDER BY o.payment_date DESC LIMIT ? OFFSET ?",
+            params + [limit, offset],
+        )
+        return total, cursor.fetchall()
+
+    def _fetch(self, ranked: List[Tuple[int, Optional[float]]]) -> List[Dict[str, Any]]:
+        """Orders of a page given as ``(rowid, bm25)`` pairs, in that order."""
+        if not ranked:
+            return []
+        cursor = self.db.conn.cursor()
+        placeholders = ", ".join("?" for _ in ranked)
+        cursor.execute(
+            f"SELECT rowid, {', '.join(ORDER_COLUMNS)} FROM orders WHERE rowid IN ({placeholders})",
+            [rowid for rowid, _ in ranked],
+        )
+        rows = {row[0]: row[1:] for row in cursor.fetchall()}
+        pedidos = []
+        for rowid, score in ranked:
+            pedido = dict(zip(ORDER_COLUMNS, rows[rowid]))
+            # bm25 is lower for better matches; expose it as a growing score
+            pedido["relevancia"] = round(-score, 4) if score is not None else None
+            pedidos.append(pedido)
+        nichos = self._niches([pedido["sku"] for pedido in pedidos])
+        for pedido, pedido_nicho in zip(pedidos, nichos):
+            pedido["nicho"] = pedido_nicho
+        return pedidos
+
+    def _niches(self, skus: List[str]) -> List[Optional[str]]:
+        if self.sku_nichos is not None:
+            return list(self.sku_nichos.lookup(skus))
+        cursor = self.db.conn.cursor()
+        placeholders = ", ".join("?" for _ in skus)
+        cursor.execute(
+            f"SELECT sku, nicho FROM sku_nichos WHERE sku IN ({placeholders})", skus
+        )
+        mapping = dict(cursor.fetchall())
+        return [mapping.get(sku) for sku in skus]
@@ -1,74 +1,393 @@
+import hashlib
 import logging
+from dataclasses import dataclass, field
 from datetime import datetime, timedelta
+from typing import Any, AsyncIterable, Awaitable, Callable, Dict, Iterable, List, Optional, Sequence, Set, Tuple, Union
+
+import pandas as pd
+
+from app.repositories.database_repository import DatabaseWriter
+
+ORDER_COLUMNS = (
+    'order_id', 'cart_id', 'ad', 'sku', 'title',
+    'quantity', 'total_value', 'payment_date',
+    'status', 'cost', 'gross_profit', 'taxes', 'freight',
+    'committee', 'fraction', 'profitability', 'rentability',
+    'store', 'profit'
+)
+
+UPSERT_ORDER_SQL = f"""
+    INSERT INTO orders ({', '.join(ORDER_COLUMNS)})
+    VALUES ({', '.join('?' for _ in ORDER_COLUMNS)})
+    ON CONFLICT(order_id) DO UPDATE SET
+    {', '.join(f'{col} = excluded.{col}' for col in ORDER_COLUMNS[1:])}
+"""
+
+UPSERT_HASH_SQL = """
+    INSERT INTO order_hashes (order_id, content_hash) VALUES (?, ?)
+    ON CONFLICT(order_id) DO UPDATE SET content_hash = excluded.content_hash
+"""
+
+# orders_fts is maintained here, one statement per chunk of written orders:
+# the index entry of a stored order is dropped before its upsert and the new
+# title/SKU/ad are indexed after it (a per-row trigger costs about 4x more)
+DELETE_ORDER_FTS_SQL = """
+    INSERT INTO orders_fts (orders_fts, rowid, title, sku, ad)
+    SELECT 'delete', rowid, title, sku, ad FROM orders WHERE order_id IN ({})
+"""
+INSERT_ORDER_FTS_SQL = """
+    INSERT INTO orders_fts (rowid, title, sku, ad)
+    SELECT rowid, title, sku, ad FROM orders WHERE order_id IN ({})
+"""
+
+# order_day_versions is maintained here too: each batch takes the next write
+# sequence of orders and stamps it, with a fresh order count, on the days of
+# the orders it wrote (and the previous days of orders it moved)
+ORDER_DAYS_SQL = "SELECT DISTINCT date(payment_date) FROM orders WHERE order_id IN ({})"
+BUMP_ORDERS_VERSION_SQL = "UPDATE cache_versions SET version = version + 1 WHERE name = 'orders'"
+UPSERT_DAY_VERSION_SQL = """
+    INSERT INTO order_day_versions (dia, versao, pedidos, updated_at)
+    SELECT ?, (SELECT version FROM cache_versions WHERE name = 'orders'),
+        (SELECT COUNT(*) FROM orders WHERE payment_date >= ? AND payment_date < ?),
+        CURRENT_TIMESTAMP
+    ON CONFLICT(dia) DO UPDATE SET
+    versao = excluded.versao, pedidos = excluded.pedidos, updated_at = excluded.updated_at
+"""
+
+# Values sqlite3 can bind; a row holding anything else (a nested object from
+# the API) is skipped before its batch is written
+SQLITE_VALUE_TYPES = (type(None), int, float, str, bytes)
+
+# Keeps IN (...) lists below SQLite's bound-parameter limit
+LOOKUP_CHUNK_SIZE = 500
+
+PAYMENT_DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+# The API reports payment dates in UTC; orders are stored in BRT (UTC-3)
+API_TZ_OFFSET = timedelta(hours=3)
+
+
+@dataclass
+class ChangeSet:
+    """Orders written by one ingest batch: new or changed rows, in ORDER_COLUMNS order."""
+
+    rows: List[Tuple[Any, ...]] = field(default_factory=list)
+    new_order_ids: Set[str] = field(default_factory=set)
+    seen: int = 0
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def records(self) -> List[Dict[str, Any]]:
+        return [dict(zip(ORDER_COLUMNS, row)) for row in self.rows]
+
+    def max_payment_date(self) -> Any:
+        dates = [row[7] for row in self.rows if row[7]]
+        return max(dates) if dates else None
+
+    def summary(self) -> "ChangeSummary":
+        # Stored payment dates are "YYYY-MM-DD HH:MM:SS"
+        return ChangeSummary(
+            seen=self.seen,
+            order_ids={row[0] for row in self.rows},
+            new_order_ids=set(self.new_order_ids),
+            days={row[7][:10] for row in self.rows if row[7]},
+            last_payment_date=self.max_payment_date(),
+        )
+
+
+@dataclass
+class ChangeSummary:
+    """
+    Outcome of an ingest spread over several batches, without their rows.
+
+    Each batch's ChangeSet is handed downstream (order events, niche rules)
+    as it is written and then dropped; only counts, changed order ids and
+    their days add up here, so memory follows the batch size and not the
+    size of the whole sells response.
+    """
+
+    seen: int = 0
+    order_ids: Set[str] = field(default_factory=set)
+    new_order_ids: Set[str] = field(default_factory=set)
+    days: Set[str] = field(default_factory=set)
+    last_payment_date: Optional[str] = None
+
+    def __len__(self) -> int:
+        return len(self.order_ids)
+
+    def max_payment_date(self) -> Optional[str]:
+        return self.last_payment_date
+
+    def merge(self, other: "ChangeSummary") -> "ChangeSummary":
+        self.seen += other.seen
+        self.order_ids |= other.order_ids
+        self.new_order_ids |= other.new_order_ids
+        self.days |= other.days
+        if other.last_payment_date and (
+            not self.last_payment_date or other.last_payment_date > self.last_payment_date
+        ):
+            self.last_payment_date = other.last_payment_date
+        return self
+
+
+@dataclass
+class OrderColumns:
+    """
+    A batch of orders as one list per column of ORDER_COLUMNS.
+
+    Defaults are already applied and ``payment_date`` is already shifted to
+    local time, so rows can be handed to ``executemany`` as they are.
+    """
+
+    columns: Dict[str, List[Any]]
+
+    def __len__(self) -> int:
+        return len(self.columns[ORDER_COLUMNS[0]])
+
+    def rows(self) -> List[Tuple[Any, ...]]:
+        return list(zip(*(self.columns[col] for col in ORDER_COLUMNS)))
+
+
+def to_local_payment_date(raw: Optional[str]) -> Optional[str]:
+    """Shift one API payment date to local time; empty values become None."""
+    if not raw:
+        return None
+    try:
+        dt = datetime.strptime(raw, PAYMENT_DATE_FORMAT)
+    except ValueError:
+        dt = datetime.fromisoformat(raw)
+    return (dt - API_TZ_OFFSET).strftime(PAYMENT_DATE_FORMAT)
+
+
+def to_local_payment_dates(values: Sequence[Optional[str]]) -> List[Optional[str]]:
+    """Vectorized ``to_local_payment_date`` for a whole column."""
+    raw = pd.Series(values, dtype=object)
+    parsed = pd.to_datetime(raw, format=PAYMENT_DATE_FORMAT, errors="coerce")
+    shifted = (parsed - API_TZ_OFFSET).dt.strftime(PAYMENT_DATE_FORMAT)
+    result = shifted.astype(object).where(parsed.notna(), None).tolist()
+    # Values outside the API's usual format (ISO with "T", offsets...) one by one
+    for i in (parsed.isna() & raw.astype(bool)).to_numpy().nonzero()[0]:
+        result[i] = to_local_payment_date(values[i])
+    return result
+
+
+def content_hash(row: Tuple[Any, ...]) -> str:
+    """Stable digest of an order row, used to skip orders that did not change."""
+    return hashlib.blake2b(repr(row).encode(), digest_size=16).hexdigest()
+
 
 class OrderInserter:
     def __init__(self, db):
         self.db = db
         self.logger = logging.getLogger(__name__)
+        self._fts: Optional[bool] = None
         self.logger.info("OrderInserter inicializado com sucesso")
 
-    def insert_orders(self, orders_input):
-        if isinstance(orders_input, list):
-            orders_dict = {}
-            for order in orders_input:
-                cart_id = order.get('cart') or order.get('cart_id')
-                if cart_id not in orders_dict:
-                    orders_dict[cart_id] = []
-                orders_dict[cart_id].append(order)
-        elif isinstance(orders_input, dict):
+    def _has_fts(self) -> bool:
+        if self._fts is None:
+            cursor = self.db.conn.cursor()
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'orders_fts'")
+            self._fts = cursor.fetchone() is not None
+        return self._fts
+
+    def _sync_search_index(self, cursor, sql: str, order_ids: List[str]) -> None:
+        for i in range(0, len(order_ids), LOOKUP_CHUNK_SIZE):
+            chunk = order_ids[i:i + LOOKUP_CHUNK_SIZE]
+            cursor.execute(sql.format(', '.join('?' for _ in chunk)), chunk)
+
+    def _order_days(self, cursor, order_ids: List[str]) -> Set[str]:
+        days: Set[str] = set()
+        for i in range(0, len(order_ids), LOOKUP_CHUNK_SIZE):
+            chunk = order_ids[i:i + LOOKUP_CHUNK_SIZE]
+            cursor.execute(ORDER_DAYS_SQL.format(', '.join('?' for _ in chunk)), chunk)
+            days.update(row[0] for row in cursor.fetchall() if row[0])
+        return days
+
+    def _bump_day_versions(self, cursor, days: Set[str]) -> None:
+        if not days:
+            return
+        cursor.execute(BUMP_ORDERS_VERSION_SQL)
+        # payment_date is stored as "YYYY-MM-DD HH:MM:SS": a day is a range of
+        # idx_orders_payment_date
+        cursor.executemany(UPSERT_DAY_VERSION_SQL, [
+            (day, day, (datetime.strptime(day, "%Y-%m-%d") + timedelta(days=1)).strftime("%Y-%m-%d"))
+            for day in sorted(days)
+        ])
+
+    @staticmethod
+    def _group_by_cart(orders_input) -> Dict[Any, List[dict]]:
+        if isinstance(orders_input, dict):
             # Check if it's a single order dict
             if 'order_id' in orders_input or 'order' in orders_input:
                 orders_input = [orders_input]
-                orders_dict = {}
-                for order in orders_input:
-                    cart_id = order.get('cart') or order.get('cart_id')
-                    if cart_id not in orders_dict:
-                        orders_dict[cart_id] = []
-                    orders_dict[cart_id].append(order)
             else:
-                orders_dict = orders_input
-        else:
+                return orders_input
+        if not isinstance(orders_input, list):
             raise ValueError("orders_input deve ser uma lista ou um dicionário")
+        orders_dict: Dict[Any, List[dict]] = {}
+        for order in orders_input:
+            cart_id = order.get('cart') or order.get('cart_id')
+            orders_dict.setdefault(cart_id, []).append(order)
+        return orders_dict
 
-        total_pedidos = sum(len(v) for v in orders_dict.values())
-        self.logger.info(f"Iniciando inserção de {total_pedidos} pedidos")
-        inserted_count = 0
+    @staticmethod
+    def _order_row(order: dict, cart_key=None) -> Tuple[Any, ...]:
+        order_id = order.get('order') or order.get('order_id')
+        cart_id = order.get('cart') or order.get('cart_id') or cart_key
+        payment_date_adj = to_local_payment_date(order.get('payment_date'))
+        return (
+            order_id, cart_id, order.get('ad'), order.get('sku'), order.get('title'),
+            order.get('quantity'), order.get('total_value'), payment_date_adj,
+            order.get('status'), order.get('cost', 0), order.get('gross_profit', 0),
+            order.get('taxes', 0), order.get('freight', 0), order.get('committee', 0),
+            order.get('fraction', 1), order.get('profitability', 0), order.get('rentability', 0),
+            order.get('store'), order.get('profit', 0)
+        )
 
-        for cart_key, orders in orders_dict.items():
+    def _build_rows(self, orders_input) -> List[Tuple[Any, ...]]:
+        rows = []
+        for cart_key, orders in self._group_by_cart(orders_input).items():
             for order in orders:
                 try:
-                    order_id = order.get('order') or order.get('order_id')
-                    cart_id = order.get('cart') or order.get('cart_id') or cart_key
-                    payment_date_raw = order.get('payment_date')
-                    payment_date_adj = None
-                    if payment_date_raw:
-                        try:
-                            dt = datetime.strptime(payment_date_raw, "%Y-%m-%d %H:%M:%S")
-                        except ValueError:
-                            dt = datetime.fromisoformat(payment_date_raw)
-                        payment_date_adj = (dt - timedelta(hours=3)).strftime("%Y-%m-%d %H:%M:%S")
-                    self.db.cursor.execute("""
-                        INSERT OR REPLACE INTO orders (
-                            order_id, cart_id, ad, sku, title,
-                            quantity, total_value, payment_date,
-                            status, cost, gross_profit, taxes, freight,
-                            committee, fraction, profitability, rentability,
-                            store, profit
-                        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                    """, (
-                        order_id, cart_id, order.get('ad'), order.get('sku'), order.get('title'),
-                        order.get('quantity'), order.get('total_value'), payment_date_adj,
-                        order.get('status'), order.get('cost', 0), order.get('gross_profit', 0),
-                        order.get('taxes', 0), order.get('freight', 0), order.get('committee', 0),
-                        order.get('fraction', 1), order.get('profitability', 0), order.get('rentability', 0),
-                        order.get('store'), order.get('profit', 0)
-                    ))
-                    inserted_count += 1
+                    row = self._order_row(order, cart_key)
+                    invalid = [
+                        column for column, value in zip(ORDER_COLUMNS, row)
+                        if not isinstance(value, SQLITE_VALUE_TYPES)
+                    ]
+                    if invalid:
+                        raise ValueError(f"valores inválidos em {', '.join(invalid)}")
+                    rows.append(row)
                 except Exception as e:
-                    self.logger.exception(f"Erro ao inserir pedido {order.get('order') or order.get('order_id')}: {e}")
+                    self.logger.exception(f"Erro ao preparar pedido {order.get('order') or order.get('order_id')}: {e}")
+        return rows
+
+    def _fetch_existing(self, order_ids: List[str]) -> Tuple[Dict[str, str], Set[str]]:
+        """Stored content hashes, and ids already present in orders, for ``order_ids``."""
+        hashes: Dict[str, str] = {}
+        existing: Set[str] = set()
+        cursor = self.db.conn.cursor()
+        for i in range(0, len(order_ids), LOOKUP_CHUNK_SIZE):
+            chunk = order_ids[i:i + LOOKUP_CHUNK_SIZE]
+            placeholders = ', '.join('?' for _ in chunk)
+            cursor.execute(
+                f"SELECT order_id, content_hash FROM order_hashes WHERE order_id IN ({placeholders})",
+                chunk,
+            )
+            hashes.update(cursor.fetchall())
+            missing = [order_id for order_id in chunk if order_id not in hashes]
+            if missing:
+                placeholders = ', '.join('?' for _ in missing)
+                cursor.execute(
+                    f"SELECT order_id FROM orders WHERE order_id IN ({placeholders})", missing
+                )
+                existing.update(row[0] for row in cursor.fetchall())
+        return hashes, existing | set(hashes)
+
+    def _write_rows(self, rows: Iterable[Tuple[Any, ...]]) -> int:
+        rows = list(rows)
+        if not rows:
+            return 0
+        cursor = self.db.conn.cursor()
+        fts = self._has_fts()
+        order_ids = list({row[0] for row in rows})
+        # A batch is written whole or not at all: a failure half way would
+        # leave orders out of orders_fts and order_hashes stale, and the next
+        # commit on the connection would keep them that way
+        cursor.execute("SAVEPOINT orders_write")
+        try:
+            days = self._order_days(cursor, order_ids)
+            if fts:
+                self._sync_search_index(cursor, DELETE_ORDER_FTS_SQL, order_ids)
+            cursor.executemany(UPSERT_ORDER_SQL, rows)
+            if fts:
+                self._sync_search_index(cursor, INSERT_ORDER_FTS_SQL, order_ids)
+            # Stored payment dates are "YYYY-MM-DD HH:MM:SS"
+            self._bump_day_versions(cursor, days | {row[7][:10] for row in rows if row[7]})
+            cursor.executemany(UPSERT_HASH_SQL, [(row[0], content_hash(row)) for row in rows])
+        except Exception as e:
+            self.logger.exception(f"Erro ao gravar lote de {len(rows)} pedidos, desfeito: {e}")
+            cursor.execute("ROLLBACK TO orders_write")
+            cursor.execute("RELEASE orders_write")
+            raise
+        cursor.execute("RELEASE orders_write")
         try:
             self.db.commit()
-            self.logger.info(f"Inserção concluída: {inserted_count}/{total_pedidos} pedidos inseridos")
         except Exception as e:
             self.logger.exception(f"Erro ao executar commit da inserção: {e}")
             raise
+        return len(rows)
+
+    def insert_orders(self, orders_input):
+        rows = self._build_rows(orders_input)
+        self.logger.info(f"Iniciando inserção de {len(rows)} pedidos")
+        inserted_count = self._write_rows(rows)
+        self.logger.info(f"Inserção concluída: {inserted_count}/{len(rows)} pedidos inseridos")
+
+    def insert_columns(self, columns: OrderColumns) -> int:
+        """Write a columnar batch (see ``DataParser.parse_orders_columnar``) as is."""
+        inserted_count = self._write_rows(columns.rows())
+        self.logger.info(f"Inserção em colunas concluída: {inserted_count} pedidos inseridos")
+        return inserted_count
+
+    def _insert_changed_rows(self, rows: List[Tuple[Any, ...]]) -> ChangeSet:
+        hashes, existing = self._fetch_existing([row[0] for row in rows])
+        changes = ChangeSet(seen=len(rows))
+        for row in rows:
+            if hashes.get(row[0]) != content_hash(row):
+                changes.rows.append(row)
+                if row[0] not in existing:
+                    changes.new_order_ids.add(row[0])
+        self._write_rows(changes.rows)
+        self.logger.info(
+            f"Sincronização incremental: {len(changes)} de {len(rows)} pedidos novos ou alterados "
+            f"({len(changes.new_order_ids)} novos)"
+        )
+        return changes
+
+    def insert_changed_orders(self, orders_input) -> ChangeSet:
+        """
+        Write only orders that are new or whose content changed since the last write.
+
+        Returns:
+            The ChangeSet of written rows, for downstream consumers (reports,
+            broadcasts) to decide what to recompute.
+        """
+        return self._insert_changed_rows(self._build_rows(orders_input))
+
+    def insert_changed_columns(self, columns: OrderColumns) -> ChangeSet:
+        """``insert_changed_orders`` for a columnar batch."""
+        return self._insert_changed_rows(columns.rows())
+
+    async def insert_changed_batches(
+        self,
+        batches: AsyncIterable[Union[OrderColumns, List[dict]]],
+        on_changes: Optional[Callable[[ChangeSet], Awaitable[Any]]] = None,
+        writer: Optional[DatabaseWriter] = None,
+    ) -> ChangeSummary:
+        """
+        Apply ``insert_changed_orders`` (or ``insert_changed_columns``) to each
+        batch of a streamed payload.
+
+        Batches are written as they arrive and only their ChangeSummary is
+        kept, so an ingest never holds more than one parsed batch in memory.
+        ``on_changes`` is awaited with the ChangeSet of every batch that
+        wrote something (e.g. to emit order events) before it is dropped.
+        With a ``writer`` (the inserter must then be built on
+        ``writer.database``), each batch is written on the writer thread and
+        the event loop keeps serving while it runs.
+        """
+        changes = ChangeSummary()
+        async for batch in batches:
+            insert: Callable[[Any], ChangeSet] = (
+                self.insert_changed_columns
+                if isinstance(batch, OrderColumns)
+                else self.insert_changed_orders
+            )
+            if writer is not None:
+                batch_changes = await writer.run(insert, batch)
+            else:
+                batch_changes = insert(batch)
+            changes.merge(batch_changes.summary())
+            if on_changes is not None and batch_changes:
+                await on_changes(batch_changes)
+        return changes
@@ -0,0 +1,273 @@
+import asyncio
+from abc import ABC, abstractmethod
+import json
+import logging
+import os
+import socket
+import uuid
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from app.repositories.database_repository import DatabaseWriter
+
+BUS_MEMORY = "memoria"
+BUS_SQLITE = "sqlite"
+BUS_REDIS = "redis"
+
+ReportHandler = Callable[[Dict[str, Any]], Awaitable[None]]
+
+
+class ReportBus(ABC):
+    """
+    Relays each published daily report to the other worker processes.
+
+    The worker that computed a report broadcasts it to its own WebSocket
+    clients and ``publish``es it; every other worker receives it through the
+    handlers registered with ``subscribe`` and relays it to its clients.
+    A publisher never receives its own messages.
+    """
+
+    backend = ""
+
+    def __init__(self):
+        self.origin = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.published = 0
+        self.received = 0
+        self.last_received_at: Optional[datetime] = None
+        self._handlers: List[ReportHandler] = []
+        self.logger = logging.getLogger(__name__)
+
+    def subscribe(self, handler: ReportHandler) -> None:
+        self._handlers.append(handler)
+
+    async def publish(self, report: Dict[str, Any]) -> None:
+        self.published += 1
+        await self._publish(report)
+
+    @abstractmethod
+    async def _publish(self, report: Dict[str, Any]) -> None:
+        """Send ``report`` to the other workers (backend-specific)."""
+
+    async def _deliver(self, report: Dict[str, Any]) -> None:
+        self.received += 1
+        self.last_received_at = datetime.now()
+        for handler in self._handlers:
+            try:
+                await handler(report)
+            except Exception:
+                self.logger.exception(
+                    "Erro ao repassar relatório recebido do barramento"
+                )
+
+    async def start(self) -> None:
+        pass
+
+    async def stop(self) -> None:
+        pass
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "backend": self.backend,
+            "origem": self.origin,
+            "publicados": self.published,
+            "recebidos": self.received,
+            "ultimo_recebido_em": (
+                self.last_received_at.isoformat(timespec="seconds")
+                if self.last_received_at
+                else None
+            ),
+        }
+
+
+class MemoryHub:
+    """The "network" shared by MemoryReportBus instances of one process."""
+
+    def __init__(self):
+        self.buses: List["MemoryReportBus"] = []
+
+
+class MemoryReportBus(ReportBus):
+    """
+    In-process bus. Alone (the default, single worker) it relays nothing;
+    buses sharing a ``MemoryHub`` stand in for several workers in tests.
+    """
+
+    backend = BUS_MEMORY
+
+    def __init__(self, hub: Optional[MemoryHub] = None):
+        super().__init__()
+        self.hub = hub or MemoryHub()
+        self.hub.buses.append(self)
+
+    async def _publish(self, report: Dict[str, Any]) -> None:
+        for bus in list(self.hub.buses):
+            if bus is not self:
+                await bus._deliver(report)
+
+
+class SQLiteReportBus(ReportBus):
+    """
+    Bus over the ``report_bus`` table of the shared SQLite database.
+
+    Publishing appends a row (keeping the latest ``retention`` rows); each
+    worker polls for rows newer than the last one it saw every
+    ``poll_interval`` seconds. Needs no extra service, at the cost of up to
+    one poll interval of delay. With a ``writer``, rows are appended on the
+    writer thread and connection rather than committed on ``db``, which is
+    shared with other services.
+    """
+
+    backend = BUS_SQLITE
+
+    def __init__(
+        self,
+        db,
+        poll_interval: float = 1.0,
+        retention: int = 100,
+        writer: Optional[DatabaseWriter] = None,
+    ):
+        super().__init__()
+        self.db = db
+        self.poll_interval = poll_interval
+        self.retention = retention
+        self.writer = writer
+        self.last_id = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def _append(self, payload: str) -> None:
+        conn = self.writer.database.conn if self.writer is not None else self.db.conn
+        assert conn is not None
+        cursor = conn.cursor()
+        cursor.execute(
+            "INSERT INTO report_bus (origin, payload) VALUES (?, ?)",
+            (self.origin, payload),
+        )
+        cursor.execute(
+            "DELETE FROM report_bus WHERE id <= ?",
+            ((cursor.lastrowid or 0) - self.retention,),
+        )
+        conn.commit()
+
+    async def _publish(self, report: Dict[str, Any]) -> None:
+        payload = json.dumps(report, ensure_ascii=False)
+        if self.writer is not None:
+            await self.writer.run(self._append, payload)
+        else:
+            self._append(payload)
+
+    def _fetch_new(self) -> List[tuple]:
+        cursor = self.db.conn.cursor()
+        cursor.execute(
+            "SELECT id, origin, payload FROM report_bus WHERE id > ? ORDER BY id",
+            (self.last_id,),
+        )
+        return cursor.fetchall()
+
+    async def poll(self) -> int:
+        """Deliver rows published by other workers since the last poll."""
+        rows = self._fetch_new()
+        delivered = 0
+        for row_id, origin, payload in rows:
+            self.last_id = row_id
+            if origin != self.origin:
+                await self._deliver(json.loads(payload))
+                delivered += 1
+        return delivered
+
+    async def _poll_loop(self) -> None:
+        while True:
+            try:
+                await self.poll()
+            except Exception:
+                self.logger.exception("Erro ao ler o barramento de relatórios")
+            await asyncio.sleep(self.poll_interval)
+
+    async def start(self) -> None:
+        if self._task is None:
+            # Only reports published from now on are relayed
+            cursor = self.db.conn.cursor()
+            cursor.execute("SELECT COALESCE(MAX(id), 0) FROM report_bus")
+            self.last_id = cursor.fetchone()[0]
+            self._task = asyncio.create_task(self._poll_loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+
+class RedisReportBus(ReportBus):
+    """Bus over Redis (or a compatible server) pub/sub; needs the ``redis`` package."""
+
+    backend = BUS_REDIS
+
+    def __init__(self, url: str, channel: str = "arpsys:relatorio_diario"):
+        super().__init__()
+        import redis.asyncio as redis
+
+        self.channel = channel
+        self.client = redis.from_url(url)
+        self._task: Optional[asyncio.Task] = None
+
+    async def _publish(self, report: Dict[str, Any]) -> None:
+        message = {"origem": self.origin, "relatorio": report}
+        await self.client.publish(self.channel, json.dumps(message, ensure_ascii=False))
+
+    async def _listen(self, pubsub) -> None:
+        async for message in pubsub.listen():
+            if message.get("type") != "message":
+                continue
+            try:
+                data = json.loads(message["data"])
+            except ValueError:
+                continue
+            if data.get("origem") != self.origin:
+                await self._deliver(data["relatorio"])
+
+    async def start(self) -> None:
+        if self._task is None:
+            pubsub = self.client.pubsub()
+            await pubsub.subscribe(self.channel)
+            self._task = asyncio.create_task(self._listen(pubsub))
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.client.aclose()
+
+
+def create_report_bus(
+    backend: str,
+    db=None,
+    poll_interval: float = 1.0,
+    redis_url: str = "",
+    channel: str = "arpsys:relatorio_diario",
+    cross_process: bool = False,
+    writer: Optional[DatabaseWriter] = None,
+) -> ReportBus:
+    """
+    Build the bus selected by ``REPORT_BUS_BACKEND``.
+
+    With ``cross_process`` (leader election on: only one worker computes
+    reports), the in-memory bus would never reach the other workers, so the
+    SQLite bus is used instead.
+    """
+    backend = (backend or BUS_MEMORY).lower()
+    if backend == BUS_MEMORY and cross_process:
+        logging.getLogger(__name__).warning(
+            "Barramento 'memoria' não alcança os outros workers com eleição de líder; "
+            "usando 'sqlite'"
+        )
+        backend = BUS_SQLITE
+    if backend == BUS_MEMORY:
+        return MemoryReportBus()
+    if backend == BUS_SQLITE:
+        return SQLiteReportBus(db, poll_interval=poll_interval, writer=writer)
+    if backend == BUS_REDIS:
+        return RedisReportBus(redis_url, channel=channel)
+    raise ValueError(
+        f"Barramento de relatórios desconhecido '{backend}', use memoria, sqlite ou redis"
+    )
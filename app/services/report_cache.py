@@ -0,0 +1,194 @@
+import asyncio
+import hashlib
+import json
+import logging
+from dataclasses import dataclass, field
+from datetime import datetime
+from functools import cached_property
+from typing import Any, Dict, Optional, Tuple
+
+from app.core.compression import ResponseCompressor
+from app.core.connection_manager import EncodedMessage
+from app.services.data_version import DataVersion, DataVersionService
+from app.services.report_service import ReportService
+from app.services.report_subscription import Subscription, project_report
+
+
+@dataclass
+class ReportSnapshot:
+    """An immutable published daily report and its pre-encoded messages and HTTP bodies."""
+
+    version: int
+    report: Dict[str, Any]
+    published_at: datetime
+    # ETag of the data the report was computed from (DataVersionService)
+    data_version: Optional[str] = None
+    _messages: Dict[Tuple[str, Optional[Subscription]], EncodedMessage] = field(
+        default_factory=dict, repr=False
+    )
+    _bodies: Dict[Optional[str], bytes] = field(default_factory=dict, repr=False)
+
+    @property
+    def dia(self) -> Optional[str]:
+        return self.report.get("dia")
+
+    @property
+    def ok(self) -> bool:
+        return self.report.get("status") == "sucesso"
+
+    def message(
+        self, tipo: str, subscription: Optional[Subscription] = None
+    ) -> EncodedMessage:
+        """
+        The report (projected for ``subscription``) wrapped as
+        ``{"tipo": tipo, "dados": ...}``, encoded once per tipo and subscription.
+        """
+        if subscription is not None and subscription.is_everything:
+            subscription = None
+        key = (tipo, subscription)
+        if key not in self._messages:
+            self._messages[key] = EncodedMessage.encode(
+                {"tipo": tipo, "dados": project_report(self.report, subscription)}
+            )
+        return self._messages[key]
+
+    def has_body(self, encoding: Optional[str] = None) -> bool:
+        return encoding in self._bodies
+
+    def body(
+        self,
+        encoding: Optional[str] = None,
+        compressor: Optional[ResponseCompressor] = None,
+    ) -> bytes:
+        """
+        The report as an HTTP JSON body, compressed with ``encoding`` by
+        ``compressor``. Each variant is built on first use and kept with the
+        snapshot, so every later request for it is served precompressed.
+        """
+        if encoding not in self._bodies:
+            if encoding is None:
+                self._bodies[None] = json.dumps(
+                    self.report, separators=(",", ":"), ensure_ascii=False
+                ).encode("utf-8")
+            elif compressor is None:
+                raise ValueError(f"Codificação '{encoding}' pedida sem compressor")
+            else:
+                self._bodies[encoding] = compressor.compress(self.body(), encoding)
+        elif encoding is not None and compressor is not None:
+            compressor.record_cached(
+                encoding, len(self._bodies[None]), len(self._bodies[encoding])
+            )
+        return self._bodies[encoding]
+
+    @cached_property
+    def validator(self) -> DataVersion:
+        """ETag of the report body; equal reports of other workers share it."""
+        digest = hashlib.blake2b(self.body(), digest_size=12).hexdigest()
+        return DataVersion(f'W/"{digest}"')
+
+
+class DailyReportCache:
+    """
+    Single shared snapshot of today's report.
+
+    Producers (the periodic task, manual updates) ``publish`` every report they
+    compute; readers such as new WebSocket connections ``get`` the current
+    snapshot. When there is none yet, or it belongs to a past day, one caller
+    recomputes it off the event loop while concurrent callers wait for that
+    same result instead of starting their own.
+
+    With ``data_versions``, a snapshot is also stale once today's orders (as
+    stamped in ``order_day_versions``) or the SKU/niche map moved on since it
+    was computed. Workers that do not ingest themselves (followers under
+    leader election) then rebuild it instead of serving it all day.
+    """
+
+    def __init__(
+        self,
+        report_service: ReportService,
+        data_versions: Optional[DataVersionService] = None,
+    ):
+        self.report_service = report_service
+        self.data_versions = data_versions
+        self.recomputations = 0
+        self._snapshot: Optional[ReportSnapshot] = None
+        self._version = 0
+        self._lock: Optional[asyncio.Lock] = None
+        self._lock_loop: Optional[asyncio.AbstractEventLoop] = None
+        self.logger = logging.getLogger(__name__)
+
+    @property
+    def snapshot(self) -> Optional[ReportSnapshot]:
+        return self._snapshot
+
+    def _get_lock(self) -> asyncio.Lock:
+        loop = asyncio.get_running_loop()
+        if self._lock is None or self._lock_loop is not loop:
+            self._lock = asyncio.Lock()
+            self._lock_loop = loop
+        return self._lock
+
+    def _data_version(self) -> Optional[str]:
+        if self.data_versions is None:
+            return None
+        return self.data_versions.report_version().etag
+
+    def is_fresh(self, snapshot: Optional[ReportSnapshot] = None) -> bool:
+        snapshot = snapshot or self._snapshot
+        hoje = datetime.today().strftime("%Y-%m-%d")
+        if snapshot is None or snapshot.dia != hoje:
+            return False
+        return self.data_versions is None or snapshot.data_version == self._data_version()
+
+    def publish(
+        self, report: Optional[Dict[str, Any]], data_version: Optional[str] = None
+    ) -> Optional[ReportSnapshot]:
+        """
+        Make ``report`` the current snapshot (``None`` clears it).
+
+        ``data_version`` is the data version read before computing it;
+        reports computed elsewhere are stamped with the current one.
+        """
+        if report is None:
+            self._snapshot = None
+            return None
+        self._version += 1
+        self._snapshot = ReportSnapshot(
+            self._version,
+            report,
+            datetime.now(),
+            data_version or self._data_version(),
+        )
+        return self._snapshot
+
+    async def refresh(self) -> Optional[ReportSnapshot]:
+        """Recompute the report in a worker thread and publish it."""
+        self.recomputations += 1
+        # Read first: orders written during the computation make it stale again
+        data_version = self._data_version()
+        report = await asyncio.to_thread(self.report_service.get_daily_report_data)
+        self.logger.info("Relatório diário recalculado para o cache")
+        return self.publish(report, data_version)
+
+    async def get(self) -> Optional[ReportSnapshot]:
+        """The current snapshot, recomputing it at most once if missing or stale."""
+        if self.is_fresh():
+            return self._snapshot
+        async with self._get_lock():
+            # Another caller may have refreshed it while we waited
+            if self.is_fresh():
+                return self._snapshot
+            return await self.refresh()
+
+    def status(self) -> Dict[str, Any]:
+        snapshot = self._snapshot
+        return {
+            "versao": snapshot.version if snapshot else None,
+            "dia": snapshot.dia if snapshot else None,
+            "publicado_em": (
+                snapshot.published_at.isoformat(timespec="seconds")
+                if snapshot
+                else None
+            ),
+            "recalculos": self.recomputations,
+        }
@@ -4,6 +4,7 @@ from datetime import datetime
 import pandas as pd
 from app.repositories.database_repository import Database
 from app.services.ml_service import predict_sales_for_df
+from app.services.sku_nicho_cache import SkuNichoCache
 from app.config.constants import (
     TOP_NICHOS_LIMIT,
     TOP_SKUS_LIMIT,
@@ -14,11 +15,29 @@ from app.config.constants import (
 
 logger = logging.getLogger(__name__)
 
+# Columns of each sale listed in the daily report (last sale, last sales, negative sales)
+SALE_COLUMNS = [
+    "payment_date",
+    "order_id",
+    "cart_id",
+    "sku",
+    "title",
+    "quantity",
+    "total_value",
+    "profit",
+    "nicho",
+    "store",
+]
+
 
 class ReportService:
-    def __init__(self, database: Database) -> None:
+    def __init__(
+        self, database: Database, sku_nichos: Optional[SkuNichoCache] = None
+    ) -> None:
         self.database = database
         self.db = database  # For backward compatibility
+        # Niches are labelled from the in-memory map instead of a JOIN per query
+        self.sku_nichos = sku_nichos or SkuNichoCache(database)
         self.logger = logging.getLogger(__name__)
 
     def get_daily_report_data(self) -> Optional[Dict[str, Any]]:
@@ -31,12 +50,11 @@ class ReportService:
             assert db.conn is not None
             cursor = db.conn.cursor()
 
-            query = """ SELECT o.*, n.nicho FROM orders o LEFT JOIN sku_nichos n ON o.sku = n.sku
-                        WHERE date(o.payment_date) = ? """
+            query = """ SELECT o.* FROM orders o WHERE date(o.payment_date) = ? """
             linhas = cursor.execute(query, (hoje,)).fetchall()
             colunas = [desc[0] for desc in cursor.description]
 
-            df = pd.DataFrame(linhas, columns=colunas)
+            df = self.sku_nichos.apply(pd.DataFrame(linhas, columns=colunas))
             if df.empty:
                 self.logger.info("Nenhum pedido encontrado para o relatório diário")
                 return {"dia": hoje, "status": "sem_dados", "kpis_diarios": {}}
@@ -52,17 +70,7 @@ class ReportService:
 
             # Última venda
             ultima_venda_df = df.sort_values("payment_date", ascending=False).head(1)[
-                [
-                    "payment_date",
-                    "order_id",
-                    "cart_id",
-                    "sku",
-                    "title",
-                    "quantity",
-                    "total_value",
-                    "profit",
-                    "nicho",
-                ]
+                SALE_COLUMNS
             ]
             ultima_venda = (
                 ultima_venda_df.to_dict(orient="records")[0]
@@ -101,42 +109,21 @@ class ReportService:
             # Last 15 sales
             ultimas_15_vendas = (
                 df.sort_values("payment_date", ascending=False)
-                .head(LAST_SALES_LIMIT)[
-                    [
-                        "payment_date",
-                        "order_id",
-                        "cart_id",
-                        "sku",
-                        "title",
-                        "quantity",
-                        "total_value",
-                        "profit",
-                        "nicho",
-                    ]
-                ]
+                .head(LAST_SALES_LIMIT)[SALE_COLUMNS]
                 .to_dict(orient="records")
             )
 
             # Vendas negativas
-            vendas_negativas = df[df["profit"] < 0][
-                [
-                    "payment_date",
-                    "order_id",
-                    "cart_id",
-                    "sku",
-                    "title",
-                    "quantity",
-                    "total_value",
-                    "profit",
-                    "nicho",
-                ]
-            ].to_dict(orient="records")
+            vendas_negativas = df[df["profit"] < 0][SALE_COLUMNS].to_dict(
+                orient="records"
+            )
 
             relatorio_final = {
                 "dia": hoje,
                 "status": "sucesso",
                 "kpis_diarios": kpis_diarios,
                 "analise_por_nicho_dia": por_nicho_dia.to_dict(orient="records"),
+                "kpis_por_nicho_loja": self._calculate_niche_store_kpis(df),
                 "rankings_diarios": rankings_diarios,
                 "timestamp_atualizacao": datetime.now().isoformat(),
                 "ultima_venda": ultima_venda,
@@ -185,6 +172,33 @@ class ReportService:
         por_nicho_dia = self._clean_df_for_json(por_nicho_dia)
         return por_nicho_dia
 
+    def _calculate_niche_store_kpis(self, df: pd.DataFrame) -> List[Dict[str, Any]]:
+        """Daily KPIs per (niche, store), from which filtered subscriptions are projected."""
+        por_nicho_loja = (
+            df.groupby(["nicho", "store"], dropna=False)
+            .agg(
+                {
+                    "profit": "sum",
+                    "total_value": "sum",
+                    "order_id": "count",
+                    "quantity": "sum",
+                }
+            )
+            .reset_index()
+            .rename(
+                columns={
+                    "profit": "lucro_liquido",
+                    "total_value": "faturamento",
+                    "order_id": "total_pedidos",
+                    "quantity": "total_unidades",
+                }
+            )
+            .astype(object)
+        )
+        # Orders without a niche (or store) keep a null key instead of 0
+        por_nicho_loja = por_nicho_loja.where(por_nicho_loja.notna(), None)
+        return por_nicho_loja.to_dict(orient="records")
+
     def _clean_df_for_json(self, df: pd.DataFrame) -> pd.DataFrame:
         """Clean DataFrame for JSON serialization."""
         return df.fillna(0).replace({pd.NA: 0}).astype(object)
@@ -200,12 +214,15 @@ class ReportService:
         )
         top_skus_dia = (
             df.groupby("sku")
-            .agg({"profit": "sum", "gross_profit": "sum"})
+            .agg({"profit": "sum", "gross_profit": "sum", "nicho": "first"})
             .sort_values("profit", ascending=False)
             .head(TOP_SKUS_LIMIT)
             .reset_index()
             .rename(columns={"profit": "lucro_liquido", "gross_profit": "lucro_bruto"})
-            .to_dict(orient="records")
+            .astype(object)
+        )
+        top_skus_dia = top_skus_dia.where(top_skus_dia.notna(), None).to_dict(
+            orient="records"
         )
 
         return {
@@ -233,16 +250,15 @@ class ReportService:
         cursor = db.conn.cursor()
 
         query = """
-            SELECT o.*, n.nicho
+            SELECT o.*
             FROM orders o
-            LEFT JOIN sku_nichos n ON o.sku = n.sku
             WHERE date(o.payment_date) BETWEEN ? AND ?
         """
         linhas = cursor.execute(
             query, (start.strftime("%Y-%m-%d"), end.strftime("%Y-%m-%d"))
         ).fetchall()
         colunas = [desc[0] for desc in cursor.description]
-        df = pd.DataFrame(linhas, columns=colunas)
+        df = self.sku_nichos.apply(pd.DataFrame(linhas, columns=colunas))
 
         if df.empty:
             self.logger.warning(
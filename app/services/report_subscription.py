@@ -0,0 +1,205 @@
+from dataclasses import dataclass
+from typing import Any, Dict, FrozenSet, Iterable, List, Mapping, Optional
+
+from app.config.constants import TOP_NICHOS_LIMIT
+from app.core.exceptions import ValidationException
+
+# Sections of the daily report a client can subscribe to
+REPORT_SECTIONS = (
+    "kpis_diarios",
+    "analise_por_nicho_dia",
+    "kpis_por_nicho_loja",
+    "rankings_diarios",
+    "ultima_venda",
+    "melhor_produto",
+    "melhor_anuncio",
+    "ultimas_15_vendas",
+    "vendas_negativas",
+)
+# Live order events (app.services.order_events), subscribable like a section
+EVENTS_TOPIC = "pedidos"
+# Always sent, whatever the subscription
+REPORT_HEADER = ("dia", "status", "erro", "timestamp_atualizacao")
+
+ACTION_SUBSCRIBE = "inscrever"
+ACTION_UNSUBSCRIBE = "cancelar_inscricao"
+
+KPI_FIELDS = ("lucro_liquido", "faturamento", "total_pedidos", "total_unidades")
+
+
+def _names(value: Any, field_name: str) -> Optional[FrozenSet[str]]:
+    """A list (or comma-separated string) of names; None/empty means "all"."""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = value.split(",")
+    if not isinstance(value, (list, tuple)):
+        raise ValidationException(f"'{field_name}' deve ser uma lista")
+    names = frozenset(str(item).strip() for item in value if str(item).strip())
+    return names or None
+
+
+@dataclass(frozen=True)
+class Subscription:
+    """
+    What a WebSocket client wants from the daily report.
+
+    ``None`` in any field means "everything". Subscriptions are hashable, so
+    clients that ask for the same thing share one projection and one encoded
+    message per report version.
+    """
+
+    secoes: Optional[FrozenSet[str]] = None
+    nichos: Optional[FrozenSet[str]] = None
+    loja: Optional[str] = None
+
+    @classmethod
+    def from_message(cls, message: Mapping[str, Any]) -> "Subscription":
+        """Build from ``{"secoes": [...], "nichos": [...], "loja": ...}`` (query params use commas)."""
+        secoes = _names(message.get("secoes"), "secoes")
+        if secoes:
+            desconhecidas = secoes.difference(REPORT_SECTIONS + (EVENTS_TOPIC,))
+            if desconhecidas:
+                raise ValidationException(
+                    f"Seções desconhecidas: {', '.join(sorted(desconhecidas))}"
+                )
+        loja = message.get("loja")
+        loja = str(loja).strip() if loja is not None and str(loja).strip() else None
+        return cls(secoes, _names(message.get("nichos"), "nichos"), loja)
+
+    @property
+    def is_everything(self) -> bool:
+        return self.secoes is None and self.nichos is None and self.loja is None
+
+    @property
+    def wants_events(self) -> bool:
+        return self.secoes is None or EVENTS_TOPIC in self.secoes
+
+    @property
+    def is_filtered(self) -> bool:
+        return self.nichos is not None or self.loja is not None
+
+    def matches(self, row: Optional[Mapping[str, Any]]) -> bool:
+        """Whether a report row (a sale or a niche/store KPI row) is in scope."""
+        if row is None:
+            return False
+        if self.nichos is not None and row.get("nicho") not in self.nichos:
+            return False
+        if self.loja is not None and str(row.get("store")) != self.loja:
+            return False
+        return True
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "secoes": sorted(self.secoes) if self.secoes else None,
+            "nichos": sorted(self.nichos) if self.nichos else None,
+            "loja": self.loja,
+        }
+
+
+def _sum_kpis(rows: Iterable[Mapping[str, Any]]) -> Dict[str, Any]:
+    totals = dict.fromkeys(KPI_FIELDS, 0)
+    for row in rows:
+        for name in KPI_FIELDS:
+            totals[name] += row.get(name) or 0
+    return {
+        "lucro_liquido": float(totals["lucro_liquido"]),
+        "faturamento": float(totals["faturamento"]),
+        "total_pedidos": int(totals["total_pedidos"]),
+        "total_unidades": int(totals["total_unidades"]),
+    }
+
+
+def _niche_analysis(rows: List[Mapping[str, Any]]) -> List[Dict[str, Any]]:
+    """``analise_por_nicho_dia`` rebuilt from the (niche, store) rows in scope."""
+    por_nicho: Dict[str, Dict[str, Any]] = {}
+    for row in rows:
+        nicho = row.get("nicho")
+        if nicho is None:
+            continue
+        totals = por_nicho.setdefault(
+            nicho,
+            {
+                "nicho": nicho,
+                "lucro_liquido": 0.0,
+                "faturamento": 0.0,
+                "total_pedidos": 0,
+            },
+        )
+        totals["lucro_liquido"] += row.get("lucro_liquido") or 0
+        totals["faturamento"] += row.get("faturamento") or 0
+        totals["total_pedidos"] += row.get("total_pedidos") or 0
+    return [por_nicho[nicho] for nicho in sorted(por_nicho)]
+
+
+def project_report(
+    report: Dict[str, Any], subscription: Optional[Subscription]
+) -> Dict[str, Any]:
+    """
+    The part of ``report`` a subscription asked for.
+
+    KPIs and the niche analysis are re-aggregated from ``kpis_por_nicho_loja``,
+    so they are exact for any niche/store filter. Sale lists and ``top_skus``
+    keep only their matching entries (the latest sales of the whole day that
+    belong to the filter); ``melhor_produto`` and ``melhor_anuncio`` stay
+    global.
+    """
+    if subscription is None or subscription.is_everything:
+        return report
+    secoes = [
+        key
+        for key in REPORT_SECTIONS
+        if subscription.secoes is None or key in subscription.secoes
+    ]
+    projected = {key: report[key] for key in REPORT_HEADER if key in report}
+    projected["inscricao"] = subscription.to_dict()
+    if report.get("status") != "sucesso":
+        if "kpis_diarios" in secoes:
+            projected["kpis_diarios"] = report.get("kpis_diarios", {})
+        return projected
+
+    if not subscription.is_filtered:
+        projected.update({key: report.get(key) for key in secoes})
+        return projected
+
+    rows = [
+        row
+        for row in report.get("kpis_por_nicho_loja", [])
+        if subscription.matches(row)
+    ]
+    analise: List[Dict[str, Any]] = []
+    if "analise_por_nicho_dia" in secoes or "rankings_diarios" in secoes:
+        analise = _niche_analysis(rows)
+    for key in secoes:
+        if key == "kpis_diarios":
+            projected[key] = _sum_kpis(rows)
+        elif key == "kpis_por_nicho_loja":
+            projected[key] = rows
+        elif key == "analise_por_nicho_dia":
+            projected[key] = analise
+        elif key == "rankings_diarios":
+            rankings = report.get("rankings_diarios", {})
+            projected[key] = {
+                "top_nichos": sorted(
+                    analise, key=lambda row: row["lucro_liquido"], reverse=True
+                )[:TOP_NICHOS_LIMIT],
+                # SKUs sell in several stores, so only the niche filter applies
+                "top_skus": [
+                    row
+                    for row in rankings.get("top_skus", [])
+                    if subscription.nichos is None
+                    or row.get("nicho") in subscription.nichos
+                ],
+            }
+        elif key == "ultima_venda":
+            vendas = [report.get("ultima_venda")] + report.get("ultimas_15_vendas", [])
+            projected[key] = next(
+                (venda for venda in vendas if subscription.matches(venda)), None
+            )
+        elif key in ("ultimas_15_vendas", "vendas_negativas"):
+            projected[key] = [
+                venda for venda in report.get(key, []) if subscription.matches(venda)
+            ]
+        else:
+            projected[key] = report.get(key)
+    return projected
@@ -0,0 +1,213 @@
+import logging
+import os
+from dataclasses import dataclass, field
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from app.core.exceptions import ValidationException
+from app.repositories.database_repository import DatabaseWriter
+
+REQUIRED_COLUMNS = ("sku", "nicho")
+XLSX_EXTENSIONS = (".xlsx", ".xlsm")
+CSV_EXTENSIONS = (".csv", ".txt")
+
+# Spreadsheet line of the first data row (line 1 is the header)
+FIRST_DATA_LINE = 2
+
+
+@dataclass
+class ImportReport:
+    """
+    Outcome of one import: counters plus the rejected rows (up to ``max_errors``).
+
+    ``processadas`` counts valid rows sent to the upsert, so a SKU repeated
+    in several chunks counts once per chunk; ``alteradas`` counts the rows
+    actually inserted or moved to another niche.
+    """
+
+    max_errors: int = 1000
+    linhas_lidas: int = 0
+    processadas: int = 0
+    alteradas: int = 0
+    repetidas: int = 0
+    erros: List[Dict[str, Any]] = field(default_factory=list)
+    erros_omitidos: int = 0
+
+    def add_errors(self, errors: List[Dict[str, Any]]) -> None:
+        room = max(self.max_errors - len(self.erros), 0)
+        self.erros.extend(errors[:room])
+        self.erros_omitidos += max(len(errors) - room, 0)
+
+    @property
+    def rejeitadas(self) -> int:
+        return len(self.erros) + self.erros_omitidos
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "linhas_lidas": self.linhas_lidas,
+            "processadas": self.processadas,
+            "alteradas": self.alteradas,
+            "repetidas": self.repetidas,
+            "rejeitadas": self.rejeitadas,
+            "erros": self.erros,
+            "erros_omitidos": self.erros_omitidos,
+        }
+
+
+def _normalize_columns(columns) -> List[str]:
+    return ["" if c is None else str(c).strip().lower() for c in columns]
+
+
+def iter_xlsx_frames(fileobj: BinaryIO, chunk_size: int) -> Iterator[pd.DataFrame]:
+    """Frames of ``chunk_size`` rows from the first sheet, read row by row."""
+    from openpyxl import load_workbook
+
+    # read_only streams the sheet XML instead of building every cell object
+    workbook = load_workbook(fileobj, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        columns = _normalize_columns(header)
+        width = len(columns)
+        chunk: List[tuple] = []
+        for row in rows:
+            # Trailing empty cells may be left out of a row
+            chunk.append(row[:width] + (None,) * (width - len(row)))
+            if len(chunk) >= chunk_size:
+                yield pd.DataFrame.from_records(chunk, columns=columns)
+                chunk = []
+        if chunk:
+            yield pd.DataFrame.from_records(chunk, columns=columns)
+    finally:
+        workbook.close()
+
+
+def _csv_separator(fileobj: BinaryIO) -> str:
+    # Spreadsheets exported with a Brazilian locale use ";"
+    header = fileobj.readline()
+    fileobj.seek(0)
+    return ";" if header.count(b";") > header.count(b",") else ","
+
+
+def iter_csv_frames(fileobj: BinaryIO, chunk_size: int) -> Iterator[pd.DataFrame]:
+    """Frames of ``chunk_size`` rows, read with ``pd.read_csv(chunksize=...)``."""
+    reader = pd.read_csv(
+        fileobj,
+        sep=_csv_separator(fileobj),
+        dtype=str,
+        keep_default_na=False,
+        encoding="utf-8-sig",
+        chunksize=chunk_size,
+    )
+    for frame in reader:
+        frame.columns = _normalize_columns(frame.columns)
+        yield frame
+
+
+def iter_sku_frames(
+    fileobj: BinaryIO, filename: str, chunk_size: int
+) -> Iterator[pd.DataFrame]:
+    extension = os.path.splitext(filename or "")[1].lower()
+    if extension in XLSX_EXTENSIONS:
+        return iter_xlsx_frames(fileobj, chunk_size)
+    if extension in CSV_EXTENSIONS:
+        return iter_csv_frames(fileobj, chunk_size)
+    raise ValidationException(
+        f"Formato de arquivo não suportado: '{filename}'. Use XLSX ou CSV."
+    )
+
+
+def _text(column: pd.Series) -> pd.Series:
+    if pd.api.types.is_float_dtype(column) and (column.dropna() % 1 == 0).all():
+        # Integer SKUs next to blank cells are read as floats ("123.0")
+        column = column.astype("Int64")
+    return column.astype("string").str.strip().fillna("")
+
+
+def validate_frame(frame: pd.DataFrame, first_line: int):
+    """
+    Split one chunk into valid ``(sku, nicho)`` pairs and per-row errors.
+
+    Blank rows are skipped; rows missing either column are reported with
+    their spreadsheet line. Within the chunk only the last row of a repeated
+    SKU is kept, as the upsert would keep it anyway.
+    """
+    missing = [name for name in REQUIRED_COLUMNS if name not in frame.columns]
+    if missing:
+        raise ValidationException(
+            f"Colunas obrigatórias ausentes: {', '.join(missing)}. "
+            "O arquivo deve ter as colunas 'sku' e 'nicho'."
+        )
+    sku = _text(frame["sku"]).to_numpy(dtype=object)
+    nicho = _text(frame["nicho"]).to_numpy(dtype=object)
+    lines = np.arange(first_line, first_line + len(frame))
+
+    no_sku = sku == ""
+    no_nicho = nicho == ""
+    blank = no_sku & no_nicho
+    invalid = (no_sku | no_nicho) & ~blank
+    errors = [
+        {
+            "linha": int(line),
+            "sku": s or None,
+            "erro": "SKU vazio" if not s else "Nicho vazio",
+        }
+        for line, s in zip(lines[invalid], sku[invalid])
+    ]
+
+    valid = ~(no_sku | no_nicho)
+    pairs = pd.DataFrame({"sku": sku[valid], "nicho": nicho[valid]})
+    repeated = pairs["sku"].duplicated(keep="last")
+    return pairs[~repeated], errors, int(repeated.sum())
+
+
+class SkuNichoImporter:
+    """
+    Streaming SKU/niche catalog import (XLSX or CSV).
+
+    The file is read ``chunk_size`` rows at a time, each chunk is validated
+    with vectorized column operations and upserted in its own transaction,
+    so memory stays bounded by the chunk and not by the catalog size.
+    With a ``writer`` (``inserter`` must then be built on ``writer.database``),
+    chunks are read and validated by the caller's thread and upserted on the
+    writer thread, so no other service commits inside a chunk's savepoint.
+    """
+
+    def __init__(
+        self,
+        inserter,
+        chunk_size: int = 5000,
+        max_errors: int = 1000,
+        writer: Optional[DatabaseWriter] = None,
+    ):
+        self.inserter = inserter
+        self.writer = writer
+        self.chunk_size = chunk_size
+        self.max_errors = max_errors
+        self.logger = logging.getLogger(__name__)
+
+    def import_file(self, fileobj: BinaryIO, filename: str) -> ImportReport:
+        report = ImportReport(max_errors=self.max_errors)
+        line = FIRST_DATA_LINE
+        for frame in iter_sku_frames(fileobj, filename, self.chunk_size):
+            pairs, errors, repeated = validate_frame(frame, line)
+            line += len(frame)
+            report.linhas_lidas += len(frame)
+            report.repetidas += repeated
+            report.add_errors(errors)
+            report.processadas += len(pairs)
+            chunk = list(zip(pairs["sku"], pairs["nicho"]))
+            if self.writer is not None:
+                report.alteradas += self.writer.call(self.inserter.upsert_many, chunk)
+            else:
+                report.alteradas += self.inserter.upsert_many(chunk)
+        self.logger.info(
+            f"Importação de '{filename}': {report.linhas_lidas} linhas, "
+            f"{report.processadas} processadas, {report.alteradas} alteradas, "
+            f"{report.rejeitadas} rejeitadas"
+        )
+        return report
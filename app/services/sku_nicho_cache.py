@@ -0,0 +1,106 @@
+import logging
+from threading import Lock
+from typing import Dict, Iterable, NamedTuple, Optional
+
+import numpy as np
+import pandas as pd
+
+# Row of cache_versions bumped by the sku_nichos triggers
+SKU_NICHOS_VERSION = "sku_nichos"
+
+
+class _Snapshot(NamedTuple):
+    version: int
+    skus: pd.Index
+    # Niche code of each SKU in ``skus``; ``names`` has one extra None slot for code -1
+    codes: np.ndarray
+    names: np.ndarray
+
+
+class SkuNichoCache:
+    """
+    Process-wide SKU -> niche map, replacing ``LEFT JOIN sku_nichos`` in
+    report queries.
+
+    The map is loaded once into a ``pd.Index`` of SKUs plus an array of niche
+    codes, and order frames are labelled with one ``get_indexer`` call. Every
+    insert, update or delete on ``sku_nichos`` bumps its ``cache_versions``
+    row through triggers (whichever process or endpoint wrote it), so each
+    lookup only checks that version and reloads when it moved. A reload
+    builds a new snapshot and swaps it in one assignment, so concurrent
+    readers see either the old map or the new one.
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self.loads = 0
+        self._snapshot: Optional[_Snapshot] = None
+        self._lock = Lock()
+        self.logger = logging.getLogger(__name__)
+
+    def _current_version(self) -> int:
+        cursor = self.db.conn.cursor()
+        cursor.execute(
+            "SELECT version FROM cache_versions WHERE name = ?", (SKU_NICHOS_VERSION,)
+        )
+        row = cursor.fetchone()
+        return row[0] if row else 0
+
+    def _load(self, version: int) -> _Snapshot:
+        cursor = self.db.conn.cursor()
+        cursor.execute("SELECT sku, nicho FROM sku_nichos")
+        rows = cursor.fetchall()
+        skus = pd.Index([row[0] for row in rows], dtype=object)
+        codes, categories = pd.factorize(
+            pd.Series([row[1] for row in rows], dtype=object)
+        )
+        names = np.append(np.asarray(categories, dtype=object), [None])
+        self.loads += 1
+        self.logger.info(
+            f"Mapa SKU/nicho carregado: {len(skus)} SKUs, {len(categories)} nichos (versão {version})"
+        )
+        return _Snapshot(version, skus, codes, names)
+
+    def snapshot(self) -> _Snapshot:
+        """The current map, reloaded first if ``sku_nichos`` changed since it was read."""
+        version = self._current_version()
+        snapshot = self._snapshot
+        if snapshot is not None and snapshot.version == version:
+            return snapshot
+        with self._lock:
+            snapshot = self._snapshot
+            if snapshot is None or snapshot.version != version:
+                snapshot = self._snapshot = self._load(version)
+        return snapshot
+
+    def lookup(self, skus: Iterable) -> np.ndarray:
+        """Niche of each SKU (None when unmapped), as an object array."""
+        snapshot = self.snapshot()
+        positions = snapshot.skus.get_indexer(pd.Index(skus, dtype=object))
+        found = positions >= 0
+        codes = np.full(len(positions), -1, dtype=np.intp)
+        codes[found] = snapshot.codes[positions[found]]
+        return snapshot.names[codes]
+
+    def get_many(self, skus: Iterable[str]) -> Dict[str, str]:
+        """``{sku: nicho}`` for the mapped SKUs among ``skus``."""
+        skus = list(skus)
+        return {
+            sku: nicho
+            for sku, nicho in zip(skus, self.lookup(skus))
+            if nicho is not None
+        }
+
+    def apply(self, df: pd.DataFrame, column: str = "nicho") -> pd.DataFrame:
+        """Add the ``nicho`` column to an order frame (in place), as the JOIN did."""
+        df[column] = self.lookup(df["sku"]) if not df.empty else None
+        return df
+
+    def status(self) -> Dict[str, int]:
+        snapshot = self._snapshot
+        return {
+            "versao": snapshot.version if snapshot else -1,
+            "skus": len(snapshot.skus) if snapshot else 0,
+            "nichos": len(snapshot.names) - 1 if snapshot else 0,
+            "carregamentos": self.loads,
+        }
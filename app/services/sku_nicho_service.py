@@ -1,10 +1,23 @@
 import logging
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# Re-importing a SKU moves it to the new niche; unchanged rows are not rewritten
+UPSERT_SKU_NICHO_SQL = """
+    INSERT INTO sku_nichos (sku, nicho) VALUES (?, ?)
+    ON CONFLICT(sku) DO UPDATE SET nicho = excluded.nicho
+    WHERE sku_nichos.nicho != excluded.nicho
+"""
+
+SKU_NICHO_SORT_COLUMNS = ("sku", "nicho", "created_at")
+# Shortest substring the trigram index can match; shorter searches scan the table
+FTS_MIN_CHARS = 3
 
 
 class SkuNichoInserter:
     def __init__(self, db):
         self.db = db
         self.logger = logging.getLogger(__name__)
+        self._fts: Optional[bool] = None
         self.logger.info("SkuNichoInserter inicializado com sucesso")
 
     def insert_one(self, sku: str, nicho: str):
@@ -23,16 +36,39 @@ class SkuNichoInserter:
     def insert_many(self, sku_nicho_list: list[dict]):
         try:
             self.logger.info(f"Inserindo {len(sku_nicho_list)} registros de SKU/nicho")
-            values = [(item["sku"], item["nicho"]) for item in sku_nicho_list]
-            self.db.cursor.executemany(
-                "INSERT INTO sku_nichos (sku, nicho) VALUES (?, ?)", values
-            )
-            self.db.commit()
+            self.upsert_many((item["sku"], item["nicho"]) for item in sku_nicho_list)
             self.logger.info("Inserção múltipla concluída com sucesso")
         except Exception as e:
             self.logger.exception(f"Erro ao inserir múltiplos SKUs: {e}")
             raise
 
+    def _write_pairs(self, sql: str, pairs: Iterable[Tuple[str, str]]) -> int:
+        # Own cursor: bulk writes run on the writer thread. A failure rolls
+        # back to the savepoint only, keeping writes already pending on the
+        # connection
+        cursor = self.db.conn.cursor()
+        cursor.execute("SAVEPOINT sku_nichos_write")
+        try:
+            cursor.executemany(sql, pairs)
+            rowcount = cursor.rowcount
+        except Exception:
+            cursor.execute("ROLLBACK TO sku_nichos_write")
+            cursor.execute("RELEASE sku_nichos_write")
+            raise
+        cursor.execute("RELEASE sku_nichos_write")
+        self.db.conn.commit()
+        return rowcount
+
+    def upsert_many(self, pairs: Iterable[Tuple[str, str]]) -> int:
+        """Insert or re-assign ``(sku, nicho)`` pairs in one transaction; returns rows changed."""
+        return self._write_pairs(UPSERT_SKU_NICHO_SQL, pairs)
+
+    def insert_missing(self, pairs: Iterable[Tuple[str, str]]) -> int:
+        """Insert ``(sku, nicho)`` pairs for SKUs without a niche, keeping existing ones."""
+        return self._write_pairs(
+            "INSERT OR IGNORE INTO sku_nichos (sku, nicho) VALUES (?, ?)", pairs
+        )
+
     def update_nicho(self, sku: str, new_nicho: str):
         try:
             self.logger.info(f"Atualizando SKU '{sku}' para o nicho '{new_nicho}'")
@@ -62,10 +98,76 @@ class SkuNichoInserter:
     def list_all(self):
         try:
             self.logger.info("Listando todos os SKUs")
-            self.db.cursor.execute("SELECT sku, nicho, created_at FROM sku_nichos")
-            rows = self.db.cursor.fetchall()
+            # Own cursor: sync routes run in a thread pool and must not share one
+            cursor = self.db.conn.cursor()
+            cursor.execute("SELECT sku, nicho, created_at FROM sku_nichos")
+            rows = cursor.fetchall()
             self.logger.info(f"{len(rows)} registros retornados")
             return rows
         except Exception as e:
             self.logger.exception(f"Erro ao listar SKUs: {e}")
             raise
+
+    def _has_fts(self) -> bool:
+        if self._fts is None:
+            cursor = self.db.conn.cursor()
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'sku_nichos_fts'")
+            self._fts = cursor.fetchone() is not None
+        return self._fts
+
+    def search(
+        self,
+        pagina: int = 1,
+        por_pagina: int = 50,
+        ordenar: str = "sku",
+        ordem: str = "asc",
+        nicho: Optional[str] = None,
+        busca: Optional[str] = None,
+        modo: str = "prefixo",
+    ) -> Tuple[List[Dict[str, Any]], int]:
+        """
+        One page of SKU/niche records and the total matching the filters.
+
+        ``busca`` matches SKUs starting with it (a range on the primary key,
+        case-sensitive) or, with ``modo="contem"``, containing it (the FTS5
+        trigram index, case-insensitive).
+        """
+        if ordenar not in SKU_NICHO_SORT_COLUMNS:
+            raise ValueError(f"Coluna de ordenação inválida: {ordenar}")
+        direction = "DESC" if ordem == "desc" else "ASC"
+        conditions, params = [], []
+        if nicho:
+            conditions.append("nicho = ?")
+            params.append(nicho)
+        if busca:
+            if modo == "contem" and len(busca) >= FTS_MIN_CHARS and self._has_fts():
+                conditions.append(
+                    "rowid IN (SELECT rowid FROM sku_nichos_fts WHERE sku_nichos_fts MATCH ?)"
+                )
+                params.append('"' + busca.replace('"', '""') + '"')
+            elif modo == "contem":
+                escaped = (
+                    busca.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+                )
+                conditions.append("sku LIKE ? ESCAPE '\\'")
+                params.append(f"%{escaped}%")
+            else:
+                conditions.append("sku >= ? AND sku < ?")
+                params.extend([busca, busca + "\U0010ffff"])
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        order = f"{ordenar} {direction}" + (
+            f", sku {direction}" if ordenar != "sku" else ""
+        )
+
+        cursor = self.db.conn.cursor()
+        cursor.execute(f"SELECT COUNT(*) FROM sku_nichos {where}", params)
+        total = cursor.fetchone()[0]
+        cursor.execute(
+            f"SELECT sku, nicho, created_at FROM sku_nichos {where} ORDER BY {order} LIMIT ? OFFSET ?",
+            params + [por_pagina, (pagina - 1) * por_pagina],
+        )
+        rows = [
+            {"sku": sku, "nicho": nicho, "created_at": created_at}
+            for sku, nicho, created_at in cursor.fetchall()
+        ]
+        return rows, total
@@ -0,0 +1,109 @@
+import logging
+from datetime import datetime
+from typing import Any, Dict, Iterable, Optional, Set
+
+STATUS_RUNNING = "running"
+STATUS_DONE = "done"
+STATUS_ERROR = "error"
+# Day synced by the periodic task while still receiving orders
+STATUS_OPEN = "open"
+
+
+class SyncStateService:
+    """Per-day ingestion checkpoints stored in the ``sync_state`` table."""
+
+    def __init__(self, db):
+        self.db = db
+        self.logger = logging.getLogger(__name__)
+        self.logger.info("SyncStateService inicializado com sucesso")
+
+    def _upsert(self, day: str, status: str, **fields: Any) -> None:
+        columns = ["day", "status", *fields]
+        updates = ", ".join(f"{col} = excluded.{col}" for col in columns[1:])
+        cursor = self.db.conn.cursor()
+        cursor.execute(
+            f"""
+            INSERT INTO sync_state ({", ".join(columns)}, updated_at)
+            VALUES ({", ".join("?" for _ in columns)}, CURRENT_TIMESTAMP)
+            ON CONFLICT(day) DO UPDATE SET {updates}, updated_at = CURRENT_TIMESTAMP
+            """,
+            (day, status, *fields.values()),
+        )
+        self.db.commit()
+
+    def get(self, day: str) -> Optional[Dict[str, Any]]:
+        cursor = self.db.conn.cursor()
+        cursor.execute("SELECT * FROM sync_state WHERE day = ?", (day,))
+        row = cursor.fetchone()
+        if row is None:
+            return None
+        return dict(zip([desc[0] for desc in cursor.description], row))
+
+    def completed_days(self, days: Iterable[str]) -> Set[str]:
+        days = list(days)
+        if not days:
+            return set()
+        cursor = self.db.conn.cursor()
+        cursor.execute(
+            "SELECT day FROM sync_state WHERE status = ? AND day BETWEEN ? AND ?",
+            (STATUS_DONE, min(days), max(days)),
+        )
+        return {row[0] for row in cursor.fetchall()} & set(days)
+
+    def summary(self, data_inicio: str, data_fim: str) -> Dict[str, int]:
+        cursor = self.db.conn.cursor()
+        cursor.execute(
+            "SELECT status, COUNT(*) FROM sync_state WHERE day BETWEEN ? AND ? GROUP BY status",
+            (data_inicio, data_fim),
+        )
+        return dict(cursor.fetchall())
+
+    def mark_running(self, day: str) -> None:
+        cursor = self.db.conn.cursor()
+        cursor.execute(
+            """
+            INSERT INTO sync_state (day, status, attempts, updated_at)
+            VALUES (?, ?, 1, CURRENT_TIMESTAMP)
+            ON CONFLICT(day) DO UPDATE SET status = excluded.status,
+                attempts = attempts + 1, updated_at = CURRENT_TIMESTAMP
+            """,
+            (day, STATUS_RUNNING),
+        )
+        self.db.commit()
+
+    def record_sync(
+        self,
+        day: str,
+        orders_count: int,
+        changed_count: int,
+        max_payment_date: Optional[str],
+        closed: bool = False,
+    ) -> None:
+        """
+        Advance a day's watermark after an incremental sync.
+
+        ``closed`` marks the final sync of a day that has ended, after which the
+        periodic task stops refetching it.
+        """
+        previous = self.get(day)
+        if previous and previous.get("max_payment_date") and max_payment_date:
+            max_payment_date = max(previous["max_payment_date"], max_payment_date)
+        elif previous and not max_payment_date:
+            max_payment_date = previous.get("max_payment_date")
+        self._upsert(
+            day,
+            STATUS_DONE if closed else STATUS_OPEN,
+            orders_count=orders_count,
+            changed_count=changed_count,
+            max_payment_date=max_payment_date,
+            last_synced_at=datetime.now().isoformat(),
+            last_error=None,
+        )
+
+    def is_closed(self, day: str) -> bool:
+        state = self.get(day)
+        return state is not None and state["status"] == STATUS_DONE
+
+    def mark_error(self, day: str, error: str) -> None:
+        self.logger.warning(f"Sincronização do dia {day} falhou: {error}")
+        self._upsert(day, STATUS_ERROR, last_error=error)
@@ -1,5 +1,6 @@
 from app.services.ml_service import (
     extract_features,
     train_ml_model,
+    train_partitioned_models,
     predict_sales_for_df,
 )
@@ -0,0 +1,20 @@
+"""
+Gunicorn worker that starts uvicorn with this app's settings.
+
+``uvicorn.workers.UvicornWorker`` builds its uvicorn config from gunicorn's
+own options, so settings such as ``WS_PER_MESSAGE_DEFLATE`` are applied here.
+
+Usage:
+    gunicorn app.main:app -w 4 -k app.workers.UvicornWorker
+"""
+
+from uvicorn.workers import UvicornWorker as BaseUvicornWorker
+
+from app.config.settings import settings
+
+
+class UvicornWorker(BaseUvicornWorker):
+    CONFIG_KWARGS = {
+        **BaseUvicornWorker.CONFIG_KWARGS,
+        "ws_per_message_deflate": settings.ws_per_message_deflate,
+    }
@@ -0,0 +1,111 @@
+"""
+Benchmark broadcast CPU cost: per-client ``send_json`` vs serialize-once.
+
+Simulates N WebSocket clients whose sends cost nothing but what the server
+does to build the frame, and broadcasts a daily-report-sized message.
+
+Usage:
+    python -m benchmarks.bench_broadcast [--clients 500] [--sales 2000] [--rounds 5]
+"""
+
+import argparse
+import asyncio
+import json
+import time
+
+from app.core.connection_manager import ConnectionManager
+from benchmarks.fixtures import make_sells_payload
+
+
+class SimulatedWebSocket:
+    """Does the same serialization work as starlette's WebSocket, without a network."""
+
+    def __init__(self):
+        self.bytes_sent = 0
+
+    async def accept(self):
+        pass
+
+    async def send_json(self, data):
+        text = json.dumps(data, separators=(",", ":"), ensure_ascii=False)
+        self.bytes_sent += len(text)
+
+    async def send_text(self, text):
+        self.bytes_sent += len(text)
+
+    async def send_bytes(self, data):
+        self.bytes_sent += len(data)
+
+
+def make_report(n_sales: int) -> dict:
+    orders = [o for cart in make_sells_payload(n_sales).values() for o in cart]
+    return {
+        "tipo": "relatorio_diario",
+        "dados": {
+            "status": "sucesso",
+            "dia": "2024-01-01",
+            "kpis": {"faturamento": 123456.78, "lucro": 23456.7, "pedidos": n_sales},
+            "vendas": orders,
+        },
+    }
+
+
+async def per_client_send_json(clients, message, rounds):
+    """The previous broadcast: one send_json (one json.dumps) per connection."""
+    for _ in range(rounds):
+        for client in clients:
+            await client.send_json(message)
+
+
+async def serialize_once(clients, message, rounds, compression=None):
+    manager = ConnectionManager(max_queue_size=rounds + 1)
+    for client in clients:
+        await manager.connect(client, compression)
+    for _ in range(rounds):
+        await manager.broadcast(message)
+    await manager.drain()
+    for client in clients:
+        manager.disconnect(client)
+
+
+def measure(label, coro_factory, n_clients, rounds):
+    clients = [SimulatedWebSocket() for _ in range(n_clients)]
+    cpu, wall = time.process_time(), time.perf_counter()
+    asyncio.run(coro_factory(clients))
+    return {
+        "modo": label,
+        "clientes": n_clients,
+        "broadcasts": rounds,
+        "cpu_s": round(time.process_time() - cpu, 3),
+        "wall_s": round(time.perf_counter() - wall, 3),
+        "mb_por_cliente_por_broadcast": round(
+            clients[0].bytes_sent / rounds / 1024 / 1024, 3
+        ),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--clients", type=int, default=500)
+    parser.add_argument("--sales", type=int, default=2000)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    message = make_report(args.sales)
+    runs = [
+        (
+            "send_json_por_cliente",
+            lambda c: per_client_send_json(c, message, args.rounds),
+        ),
+        ("serializa_uma_vez", lambda c: serialize_once(c, message, args.rounds)),
+        (
+            "serializa_uma_vez_gzip",
+            lambda c: serialize_once(c, message, args.rounds, "gzip"),
+        ),
+    ]
+    for label, factory in runs:
+        print(json.dumps(measure(label, factory, args.clients, args.rounds)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Benchmark parse + insert of a sells payload: per-order dicts vs columnar batches.
+
+Each mode parses the same synthetic payload and writes it with
+``insert_changed_orders`` / ``insert_changed_columns`` into a fresh SQLite
+database, reporting the parse and write time separately.
+
+Usage:
+    python -m benchmarks.bench_columnar_ingest [--orders 100000]
+"""
+
+import argparse
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+
+from app.services.data_parser_service import DataParser
+from app.services.database_service import DatabaseService
+from app.services.order_service import OrderInserter
+from benchmarks.fixtures import make_sells_payload
+
+
+def run_mode(mode: str, payload: dict) -> dict:
+    db_fd, db_path = tempfile.mkstemp(suffix=".db")
+    service = DatabaseService(db_path)
+    service.connect()
+    service.create_tables()
+    inserter = OrderInserter(service.database)
+    try:
+        tracemalloc.start()
+        start = time.perf_counter()
+        if mode == "dicts":
+            parsed = DataParser(payload).parse_orders()
+        else:
+            parsed = DataParser(payload).parse_orders_columnar()
+        parsed_at = time.perf_counter()
+        _, parse_peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        if mode == "dicts":
+            changes = inserter.insert_changed_orders(parsed)
+        else:
+            changes = inserter.insert_changed_columns(parsed)
+        written_at = time.perf_counter()
+    finally:
+        service.close()
+        os.close(db_fd)
+        os.unlink(db_path)
+    return {
+        "modo": mode,
+        "pedidos": changes.seen,
+        "tempo_parse_s": round(parsed_at - start, 3),
+        "tempo_escrita_s": round(written_at - parsed_at, 3),
+        "tempo_total_s": round(written_at - start, 3),
+        "pico_memoria_parse_mb": round(parse_peak / 1024 / 1024, 1),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--orders", type=int, default=100_000)
+    args = parser.parse_args()
+
+    payload = make_sells_payload(args.orders)
+    for mode in ("dicts", "colunas"):
+        print(json.dumps(run_mode(mode, payload), ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
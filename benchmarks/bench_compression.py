@@ -0,0 +1,184 @@
+"""
+Benchmark HTTP response compression of a month-long relatorio_flex payload.
+
+Builds the report with ReportService from synthetic orders spread over a
+month (with niches) on a temporary database and renders it the way the route
+sends it. Then, for each gzip level and brotli quality (when installed),
+reports the compressed size, the ratio and the CPU time of one compression.
+It also measures the event loop's worst lag while several such responses
+are compressed at once, inline vs in worker threads as
+``CompressionMiddleware`` does, and the cost of serving the daily report
+snapshot's cached variant against compressing it per request.
+
+Usage:
+    python -m benchmarks.bench_compression [--days 30] [--orders-per-day 1000] [--rounds 5]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import date, timedelta
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from app.core.compression import (
+    ENCODING_BROTLI,
+    ENCODING_GZIP,
+    ResponseCompressor,
+    supported_encodings,
+)
+from app.services.data_parser_service import DataParser
+from app.services.database_service import DatabaseService
+from app.services.order_service import OrderInserter
+from app.services.report_cache import ReportSnapshot
+from app.services.report_service import ReportService
+from app.services.sku_nicho_service import SkuNichoInserter
+from benchmarks.fixtures import make_sells_payload
+
+GZIP_LEVELS = (1, 4, 6, 9)
+BROTLI_QUALITIES = (1, 4, 6, 9, 11)
+
+
+def build_report(database, days: int, orders_per_day: int, n_niches: int = 40):
+    inserter = OrderInserter(database)
+    start = date(2024, 6, 1)
+    skus = set()
+    for offset in range(days):
+        day = (start + timedelta(days=offset)).isoformat()
+        payload = make_sells_payload(orders_per_day, day=day, seed=offset)
+        # The fixture numbers orders from zero every day
+        payload = {
+            f"{day}-{cart}": [dict(o, order=f"{day}-{o['order']}") for o in orders]
+            for cart, orders in payload.items()
+        }
+        columns = DataParser(payload).parse_orders_columnar()
+        skus.update(columns.columns["sku"])
+        inserter.insert_changed_columns(columns)
+    rng = random.Random(1)
+    SkuNichoInserter(database).insert_many(
+        [
+            {"sku": sku, "nicho": f"Nicho {rng.randint(1, n_niches)}"}
+            for sku in sorted(skus)
+        ]
+    )
+    fim = (start + timedelta(days=days - 1)).isoformat()
+    return ReportService(database).generate_relatorio_flex(start.isoformat(), fim)
+
+
+def measure(body: bytes, encoding: str, level: int, rounds: int) -> dict:
+    compressor = ResponseCompressor(gzip_level=level, brotli_quality=level)
+    for _ in range(rounds):
+        compressed = compressor.compress(body, encoding)
+    metrics = compressor.status()["codificacoes"][encoding]
+    return {
+        "codificacao": encoding,
+        "nivel": level,
+        "bytes": len(compressed),
+        "taxa": round(len(body) / len(compressed), 2),
+        "cpu_ms": round(metrics["cpu_ms"] / rounds, 1),
+    }
+
+
+async def loop_lag(body: bytes, encoding: str, offload: bool, concurrent: int) -> float:
+    """Worst delay of a 1 ms ticker while ``concurrent`` responses are compressed."""
+    compressor = ResponseCompressor()
+    worst = 0.0
+    done = False
+
+    async def ticker():
+        nonlocal worst
+        while not done:
+            start = time.perf_counter()
+            await asyncio.sleep(0.001)
+            worst = max(worst, time.perf_counter() - start - 0.001)
+
+    async def one():
+        if offload:
+            await compressor.compress_async(body, encoding)
+        else:
+            compressor.compress(body, encoding)
+            await asyncio.sleep(0)
+
+    task = asyncio.create_task(ticker())
+    await asyncio.sleep(0.01)
+    await asyncio.gather(*(one() for _ in range(concurrent)))
+    done = True
+    await task
+    return round(worst * 1000, 1)
+
+
+def median_ms(fn, rounds: int) -> float:
+    times = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return round(statistics.median(times) * 1000, 3)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--orders-per-day", type=int, default=1000)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--concurrent", type=int, default=8)
+    args = parser.parse_args()
+
+    db_fd, db_path = tempfile.mkstemp(suffix=".db")
+    database_service = DatabaseService(db_path)
+    database_service.connect()
+    database_service.create_tables()
+    try:
+        report = build_report(database_service.database, args.days, args.orders_per_day)
+    finally:
+        database_service.close()
+        os.close(db_fd)
+        os.unlink(db_path)
+
+    body = JSONResponse(jsonable_encoder(report)).body
+    print(json.dumps({"dias": args.days, "bytes_json": len(body)}))
+    for encoding in supported_encodings():
+        levels = BROTLI_QUALITIES if encoding == ENCODING_BROTLI else GZIP_LEVELS
+        for level in levels:
+            print(json.dumps(measure(body, encoding, level, args.rounds)))
+
+    for offload in (False, True):
+        lag = asyncio.run(loop_lag(body, ENCODING_GZIP, offload, args.concurrent))
+        print(
+            json.dumps(
+                {
+                    "compressao": "thread" if offload else "no_loop",
+                    "respostas_simultaneas": args.concurrent,
+                    "atraso_max_loop_ms": lag,
+                },
+                ensure_ascii=False,
+            )
+        )
+
+    compressor = ResponseCompressor()
+    snapshot = ReportSnapshot(1, jsonable_encoder(report), None)
+    snapshot.body(ENCODING_GZIP, compressor)
+    print(
+        json.dumps(
+            {
+                "snapshot": "gzip",
+                "por_requisicao_ms": median_ms(
+                    lambda: compressor.compress(snapshot.body(), ENCODING_GZIP),
+                    args.rounds,
+                ),
+                "variante_em_cache_ms": median_ms(
+                    lambda: snapshot.body(ENCODING_GZIP, compressor), args.rounds
+                ),
+            }
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
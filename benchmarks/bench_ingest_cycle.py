@@ -0,0 +1,123 @@
+"""
+End-to-end ingest benchmark against the local replay server.
+
+Runs full BackgroundTaskService cycles (fetch → parse → insert → report →
+broadcast) on a temporary database and reports orders/second. The first cycle
+inserts every order; later ones fetch the same payload and only hash-compare.
+
+Usage:
+    python -m benchmarks.bench_ingest_cycle [--orders 20000] [--cycles 3]
+        [--page-size 2000] [--latency-ms 0] [--error-rate 0]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+
+from app.background_tasks.periodic_report_task import BackgroundTaskService
+from app.services.data_service import AsyncDataClient
+from app.services.database_service import DatabaseService
+from app.services.order_service import OrderInserter
+from app.services.report_service import ReportService
+from app.services.sync_state_service import SyncStateService
+from benchmarks.replay_server import ReplayConfig, ReplayServer
+
+
+class CountingManager:
+    """ConnectionManager stand-in that only counts broadcasts."""
+
+    def __init__(self):
+        self.broadcasts = 0
+
+    async def broadcast(self, message):
+        self.broadcasts += 1
+
+    async def broadcast_report(self, snapshot, tipo):
+        self.broadcasts += 1
+
+
+async def run_cycles(service: BackgroundTaskService, cycles: int) -> list:
+    results = []
+    for i in range(cycles):
+        # Force the report stage to run on every cycle
+        service.current_daily_report = None
+        start = time.perf_counter()
+        changes = await service.run_cycle()
+        elapsed = time.perf_counter() - start
+        results.append(
+            {
+                "ciclo": i + 1,
+                "pedidos": changes.seen,
+                "pedidos_alterados": len(changes),
+                "tempo_s": round(elapsed, 3),
+                "pedidos_por_s": round(changes.seen / elapsed, 1) if elapsed else None,
+                "erros": service.last_cycle.get("erros"),
+            }
+        )
+    results.append({"estagios": service.pipeline_status()["estagios"]})
+    await service.stop()
+    await service.data_client.aclose()
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--orders", type=int, default=20_000, help="orders per day")
+    parser.add_argument("--cycles", type=int, default=3)
+    parser.add_argument("--page-size", type=int, default=0)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    config = ReplayConfig(
+        orders_per_day=args.orders,
+        latency_ms=args.latency_ms,
+        error_rate=args.error_rate,
+        page_size=args.page_size,
+    )
+    db_fd, db_path = tempfile.mkstemp(suffix=".db")
+    database_service = DatabaseService(db_path)
+    database_service.connect()
+    database_service.create_tables()
+    try:
+        with ReplayServer(config) as server:
+            database = database_service.database
+            service = BackgroundTaskService(
+                app=None,
+                manager=CountingManager(),
+                report_service=ReportService(database),
+                data_client=AsyncDataClient(
+                    "token",
+                    base_url=server.base_url,
+                    retry_wait_min=0,
+                    retry_wait_max=0.1,
+                ),
+                order_inserter=OrderInserter(database),
+                sync_state=SyncStateService(database),
+                batch_size=args.batch_size,
+            )
+            for result in asyncio.run(run_cycles(service, args.cycles)):
+                print(json.dumps(result, ensure_ascii=False))
+            print(
+                json.dumps(
+                    {
+                        "requisicoes": server.stats.requests,
+                        "erros_injetados": server.stats.errors,
+                        "mb_enviados": round(server.stats.bytes_sent / 1024 / 1024, 2),
+                        "broadcasts": service.manager.broadcasts,
+                    },
+                    ensure_ascii=False,
+                )
+            )
+    finally:
+        database_service.close()
+        os.close(db_fd)
+        os.unlink(db_path)
+
+
+if __name__ == "__main__":
+    main()
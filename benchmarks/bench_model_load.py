@@ -0,0 +1,85 @@
+"""
+Benchmark cold-start load time and resident memory of the forecast model formats.
+
+Each format is loaded in a fresh interpreter so import and unpickling costs are
+measured the way the application pays them on startup.
+
+Usage:
+    python -m benchmarks.bench_model_load [--pickle models/profit_forecast_model.pkl]
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+PROBE = r"""
+import json, resource, sys, time
+
+def rss_kb():
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * resource.getpagesize() // 1024
+
+fmt, path = sys.argv[1], sys.argv[2]
+rss_before = rss_kb()
+start = time.perf_counter()
+if fmt == "pickle":
+    from joblib import load
+else:
+    import lightgbm as lgb
+imported = time.perf_counter()
+if fmt == "pickle":
+    model = load(path)
+else:
+    model = lgb.Booster(model_file=path)
+loaded = time.perf_counter()
+print(json.dumps({
+    "formato": fmt,
+    "tempo_import_s": round(imported - start, 4),
+    "tempo_carga_s": round(loaded - imported, 4),
+    "rss_delta_mb": round((rss_kb() - rss_before) / 1024, 1),
+    "rss_pico_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+}))
+"""
+
+
+def run_probe(fmt: str, path: Path, repeat: int) -> dict:
+    runs = []
+    for _ in range(repeat):
+        out = subprocess.run(
+            [sys.executable, "-c", PROBE, fmt, str(path)],
+            check=True,
+            capture_output=True,
+            text=True,
+        )
+        runs.append(json.loads(out.stdout.strip().splitlines()[-1]))
+    best = min(runs, key=lambda r: r["tempo_carga_s"])
+    best["tamanho_arquivo_mb"] = round(path.stat().st_size / 1024 / 1024, 2)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pickle", default="models/profit_forecast_model.pkl")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    from joblib import load
+    from app.services.ml_service import export_native_model
+
+    pickle_path = Path(args.pickle)
+    with tempfile.TemporaryDirectory() as tmp:
+        native_path = Path(tmp) / "model.txt"
+        export_native_model(
+            load(pickle_path),
+            model_path=str(native_path),
+            metadata_path=str(Path(tmp) / "model.json"),
+        )
+        for fmt, path in (("pickle", pickle_path), ("nativo", native_path)):
+            print(json.dumps(run_probe(fmt, path, args.repeat), ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""
+Benchmark /orders/busca: FTS5 ranked search vs a LIKE scan over orders.
+
+Fills a fresh SQLite database with synthetic orders (titles drawn from a
+product vocabulary, so common and rare words both occur) through
+``OrderInserter``, which keeps ``orders_fts`` in sync, then times
+``OrderSearchService.search`` for a few typical queries, with and without
+date range and niche filters, next to the equivalent ``LIKE '%...%'`` scan.
+
+Usage:
+    python -m benchmarks.bench_order_search [--orders 1000000] [--repeat 5]
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from app.services.database_service import DatabaseService
+from app.services.order_search_service import OrderSearchService
+from app.services.order_service import ORDER_COLUMNS, OrderColumns, OrderInserter
+from app.services.sku_nicho_service import SkuNichoInserter
+
+PRODUCTS = ["Tapete", "Luminária", "Cadeira", "Panela", "Toalha", "Cortina", "Almofada"]
+ADJECTIVES = ["Sala", "Quarto", "Cozinha", "Banheiro", "Infantil", "Gamer", "Retrô"]
+MATERIALS = ["Algodão", "Madeira", "Inox", "Veludo", "Bambu", "Cerâmica", "Couro"]
+NICHES = ["Casa", "Cozinha", "Decoração", "Escritório", "Pet"]
+CHUNK_SIZE = 50000
+
+QUERIES = [
+    ("palavra comum", {"texto": "tapete"}),
+    ("duas palavras", {"texto": "luminaria bambu"}),
+    ("palavra rara", {"texto": "modelo 4242"}),
+    ("sku", {"texto": "SKU01234"}),
+    (
+        "comum + 7 dias",
+        {"texto": "tapete", "data_inicio": "2024-06-01", "data_fim": "2024-06-07"},
+    ),
+    ("comum + nicho", {"texto": "cadeira", "nicho": "Escritório"}),
+    ("comum por data", {"texto": "panela", "ordenar": "data"}),
+]
+
+
+def fill(
+    inserter: OrderInserter, n_orders: int, n_skus: int, rng: random.Random
+) -> None:
+    start = datetime(2024, 1, 1)
+    for offset in range(0, n_orders, CHUNK_SIZE):
+        size = min(CHUNK_SIZE, n_orders - offset)
+        columns = {col: [None] * size for col in ORDER_COLUMNS}
+        for i in range(size):
+            sku = rng.randrange(n_skus)
+            columns["order_id"][i] = f"ORD{offset + i:09d}"
+            columns["sku"][i] = f"SKU{sku:05d}"
+            columns["ad"][i] = f"MLB{sku * 7 + 1000000}"
+            columns["title"][i] = (
+                f"{rng.choice(PRODUCTS)} {rng.choice(ADJECTIVES)} "
+                f"{rng.choice(MATERIALS)} Modelo {rng.randrange(10000)}"
+            )
+            paid = start + timedelta(minutes=rng.randrange(365 * 24 * 60))
+            columns["payment_date"][i] = paid.strftime("%Y-%m-%d %H:%M:%S")
+            columns["quantity"][i] = 1
+        inserter.insert_columns(OrderColumns(columns))
+
+
+def like_scan(db, texto: str) -> int:
+    conditions, params = [], []
+    for term in texto.split():
+        conditions.append("(title LIKE ? OR sku LIKE ? OR ad LIKE ?)")
+        params.extend([f"%{term}%"] * 3)
+    cursor = db.conn.cursor()
+    cursor.execute(
+        f"SELECT COUNT(*) FROM orders WHERE {' AND '.join(conditions)}", params
+    )
+    return cursor.fetchone()[0]
+
+
+def timed(fn, repeat: int):
+    times, result = [], None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        times.append((time.perf_counter() - start) * 1000)
+    return result, round(statistics.median(times), 2)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--orders", type=int, default=1000000)
+    parser.add_argument("--skus", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    db_fd, db_path = tempfile.mkstemp(suffix=".db")
+    service = DatabaseService(db_path)
+    try:
+        service.connect()
+        service.create_tables()
+        db = service.database
+        start = time.perf_counter()
+        fill(OrderInserter(db), args.orders, args.skus, rng)
+        SkuNichoInserter(db).insert_many(
+            [
+                {"sku": f"SKU{i:05d}", "nicho": NICHES[i % len(NICHES)]}
+                for i in range(args.skus)
+            ]
+        )
+        print(
+            json.dumps(
+                {
+                    "pedidos": args.orders,
+                    "carga_s": round(time.perf_counter() - start, 1),
+                    "banco_mb": round(os.path.getsize(db_path) / 1024 / 1024, 1),
+                }
+            )
+        )
+
+        search = OrderSearchService(db)
+        for label, params in QUERIES:
+            (_, total), fts_ms = timed(
+                lambda: search.search(por_pagina=50, **params), args.repeat
+            )
+            _, page_ms = timed(
+                lambda: search.search(pagina=100, por_pagina=50, **params), args.repeat
+            )
+            result = {
+                "consulta": label,
+                "resultados": total,
+                "fts_ms": fts_ms,
+                "pagina_100_ms": page_ms,
+            }
+            if set(params) == {"texto"}:
+                _, result["like_ms"] = timed(lambda: like_scan(db, params["texto"]), 1)
+            print(json.dumps(result, ensure_ascii=False))
+    finally:
+        service.close()
+        os.close(db_fd)
+        os.unlink(db_path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Benchmark per-niche model training wall time across process pool sizes.
+
+Usage:
+    python -m benchmarks.bench_partitioned_training [--orders 60000] [--nichos 12]
+"""
+
+import argparse
+import json
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+
+def make_orders(n_orders: int, n_nichos: int, seed: int = 42) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    start = pd.Timestamp("2024-01-01")
+    return pd.DataFrame(
+        {
+            "order_id": [f"ORD{i}" for i in range(n_orders)],
+            "sku": rng.integers(0, n_orders // 20, n_orders).astype(str),
+            "nicho": [f"Nicho {k}" for k in rng.integers(0, n_nichos, n_orders)],
+            "store": rng.integers(0, 4, n_orders),
+            "payment_date": start
+            + pd.to_timedelta(rng.integers(0, 90 * 24 * 3600, n_orders), unit="s"),
+            "gross_profit": rng.normal(60, 15, n_orders),
+            "taxes": rng.normal(8, 2, n_orders),
+            "freight": rng.normal(12, 4, n_orders),
+            "cost": rng.normal(25, 5, n_orders),
+            "total_value": rng.normal(120, 30, n_orders),
+            "quantity": rng.integers(1, 4, n_orders),
+        }
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--orders", type=int, default=60000)
+    parser.add_argument("--nichos", type=int, default=12)
+    parser.add_argument("--workers", type=int, nargs="+")
+    args = parser.parse_args()
+
+    from app.services.ml_service import train_partitioned_models
+
+    cpus = os.cpu_count() or 1
+    workers_list = args.workers or sorted({1, 2, max(1, cpus // 2), cpus})
+    df = make_orders(args.orders, args.nichos)
+    baseline = None
+    for workers in workers_list:
+        with tempfile.TemporaryDirectory() as tmp:
+            start = time.perf_counter()
+            index = train_partitioned_models(
+                df, partition="nicho", max_workers=workers, min_samples=1, model_dir=tmp
+            )
+            elapsed = time.perf_counter() - start
+        baseline = baseline or elapsed
+        print(
+            json.dumps(
+                {
+                    "workers": workers,
+                    "modelos": len(index["modelos"]) if index else 0,
+                    "tempo_s": round(elapsed, 2),
+                    "speedup": round(baseline / elapsed, 2),
+                }
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Benchmark SKU/niche catalog imports: whole-file pandas load vs streaming importer.
+
+Writes a synthetic catalog as XLSX and CSV, then imports it into a fresh
+SQLite database either the old way (``pd.read_excel`` / ``pd.read_csv`` of
+the whole file, then ``insert_many``) or with ``SkuNichoImporter``,
+reporting wall time and peak traced memory for each.
+
+Usage:
+    python -m benchmarks.bench_sku_import [--rows 100000] [--chunk-size 5000]
+"""
+
+import argparse
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+
+import pandas as pd
+from openpyxl import Workbook
+
+from app.services.database_service import DatabaseService
+from app.services.sku_import_service import SkuNichoImporter
+from app.services.sku_nicho_service import SkuNichoInserter
+
+
+def write_catalog(directory: str, n_rows: int) -> dict:
+    rows = [(f"SKU-{i:07d}", f"Nicho {i % 60}") for i in range(n_rows)]
+    csv_path = os.path.join(directory, "catalogo.csv")
+    pd.DataFrame(rows, columns=["sku", "nicho"]).to_csv(csv_path, index=False)
+    xlsx_path = os.path.join(directory, "catalogo.xlsx")
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append(["sku", "nicho"])
+    for row in rows:
+        sheet.append(row)
+    workbook.save(xlsx_path)
+    return {"csv": csv_path, "xlsx": xlsx_path}
+
+
+def import_catalog(mode: str, path: str, chunk_size: int) -> int:
+    db_fd, db_path = tempfile.mkstemp(suffix=".db")
+    service = DatabaseService(db_path)
+    service.connect()
+    service.create_tables()
+    inserter = SkuNichoInserter(service.database)
+    try:
+        with open(path, "rb") as fileobj:
+            if mode == "pandas":
+                if path.endswith(".xlsx"):
+                    df = pd.read_excel(fileobj)
+                else:
+                    df = pd.read_csv(fileobj, dtype=str)
+                inserter.insert_many(df.to_dict(orient="records"))
+                return len(df)
+            importer = SkuNichoImporter(inserter, chunk_size=chunk_size)
+            return importer.import_file(fileobj, path).processadas
+    finally:
+        service.close()
+        os.close(db_fd)
+        os.unlink(db_path)
+
+
+def run_mode(mode: str, path: str, chunk_size: int) -> dict:
+    start = time.perf_counter()
+    written = import_catalog(mode, path, chunk_size)
+    elapsed = time.perf_counter() - start
+    # Memory is traced on a second run: tracemalloc slows openpyxl down several times
+    tracemalloc.start()
+    import_catalog(mode, path, chunk_size)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "modo": mode,
+        "arquivo": os.path.splitext(path)[1].lstrip("."),
+        "linhas": written,
+        "tempo_s": round(elapsed, 3),
+        "pico_memoria_mb": round(peak / 1024 / 1024, 1),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--chunk-size", type=int, default=5000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        paths = write_catalog(directory, args.rows)
+        for kind in ("xlsx", "csv"):
+            for mode in ("pandas", "streaming"):
+                print(json.dumps(run_mode(mode, paths[kind], args.chunk_size)))
+
+
+if __name__ == "__main__":
+    main()
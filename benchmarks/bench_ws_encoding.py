@@ -0,0 +1,111 @@
+"""
+Benchmark WebSocket encodings of a realistic daily report: size and encode time.
+
+Builds today's report with ReportService from synthetic orders (with niches)
+on a temporary database, then encodes it as JSON, columnar JSON and
+MessagePack (when installed), each plain, gzipped once per broadcast, and
+deflated the way permessage-deflate would (once per client).
+
+Usage:
+    python -m benchmarks.bench_ws_encoding [--orders 5000] [--niches 40] [--rounds 20]
+"""
+
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+import zlib
+from datetime import datetime
+
+from app.core.connection_manager import (
+    COMPRESSION_GZIP,
+    EncodedMessage,
+    supported_formats,
+)
+from app.services.data_parser_service import DataParser
+from app.services.database_service import DatabaseService
+from app.services.order_service import OrderInserter
+from app.services.report_service import ReportService
+from app.services.sku_nicho_service import SkuNichoInserter
+from benchmarks.fixtures import make_sells_payload
+
+
+def build_report(database, n_orders: int, n_niches: int) -> dict:
+    hoje = datetime.today().strftime("%Y-%m-%d")
+    columns = DataParser(make_sells_payload(n_orders, day=hoje)).parse_orders_columnar()
+    OrderInserter(database).insert_changed_columns(columns)
+    rng = random.Random(1)
+    SkuNichoInserter(database).insert_many(
+        [
+            {"sku": sku, "nicho": f"Nicho {rng.randint(1, n_niches)}"}
+            for sku in sorted(set(columns.columns["sku"]))
+        ]
+    )
+    return ReportService(database).get_daily_report_data()
+
+
+def deflate(data: bytes) -> bytes:
+    """Raw deflate, as permessage-deflate compresses each message."""
+    compressor = zlib.compressobj(wbits=-zlib.MAX_WBITS)
+    return compressor.compress(data) + compressor.flush(zlib.Z_SYNC_FLUSH)
+
+
+def measure(message: dict, formato: str, compression, rounds: int) -> dict:
+    start = time.perf_counter()
+    for _ in range(rounds):
+        frame = EncodedMessage.encode(message).frame(formato, compression)
+    encode_ms = (time.perf_counter() - start) / rounds * 1000
+    size = len(frame.encode("utf-8") if isinstance(frame, str) else frame)
+    return {
+        "formato": formato,
+        "compressao": compression or "nenhuma",
+        "bytes": size,
+        "codificacao_ms": round(encode_ms, 3),
+    }
+
+
+def measure_deflate(message: dict, formato: str, rounds: int) -> dict:
+    frame = EncodedMessage.encode(message).frame(formato)
+    data = frame.encode("utf-8") if isinstance(frame, str) else frame
+    start = time.perf_counter()
+    for _ in range(rounds):
+        compressed = deflate(data)
+    return {
+        "formato": formato,
+        "compressao": "permessage-deflate",
+        "bytes": len(compressed),
+        "codificacao_ms_por_cliente": round(
+            (time.perf_counter() - start) / rounds * 1000, 3
+        ),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--orders", type=int, default=5000)
+    parser.add_argument("--niches", type=int, default=40)
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    db_fd, db_path = tempfile.mkstemp(suffix=".db")
+    database_service = DatabaseService(db_path)
+    database_service.connect()
+    database_service.create_tables()
+    try:
+        report = build_report(database_service.database, args.orders, args.niches)
+    finally:
+        database_service.close()
+        os.close(db_fd)
+        os.unlink(db_path)
+
+    message = {"tipo": "relatorio_diario", "dados": report}
+    for formato in supported_formats():
+        for compression in (None, COMPRESSION_GZIP):
+            print(json.dumps(measure(message, formato, compression, args.rounds)))
+        print(json.dumps(measure_deflate(message, formato, args.rounds)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""
+Synthetic ``sells`` payloads shaped like the external API's responses.
+"""
+
+import random
+from datetime import datetime, timedelta
+from typing import Any, Dict, List
+
+STATUSES = ("paid", "paid", "paid", "shipped", "cancelled")
+
+
+def make_order(order_id: str, rng: random.Random, day: datetime) -> Dict[str, Any]:
+    quantity = rng.randint(1, 4)
+    total_value = round(rng.uniform(10, 500) * quantity, 2)
+    cost = round(total_value * rng.uniform(0.3, 0.7), 2)
+    payment_date = day + timedelta(seconds=rng.randint(0, 86399))
+    return {
+        "order": order_id,
+        "ad": f"MLB{rng.randint(1000000, 9999999)}",
+        "sku": f"SKU{rng.randint(1, 2000):05d}",
+        "profit": round(total_value - cost, 2),
+        "title": f"Produto {rng.randint(1, 2000)}",
+        "quantity": quantity,
+        "total_value": total_value,
+        "payment_date": payment_date.strftime("%Y-%m-%d %H:%M:%S"),
+        "status": rng.choice(STATUSES),
+        "cost": cost,
+        "gross_profit": round(total_value - cost, 2),
+        "taxes": round(total_value * 0.1, 2),
+        "freight": round(rng.uniform(0, 30), 2),
+        "committee": round(total_value * 0.12, 2),
+        "fraction": 1,
+        "profitability": round(rng.uniform(0, 0.5), 4),
+        "rentability": round(rng.uniform(0, 0.8), 4),
+        "store": rng.randint(1, 3),
+    }
+
+
+def make_sells_payload(
+    n_orders: int, day: str = "2024-01-01", seed: int = 42, max_cart_size: int = 3
+) -> Dict[str, List[Dict[str, Any]]]:
+    """A {cart_id: [order, ...]} payload with ``n_orders`` orders paid on ``day``."""
+    rng = random.Random(seed)
+    start = datetime.strptime(day, "%Y-%m-%d")
+    payload: Dict[str, List[Dict[str, Any]]] = {}
+    created = 0
+    while created < n_orders:
+        size = min(rng.randint(1, max_cart_size), n_orders - created)
+        payload[f"CART{len(payload):07d}"] = [
+            make_order(f"ORD{created + i:08d}", rng, start) for i in range(size)
+        ]
+        created += size
+    return payload
@@ -0,0 +1,230 @@
+"""
+Local stand-in for the external ``sells?r=`` API, for offline ingestion runs.
+
+Serves recorded payloads (``<fixtures>/<YYYY-MM-DD>.json``) when present and
+synthetic ones (benchmarks.fixtures) otherwise, with configurable size,
+latency, error rate and pagination. Point the application at it with
+``API_BASE_URL=http://127.0.0.1:8765``.
+
+Usage:
+    python -m benchmarks.replay_server [--port 8765] [--orders 5000]
+        [--latency-ms 50] [--error-rate 0.05] [--page-size 1000]
+        [--fixtures benchmarks/recorded]
+
+    # Record real payloads once, to replay them later
+    python -m benchmarks.replay_server --record 2024-01-01 2024-01-07 --fixtures benchmarks/recorded
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+from app.config.constants import API_SELLS_ENDPOINT
+from benchmarks.fixtures import make_sells_payload
+
+
+@dataclass
+class ReplayConfig:
+    orders_per_day: int = 1000
+    latency_ms: float = 0.0
+    error_rate: float = 0.0
+    page_size: int = 0  # orders per page, 0 = no pagination
+    chunk_size: int = 64 * 1024
+    fixtures_dir: Optional[Path] = None
+    seed: int = 42
+
+
+@dataclass
+class ReplayStats:
+    requests: int = 0
+    errors: int = 0
+    bytes_sent: int = 0
+    days: List[str] = field(default_factory=list)
+
+
+def _days(range_param: str) -> List[str]:
+    if "/" not in range_param:
+        return [range_param]
+    start, end = (datetime.strptime(d, "%Y-%m-%d") for d in range_param.split("/"))
+    return [
+        (start + timedelta(days=i)).strftime("%Y-%m-%d")
+        for i in range((end - start).days + 1)
+    ]
+
+
+def _paginate(payload: Dict[str, List[dict]], page_size: int) -> List[Dict[str, Any]]:
+    """Split a {cart: [orders]} payload into pages of about ``page_size`` orders."""
+    if page_size <= 0:
+        return [payload]
+    pages: List[Dict[str, Any]] = [{}]
+    count = 0
+    for cart_id, orders in payload.items():
+        if count >= page_size:
+            pages.append({})
+            count = 0
+        pages[-1][cart_id] = orders
+        count += len(orders)
+    return pages
+
+
+class ReplayServer:
+    """Threaded HTTP server answering ``GET /sells?r=<day>[/<day>][&page=N]``."""
+
+    def __init__(self, config: ReplayConfig, host: str = "127.0.0.1", port: int = 0):
+        self.config = config
+        self.stats = ReplayStats()
+        self._rng = random.Random(config.seed)
+        self._lock = threading.Lock()
+        self._cache: Dict[str, List[bytes]] = {}
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def payload_for(self, day: str) -> Dict[str, List[dict]]:
+        fixtures_dir = self.config.fixtures_dir
+        if fixtures_dir is not None and (fixtures_dir / f"{day}.json").exists():
+            return json.loads((fixtures_dir / f"{day}.json").read_text())
+        seed = self.config.seed + int(day.replace("-", ""))
+        return make_sells_payload(self.config.orders_per_day, day=day, seed=seed)
+
+    def pages_for(self, range_param: str) -> List[bytes]:
+        with self._lock:
+            if range_param not in self._cache:
+                payload: Dict[str, List[dict]] = {}
+                for day in _days(range_param):
+                    payload.update(self.payload_for(day))
+                self._cache[range_param] = [
+                    json.dumps(page).encode()
+                    for page in _paginate(payload, self.config.page_size)
+                ]
+            return self._cache[range_param]
+
+    def _should_fail(self) -> bool:
+        with self._lock:
+            return self._rng.random() < self.config.error_rate
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urlparse(self.path)
+                query = parse_qs(url.query)
+                server.stats.requests += 1
+                if url.path != API_SELLS_ENDPOINT or "r" not in query:
+                    self.send_error(404)
+                    return
+                if server.config.latency_ms:
+                    time.sleep(server.config.latency_ms / 1000)
+                if server._should_fail():
+                    server.stats.errors += 1
+                    self.send_error(503)
+                    return
+                range_param = query["r"][0]
+                page = int(query.get("page", ["0"])[0])
+                pages = server.pages_for(range_param)
+                if page >= len(pages):
+                    self.send_error(404)
+                    return
+                server.stats.days.append(range_param)
+                body = pages[page]
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                if page + 1 < len(pages):
+                    self.send_header(
+                        "X-Next-Page",
+                        f"{API_SELLS_ENDPOINT}?r={range_param}&page={page + 1}",
+                    )
+                self.end_headers()
+                chunk_size = server.config.chunk_size
+                for i in range(0, len(body), chunk_size):
+                    self.wfile.write(body[i : i + chunk_size])
+                server.stats.bytes_sent += len(body)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def start(self) -> "ReplayServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "ReplayServer":
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+
+async def record(days: List[str], fixtures_dir: Path) -> None:
+    """Save the real API's payload for each day under ``fixtures_dir``."""
+    from app.config.settings import settings
+    from app.services.data_service import AsyncDataClient
+
+    fixtures_dir.mkdir(parents=True, exist_ok=True)
+    client = AsyncDataClient(settings.api_session_token, base_url=settings.api_base_url)
+    try:
+        for day in days:
+            payload = await client.get_sells(day)
+            (fixtures_dir / f"{day}.json").write_text(json.dumps(payload))
+            print(f"{day}: {sum(len(v) for v in payload.values())} pedidos gravados")
+    finally:
+        await client.aclose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--orders", type=int, default=1000, help="orders per day")
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--page-size", type=int, default=0)
+    parser.add_argument("--fixtures", type=Path, default=None)
+    parser.add_argument("--record", nargs=2, metavar=("DATA_INICIO", "DATA_FIM"))
+    args = parser.parse_args()
+
+    if args.record:
+        if args.fixtures is None:
+            parser.error("--record exige --fixtures")
+        asyncio.run(record(_days("/".join(args.record)), args.fixtures))
+        return
+
+    config = ReplayConfig(
+        orders_per_day=args.orders,
+        latency_ms=args.latency_ms,
+        error_rate=args.error_rate,
+        page_size=args.page_size,
+        fixtures_dir=args.fixtures,
+    )
+    server = ReplayServer(config, args.host, args.port)
+    print(f"Servidor de replay em {server.base_url}{API_SELLS_ENDPOINT}?r=YYYY-MM-DD")
+    server.start()
+    try:
+        server._thread.join()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
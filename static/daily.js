@@ -4,7 +4,65 @@ document.addEventListener('DOMContentLoaded', function() {
     document.body.className = theme;
 
     // Assume the app runs on localhost:8000, adjust if needed
-    const ws = new WebSocket('ws://localhost:8000/ws/relatorio_diario');
+    // Ask for gzipped frames when the browser can decompress them
+    const supportsGzip = 'DecompressionStream' in window;
+    // Forward ?nichos=A,B&loja=X from the page URL to receive only that slice of the report
+    const pageParams = new URLSearchParams(window.location.search);
+    const wsParams = new URLSearchParams();
+    if (supportsGzip) wsParams.set('compressao', 'gzip');
+    // Compact encodings; the server answers with the one it picked
+    wsParams.set('formato', 'MessagePack' in window ? 'msgpack,colunar' : 'colunar');
+    ['nichos', 'loja'].forEach(function(name) {
+        if (pageParams.get(name)) wsParams.set(name, pageParams.get(name));
+    });
+    const query = wsParams.toString();
+    const ws = new WebSocket('ws://localhost:8000/ws/relatorio_diario' + (query ? '?' + query : ''));
+    ws.binaryType = 'arraybuffer';
+
+    // Negotiated on connect by the {"tipo": "formato"} message
+    let formato = 'json';
+    let compressao = null;
+
+    // {"$colunas": [...], "$linhas": [[...]]} back to a list of records
+    function expandColumnar(value) {
+        if (Array.isArray(value)) {
+            return value.map(expandColumnar);
+        }
+        if (value && typeof value === 'object') {
+            if (Array.isArray(value.$colunas) && Array.isArray(value.$linhas)) {
+                return value.$linhas.map(function(linha) {
+                    const record = {};
+                    value.$colunas.forEach(function(coluna, i) {
+                        record[coluna] = expandColumnar(linha[i]);
+                    });
+                    return record;
+                });
+            }
+            const result = {};
+            Object.keys(value).forEach(function(key) {
+                result[key] = expandColumnar(value[key]);
+            });
+            return result;
+        }
+        return value;
+    }
+
+    async function decodeMessage(payload) {
+        if (typeof payload === 'string') {
+            const data = JSON.parse(payload);
+            return formato === 'json' ? data : expandColumnar(data);
+        }
+        let bytes = payload;
+        if (compressao === 'gzip') {
+            const stream = new Blob([payload]).stream().pipeThrough(new DecompressionStream('gzip'));
+            bytes = await new Response(stream).arrayBuffer();
+        }
+        if (formato === 'msgpack') {
+            return expandColumnar(MessagePack.decode(new Uint8Array(bytes)));
+        }
+        const data = JSON.parse(new TextDecoder().decode(bytes));
+        return formato === 'json' ? data : expandColumnar(data);
+    }
 
     // Store previous rankings for change detection, persist in localStorage
     let previousTopNichos = JSON.parse(localStorage.getItem('previousTopNichos')) || [];
@@ -14,17 +72,31 @@ document.addEventListener('DOMContentLoaded', function() {
         document.getElementById('kpis-display').innerHTML = '<p>Conectado ao servidor. Aguardando relatório...</p>';
     };
 
+    // Decompression is async; chain messages so they are displayed in arrival order
+    // Last full report; order events update its KPIs until the next one arrives
+    let currentReport = null;
+
+    let pendingMessages = Promise.resolve();
     ws.onmessage = function(event) {
-        console.log('WS message received:', event.data);
-        try {
-            const data = JSON.parse(event.data);
-            if (data.tipo === 'relatorio_diario_inicial' || data.tipo === 'relatorio_diario') {
-                displayReport(data.dados);
+        pendingMessages = pendingMessages.then(async function() {
+            try {
+                const data = await decodeMessage(event.data);
+                if (data.tipo === 'formato') {
+                    formato = data.formato;
+                    compressao = data.compressao;
+                } else if (data.tipo === 'relatorio_diario_inicial' || data.tipo === 'relatorio_diario') {
+                    currentReport = data.dados;
+                    displayReport(data.dados);
+                } else if (data.tipo === 'pedidos') {
+                    applyOrderEvents(data.eventos);
+                } else if (data.tipo === 'erro_inscricao') {
+                    console.warn('Inscrição inválida:', data.erro);
+                }
+            } catch (error) {
+                console.error('Erro ao processar mensagem:', error);
+                document.getElementById('kpis-display').innerHTML = '<p>Erro ao processar dados do relatório.</p>';
             }
-        } catch (error) {
-            console.error('Erro ao processar mensagem:', error);
-            document.getElementById('kpis-display').innerHTML = '<p>Erro ao processar dados do relatório.</p>';
-        }
+        });
     };
 
     ws.onclose = function(event) {
@@ -252,6 +324,28 @@ document.addEventListener('DOMContentLoaded', function() {
         tbodySkus.innerHTML = '<tr><td colspan="4">Sem dados.</td></tr>';
     }
 
+    // New orders from today count towards the KPIs right away; changed orders
+    // only refresh the last sale and wait for the next report to be re-counted
+    function applyOrderEvents(eventos) {
+        if (!currentReport || currentReport.status !== 'sucesso' || !eventos.length) return;
+        const kpis = currentReport.kpis_diarios;
+        let ultima = currentReport.ultima_venda;
+        eventos.forEach(function(evento) {
+            const pedido = evento.pedido;
+            if (!pedido.payment_date || !pedido.payment_date.startsWith(currentReport.dia)) return;
+            if (kpis && evento.evento === 'novo') {
+                kpis.lucro_liquido += pedido.profit || 0;
+                kpis.faturamento += pedido.total_value || 0;
+                kpis.total_pedidos += 1;
+                kpis.total_unidades += pedido.quantity || 0;
+            }
+            if (!ultima || pedido.payment_date >= ultima.payment_date) ultima = pedido;
+        });
+        currentReport.ultima_venda = ultima;
+        if (kpis) renderKPIs(kpis);
+        renderUltimaVenda(ultima);
+    }
+
     function displayReport(report) {
         console.log('Display report called', report);
         if (report.status === 'sucesso') {
@@ -52,12 +52,31 @@ document.addEventListener('DOMContentLoaded', function() {
 
     // Chart instances stored on window
 
-    async function loadAndRenderReport(dataInicio, dataFim) {
-        const response = await fetch(`/relatorio_flex?data_inicio=${dataInicio}&data_fim=${dataFim}`);
+    // Last report per range with its ETag; the server answers 304 while
+    // no order of the range changed and the copy here is reused
+    const reportsByRange = new Map();
+
+    async function fetchReport(dataInicio, dataFim) {
+        const url = `/relatorio_flex?data_inicio=${dataInicio}&data_fim=${dataFim}`;
+        const cached = reportsByRange.get(url);
+        const headers = cached ? { 'If-None-Match': cached.etag } : {};
+        const response = await fetch(url, { headers, cache: 'no-store' });
+        if (response.status === 304 && cached) {
+            return cached.data;
+        }
         if (!response.ok) {
             throw new Error('Erro ao buscar relatório');
         }
-        reportData = await response.json();
+        const data = await response.json();
+        const etag = response.headers.get('ETag');
+        if (etag) {
+            reportsByRange.set(url, { etag, data });
+        }
+        return data;
+    }
+
+    async function loadAndRenderReport(dataInicio, dataFim) {
+        reportData = await fetchReport(dataInicio, dataFim);
 
         renderKPIs(reportData.kpis_gerais);
         renderForecastTable(reportData.forecast.dados);
@@ -30,12 +30,87 @@ document.addEventListener('DOMContentLoaded', function() {
         }
     }
 
+    // SKU table, paged and searched on the server
+    const skuState = { pagina: 1, paginas: 1, ordenar: 'sku', ordem: 'asc' };
+
+    async function loadSkus() {
+        const params = new URLSearchParams({
+            pagina: skuState.pagina,
+            por_pagina: 50,
+            ordenar: skuState.ordenar,
+            ordem: skuState.ordem,
+            modo: document.getElementById('sku-modo').value
+        });
+        const busca = document.getElementById('sku-busca').value.trim();
+        const nicho = document.getElementById('sku-filtro-nicho').value.trim();
+        if (busca) params.set('busca', busca);
+        if (nicho) params.set('nicho', nicho);
+        try {
+            const response = await fetch('/sku_nicho/listar?' + params.toString());
+            const result = await response.json();
+            const tbody = document.getElementById('sku-tbody');
+            tbody.innerHTML = '';
+            result.dados.forEach(function(row) {
+                const tr = document.createElement('tr');
+                [row.sku, row.nicho, row.created_at || ''].forEach(function(value) {
+                    const td = document.createElement('td');
+                    td.textContent = value;
+                    tr.appendChild(td);
+                });
+                tbody.appendChild(tr);
+            });
+            if (!result.dados.length) {
+                tbody.innerHTML = '<tr><td colspan="3">Nenhum SKU encontrado.</td></tr>';
+            }
+            skuState.paginas = Math.max(result.paginas, 1);
+            document.getElementById('sku-paginacao').textContent =
+                'Página ' + result.pagina + ' de ' + skuState.paginas + ' (' + result.total + ' SKUs)';
+        } catch (error) {
+            console.error('Erro ao listar SKUs:', error);
+        }
+    }
+
+    // Debounced, so typing does not send one request per key
+    let searchTimer = null;
+    function searchSkus() {
+        clearTimeout(searchTimer);
+        searchTimer = setTimeout(function() {
+            skuState.pagina = 1;
+            loadSkus();
+        }, 300);
+    }
+    document.getElementById('sku-busca').oninput = searchSkus;
+    document.getElementById('sku-filtro-nicho').oninput = searchSkus;
+    document.getElementById('sku-modo').onchange = searchSkus;
+    document.getElementById('sku-anterior').onclick = function() {
+        if (skuState.pagina > 1) {
+            skuState.pagina -= 1;
+            loadSkus();
+        }
+    };
+    document.getElementById('sku-proxima').onclick = function() {
+        if (skuState.pagina < skuState.paginas) {
+            skuState.pagina += 1;
+            loadSkus();
+        }
+    };
+    document.querySelectorAll('th[data-ordenar]').forEach(function(th) {
+        th.onclick = function() {
+            const coluna = th.getAttribute('data-ordenar');
+            skuState.ordem = skuState.ordenar === coluna && skuState.ordem === 'asc' ? 'desc' : 'asc';
+            skuState.ordenar = coluna;
+            skuState.pagina = 1;
+            loadSkus();
+        };
+    });
+    loadSkus();
+
     // Send XLSX
     document.getElementById('send-xlsx-btn').onclick = async function() {
         const fileInput = document.getElementById('xlsx-file');
         const file = fileInput.files[0];
         if (!file) {
-            alert('Selecione um arquivo XLSX.');
+            alert('Selecione um arquivo XLSX ou CSV.');
             return;
         }
         const formData = new FormData();
@@ -47,8 +122,13 @@ document.addEventListener('DOMContentLoaded', function() {
             });
             const result = await response.json();
             if (response.ok) {
-                alert(result.mensagem);
+                // Show the first rejected rows; the rest are counted in the message
+                const erros = (result.erros || []).slice(0, 10).map(function(e) {
+                    return 'Linha ' + e.linha + ': ' + e.erro + (e.sku ? ' (' + e.sku + ')' : '');
+                });
+                alert(result.mensagem + (erros.length ? '\n\n' + erros.join('\n') : ''));
                 modal.style.display = 'none';
+                loadSkus();
             } else {
                 alert('Erro: ' + result.erro);
             }
@@ -77,6 +157,7 @@ document.addEventListener('DOMContentLoaded', function() {
             if (response.ok) {
                 alert(result.mensagem);
                 modal.style.display = 'none';
+                loadSkus();
             } else {
                 alert('Erro: ' + result.erro);
             }
@@ -25,6 +25,16 @@ def test_list_orders_by_period():
     assert "pedidos" in data
 
 
+def test_list_orders_by_period_not_modified():
+    """Test GET /orders/periodo answers a matching If-None-Match with 304"""
+    url = "/orders/periodo?data_inicio=2024-01-01&data_fim=2024-01-31"
+    etag = client.get(url).headers["etag"]
+    response = client.get(url, headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["etag"] == etag and response.content == b""
+    assert client.get(url, headers={"If-None-Match": 'W/"old"'}).status_code == 200
+
+
 def test_list_orders_by_period_invalid_date():
     """Test GET /orders/periodo with invalid date format"""
     response = client.get("/orders/periodo?data_inicio=invalid&data_fim=2024-01-31")
@@ -32,12 +42,29 @@ def test_list_orders_by_period_invalid_date():
     assert "erro" in response.json()
 
 
+def test_search_orders():
+    """Test GET /orders/busca endpoint"""
+    response = client.get("/orders/busca?q=tapete&data_inicio=2024-01-01&por_pagina=10")
+    assert response.status_code == 200
+    data = response.json()
+    assert data["busca"] == "tapete" and data["pagina"] == 1
+    assert len(data["pedidos"]) <= 10 and data["total_pedidos"] >= len(data["pedidos"])
+    assert client.get("/orders/busca").status_code == 422
+    assert client.get("/orders/busca?q=x&data_fim=31/01/2024").status_code == 400
+
+
 def test_list_sku_nicho():
     """Test GET /sku_nicho/listar endpoint"""
     response = client.get("/sku_nicho/listar")
     assert response.status_code == 200
     data = response.json()
     assert "dados" in data
+    assert data["pagina"] == 1
+    assert len(data["dados"]) <= data["por_pagina"] and data["total"] >= len(
+        data["dados"]
+    )
+    response = client.get("/sku_nicho/listar?ordenar=preco")
+    assert response.status_code == 422
 
 
 def test_insert_sku_nicho():
@@ -71,6 +98,28 @@ def test_delete_sku_nicho():
     assert response.status_code == 200
 
 
+def test_import_sku_nicho_rejects_unknown_format():
+    """Test POST /sku_nicho/inserir_xlsx with an unsupported file type"""
+    response = client.post(
+        "/sku_nicho/inserir_xlsx",
+        files={"file": ("skus.pdf", b"%PDF", "application/pdf")},
+    )
+    assert response.status_code == 400
+    assert "erro" in response.json()
+
+
+def test_niche_rules_dry_run():
+    """Test niche rule validation and the dry-run endpoint"""
+    response = client.post(
+        "/sku_nicho/regras/inserir",
+        params={"tipo": "outro", "padrao": "A", "nicho": "B"},
+    )
+    assert response.status_code == 400
+    response = client.post("/sku_nicho/regras/simular")
+    assert response.status_code == 200
+    assert response.json()["simulacao"] is True
+
+
 def test_relatorio_flex():
     """Test GET /relatorio_flex endpoint"""
     response = client.get("/relatorio_flex")
@@ -83,6 +132,18 @@ def test_relatorio_flex_with_dates():
     assert response.status_code in [200, 400]  # 400 if no data in period
 
 
+def test_relatorio_diario_compressed():
+    """Test GET /relatorio_diario serves the snapshot with validators"""
+    response = client.get("/relatorio_diario", headers={"Accept-Encoding": "gzip"})
+    assert response.status_code in [200, 503]  # 503 if no report could be built
+    if response.status_code == 200:
+        etag = response.headers["etag"]
+        response = client.get("/relatorio_diario", headers={"If-None-Match": etag})
+        assert response.status_code == 304
+    status = client.get("/status/compressao").json()
+    assert "gzip" in status["codificacoes"]
+
+
 def test_atualizar_pedidos():
     """Test POST /atualizar_pedidos endpoint"""
     # This will try to call the external API, might fail in test environment
@@ -91,6 +152,35 @@ def test_atualizar_pedidos():
     assert response.status_code in [200, 500]
 
 
+def test_backfill_pedidos_invalid_range():
+    """Test POST /backfill_pedidos rejects an inverted date range"""
+    response = client.post(
+        "/backfill_pedidos?data_inicio=2024-02-01&data_fim=2024-01-01"
+    )
+    assert response.status_code == 400
+    assert "erro" in response.json()
+
+
+def test_backfill_pedidos_status():
+    """Test GET /backfill_pedidos/status endpoint"""
+    response = client.get(
+        "/backfill_pedidos/status?data_inicio=2024-01-01&data_fim=2024-01-31"
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert data["em_andamento"] is False
+    assert "checkpoints" in data
+
+
+def test_status_ingestao():
+    """Test GET /status/ingestao endpoint"""
+    response = client.get("/status/ingestao")
+    assert response.status_code == 200
+    data = response.json()
+    assert "estagios" in data
+    assert "ultimo_ciclo" in data
+
+
 def test_websocket_endpoint():
     """Test WebSocket /ws/relatorio_diario endpoint"""
     # WebSocket testing requires special handling
@@ -0,0 +1,157 @@
+import asyncio
+import json
+import os
+import tempfile
+import threading
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+from app.repositories.database_repository import DatabaseWriter
+from app.services.backfill_service import BackfillService, RateLimiter
+from app.services.data_service import AsyncDataClient, current_api_day
+from app.services.database_service import DatabaseService
+from app.services.order_service import OrderInserter
+from app.services.sync_state_service import SyncStateService
+
+
+@pytest.fixture
+def db_service():
+    """Create a database service with a temporary database"""
+    db_fd, db_path = tempfile.mkstemp()
+    service = DatabaseService(db_path)
+    service.connect()
+    service.create_tables()
+    yield service
+    service.close()
+    os.close(db_fd)
+    os.unlink(db_path)
+
+
+@pytest.fixture
+def stub_api():
+    """Local stub of the sells API: two orders per day, configurable failing days"""
+    state = {"requests": [], "failing_days": set()}
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            day = parse_qs(urlparse(self.path).query)["r"][0]
+            state["requests"].append(day)
+            if day in state["failing_days"]:
+                self.send_response(500)
+                self.end_headers()
+                return
+            payload = {
+                f"CART-{day}": [
+                    {
+                        "order": f"{day}-{i}",
+                        "ad": "MLB1",
+                        "sku": f"SKU{i}",
+                        "profit": 10.0,
+                        "title": "Produto",
+                        "quantity": 1,
+                        "total_value": 50.0,
+                        "payment_date": f"{day} 12:00:00",
+                        "status": "paid",
+                        "store": 1,
+                    }
+                    for i in range(2)
+                ]
+            }
+            body = json.dumps(payload).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    state["base_url"] = f"http://127.0.0.1:{server.server_address[1]}"
+    yield state
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def writer(db_service):
+    writer = DatabaseWriter(db_service.db_path)
+    yield writer
+    writer.close()
+
+
+def make_backfill(writer, base_url):
+    client = AsyncDataClient(
+        "token", base_url=base_url, retry_attempts=1, retry_wait_min=0, retry_wait_max=0
+    )
+    return BackfillService(
+        client,
+        OrderInserter(writer.database),
+        SyncStateService(writer.database),
+        writer,
+        concurrency=3,
+        requests_per_second=0,
+    )
+
+
+def test_days_in_range():
+    days = BackfillService.days_in_range("2024-01-30", "2024-02-02")
+    assert days == ["2024-01-30", "2024-01-31", "2024-02-01", "2024-02-02"]
+    with pytest.raises(ValueError):
+        BackfillService.days_in_range("2024-02-02", "2024-01-30")
+
+
+def test_backfill_resumes_from_checkpoints(db_service, writer, stub_api):
+    """Failed days are checkpointed as errors and only they are refetched on rerun"""
+    backfill = make_backfill(writer, stub_api["base_url"])
+    stub_api["failing_days"] = {"2024-01-03"}
+
+    summary = asyncio.run(backfill.run("2024-01-01", "2024-01-05"))
+    assert summary["dias_concluidos"] == 4
+    assert list(summary["dias_com_erro"]) == ["2024-01-03"]
+    assert backfill.sync_state.get("2024-01-03")["status"] == "error"
+    assert backfill.sync_state.get("2024-01-01")["orders_count"] == 2
+
+    stub_api["requests"].clear()
+    stub_api["failing_days"] = set()
+    summary = asyncio.run(backfill.run("2024-01-01", "2024-01-05"))
+    assert stub_api["requests"] == ["2024-01-03"]
+    assert summary["dias_ignorados"] == 4
+    assert backfill.sync_state.summary("2024-01-01", "2024-01-05") == {"done": 5}
+
+    cursor = db_service.database.conn.cursor()
+    cursor.execute("SELECT COUNT(*) FROM orders WHERE order_id LIKE '2024-01-0%'")
+    assert cursor.fetchone()[0] == 10
+
+
+def test_backfill_leaves_current_api_day_open(writer, stub_api):
+    """Only days before the current API day are closed; later runs fetch today again"""
+    backfill = make_backfill(writer, stub_api["base_url"])
+    api_day = current_api_day()
+    today = api_day.strftime("%Y-%m-%d")
+    yesterday = (api_day - timedelta(days=1)).strftime("%Y-%m-%d")
+
+    asyncio.run(backfill.run(yesterday, today))
+    assert backfill.sync_state.get(yesterday)["status"] == "done"
+    assert backfill.sync_state.get(today)["status"] == "open"
+
+    stub_api["requests"].clear()
+    asyncio.run(backfill.run(yesterday, today))
+    assert stub_api["requests"] == [today]
+
+
+def test_rate_limiter_spaces_requests():
+    async def run():
+        limiter = RateLimiter(requests_per_second=50)
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        await asyncio.gather(*(limiter.wait() for _ in range(5)))
+        return loop.time() - start
+
+    assert asyncio.run(run()) >= 4 / 50 * 0.9
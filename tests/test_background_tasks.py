@@ -0,0 +1,394 @@
+import asyncio
+import json
+import os
+import tempfile
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.background_tasks.periodic_report_task import BackgroundTaskService
+from app.repositories.database_repository import DatabaseWriter
+from app.services.database_service import DatabaseService
+from app.services.order_service import OrderInserter
+from app.services.sync_state_service import SyncStateService
+
+
+@pytest.fixture
+def db_service():
+    """Create a database service with a temporary database"""
+    db_fd, db_path = tempfile.mkstemp()
+    service = DatabaseService(db_path)
+    service.connect()
+    service.create_tables()
+    yield service
+    service.close()
+    os.close(db_fd)
+    os.unlink(db_path)
+
+
+class FakeDataClient:
+    """Stands in for AsyncDataClient, serving one order per requested day"""
+
+    def __init__(self):
+        self.requests = []
+        self.profit = 10.0
+
+    async def get_sells(self, data_inicio, data_fim=None):
+        self.requests.append(data_inicio)
+        return {
+            f"CART-{data_inicio}": [
+                {
+                    "order": f"ORD-{data_inicio}",
+                    "ad": "MLB1",
+                    "sku": "SKU1",
+                    "profit": self.profit,
+                    "title": "Produto",
+                    "quantity": 1,
+                    "total_value": 50.0,
+                    "payment_date": f"{data_inicio} 12:00:00",
+                    "status": "paid",
+                    "store": 1,
+                }
+            ]
+        }
+
+    async def stream_sells(self, data_inicio, data_fim=None):
+        body = json.dumps(await self.get_sells(data_inicio, data_fim)).encode()
+        for i in range(0, len(body), 64):
+            yield body[i : i + 64]
+
+
+@pytest.fixture
+def writer(db_service):
+    writer = DatabaseWriter(db_service.db_path)
+    writer.connect()
+    yield writer
+    writer.close()
+
+
+@pytest.fixture
+def task_service(writer):
+    return BackgroundTaskService(
+        app=None,
+        manager=None,
+        report_service=None,
+        data_client=FakeDataClient(),
+        order_inserter=OrderInserter(writer.database),
+        sync_state=SyncStateService(writer.database),
+        writer=writer,
+    )
+
+
+def test_ingest_closes_previous_day_once(task_service):
+    """The previous API day is fetched once more and closed; later cycles skip it"""
+    api_day = task_service._current_api_day()
+    today = api_day.strftime("%Y-%m-%d")
+    yesterday = (api_day - timedelta(days=1)).strftime("%Y-%m-%d")
+
+    changes = asyncio.run(task_service.run_cycle(report=False))
+    assert task_service.data_client.requests == [yesterday, today]
+    assert len(changes) == 2
+    assert task_service.sync_state.get(yesterday)["status"] == "done"
+    assert task_service.sync_state.get(today)["status"] == "open"
+
+    task_service.data_client.requests.clear()
+    changes = asyncio.run(task_service.run_cycle(report=False))
+    assert task_service.data_client.requests == [today]
+    assert len(changes) == 0
+    assert task_service.sync_state.get(today)["changed_count"] == 0
+
+    task_service.data_client.profit = 12.0
+    changes = asyncio.run(task_service.run_cycle(report=False))
+    assert changes.order_ids == {f"ORD-{today}"}
+
+
+def test_change_listeners_receive_changeset(task_service):
+    """Listeners get each written batch's rows, not the whole cycle at once"""
+    received = []
+
+    async def async_listener(changes):
+        received.append(("async", len(changes)))
+
+    task_service.add_change_listener(
+        lambda changes: received.append(("sync", changes.records()[0]["order_id"]))
+    )
+    task_service.add_change_listener(async_listener)
+    asyncio.run(task_service.run_cycle(report=False))
+    api_day = task_service._current_api_day()
+    today = api_day.strftime("%Y-%m-%d")
+    yesterday = (api_day - timedelta(days=1)).strftime("%Y-%m-%d")
+    assert sorted(received) == [
+        ("async", 1),
+        ("async", 1),
+        ("sync", f"ORD-{yesterday}"),
+        ("sync", f"ORD-{today}"),
+    ]
+
+
+def test_writes_run_on_the_writer_thread(task_service, db_service):
+    """Order upserts and checkpoints leave the event loop for the writer's connection"""
+    threads = []
+    original = task_service.order_inserter.insert_changed_columns
+
+    def insert_changed_columns(batch):
+        threads.append(threading.current_thread().name)
+        return original(batch)
+
+    task_service.order_inserter.insert_changed_columns = insert_changed_columns
+    asyncio.run(task_service.run_cycle(report=False))
+    assert len(threads) == 2
+    assert all(name.startswith("db-writer") for name in threads)
+    # Committed on the writer's connection, visible on the shared one
+    cursor = db_service.database.conn.cursor()
+    cursor.execute("SELECT COUNT(*) FROM orders")
+    assert cursor.fetchone()[0] == 2
+
+
+def test_niche_rules_listener_runs_on_the_writer(task_service, db_service, writer):
+    """Rules classify each written batch on the writer thread and connection"""
+    from app.services.niche_rules import NicheRuleEngine
+    from app.services.sku_nicho_cache import SkuNichoCache
+    from app.services.sku_nicho_service import SkuNichoInserter
+
+    engine = NicheRuleEngine(
+        db_service.database,
+        SkuNichoInserter(writer.database),
+        SkuNichoCache(db_service.database),
+    )
+    engine.add_rule("prefixo", "SKU", "Casa")
+    threads = []
+    original = engine.classify_changes
+
+    def classify_changes(changes):
+        threads.append(threading.current_thread().name)
+        return original(changes)
+
+    task_service.add_change_listener(
+        lambda changes: writer.run(classify_changes, changes)
+    )
+    shared_changes = db_service.database.conn.total_changes
+    asyncio.run(task_service.run_cycle(report=False))
+    assert threads and all(name.startswith("db-writer") for name in threads)
+    assert db_service.database.conn.total_changes == shared_changes
+    assert SkuNichoInserter(db_service.database).list_all()[0][:2] == ("SKU1", "Casa")
+
+
+class FakeManager:
+    def __init__(self):
+        self.messages = []
+
+    async def broadcast(self, message):
+        self.messages.append(message)
+
+    async def broadcast_report(self, snapshot, tipo):
+        self.messages.append(snapshot.message(tipo))
+
+
+class FakeReportService:
+    def __init__(self):
+        self.calls = 0
+
+    def get_daily_report_data(self):
+        self.calls += 1
+        return {"status": "sucesso", "dia": "hoje", "versao": self.calls}
+
+
+def test_pipeline_cycle_reports_and_broadcasts(task_service):
+    """A cycle flows through every stage; the report is only rebuilt on changes"""
+    task_service.manager = FakeManager()
+    task_service.report_service = FakeReportService()
+
+    async def run():
+        await task_service.run_cycle()
+        task_service.current_daily_report["dia"] = datetime.today().strftime("%Y-%m-%d")
+        await task_service.run_cycle()
+        status = task_service.pipeline_status()
+        await task_service.stop()
+        return status
+
+    status = asyncio.run(run())
+    assert task_service.report_service.calls == 1
+    assert len(task_service.manager.messages) == 1
+    assert status["ciclos_concluidos"] == 2
+    assert status["estagios"]["writer"]["processados"] > 0
+    assert all(stage["fila"] == 0 for stage in status["estagios"].values())
+    assert task_service.pipeline_status()["estagios"] == {}
+
+
+def test_pipeline_records_failed_days(task_service):
+    """A failing fetch is reported in the cycle without blocking the other day"""
+    api_day = task_service._current_api_day()
+    today = api_day.strftime("%Y-%m-%d")
+    yesterday = (api_day - timedelta(days=1)).strftime("%Y-%m-%d")
+    original = task_service.data_client.stream_sells
+
+    async def stream_sells(data_inicio, data_fim=None):
+        if data_inicio == yesterday:
+            raise RuntimeError("API fora do ar")
+        async for chunk in original(data_inicio, data_fim):
+            yield chunk
+
+    task_service.data_client.stream_sells = stream_sells
+    changes = asyncio.run(task_service.run_cycle(report=False))
+    assert changes.order_ids == {f"ORD-{today}"}
+    assert list(task_service.last_cycle["erros"]) == [yesterday]
+    assert not task_service.sync_state.is_closed(yesterday)
+
+
+def test_adaptive_scheduler_speeds_up_and_backs_off():
+    from app.background_tasks.scheduler import AdaptivePollingScheduler
+
+    scheduler = AdaptivePollingScheduler(600, 60, 3600, jitter=0)
+    assert scheduler.record(changed=5) == 300
+    assert scheduler.record(changed=1) == 150
+    assert scheduler.record(changed=1) == 75
+    assert scheduler.record(changed=1) == 60
+    assert scheduler.record(changed=0) == 120
+    assert scheduler.record(changed=0, failed=True) == 240
+    for _ in range(10):
+        scheduler.record(changed=0)
+    assert scheduler.interval == 3600
+    assert scheduler.snapshot()["ciclos_com_erro"] == 1
+
+
+def test_adaptive_scheduler_quiet_hours_and_jitter():
+    import random
+    from app.background_tasks.scheduler import (
+        AdaptivePollingScheduler,
+        parse_quiet_hours,
+    )
+
+    scheduler = AdaptivePollingScheduler(
+        120,
+        60,
+        3600,
+        jitter=0,
+        quiet_hours=parse_quiet_hours("23:00-07:00"),
+    )
+    assert scheduler.next_delay(datetime(2024, 1, 1, 12, 0)) == 120
+    assert scheduler.next_delay(datetime(2024, 1, 1, 23, 30)) == 3600
+    # Never sleeps past the end of the quiet window
+    assert scheduler.next_delay(datetime(2024, 1, 2, 6, 40)) == 1200
+    assert scheduler.next_run_at == datetime(2024, 1, 2, 7, 0)
+
+    jittered = AdaptivePollingScheduler(100, 10, 1000, jitter=0.2, rng=random.Random(1))
+    delays = {jittered.next_delay() for _ in range(20)}
+    assert len(delays) > 1
+    assert all(80 <= delay <= 120 for delay in delays)
+
+    with pytest.raises(ValueError):
+        parse_quiet_hours("23h-7h")
+
+
+def test_report_bus_relays_report_to_other_workers(task_service, db_service):
+    """The worker that computes a report publishes it; the others relay it"""
+    from app.services.report_bus import MemoryHub, MemoryReportBus
+
+    hub = MemoryHub()
+    task_service.manager = FakeManager()
+    task_service.report_service = FakeReportService()
+    task_service.report_bus = MemoryReportBus(hub)
+    follower = BackgroundTaskService(
+        app=None,
+        manager=FakeManager(),
+        report_service=None,
+        data_client=None,
+        order_inserter=None,
+        sync_state=None,
+        writer=None,
+        report_bus=MemoryReportBus(hub),
+    )
+    follower.report_bus.subscribe(follower.relay_report)
+    task_service.report_bus.subscribe(task_service.relay_report)
+
+    async def run():
+        await task_service.run_cycle()
+        await task_service.stop()
+
+    asyncio.run(run())
+    assert len(task_service.manager.messages) == 1
+    assert len(follower.manager.messages) == 1
+    assert follower.current_daily_report == task_service.current_daily_report
+    status = follower.pipeline_status()["barramento"]
+    assert (status["recebidos"], status["repassados"]) == (1, 1)
+    assert task_service.pipeline_status()["barramento"]["recebidos"] == 0
+
+
+def test_leader_election_single_leader_and_failover(db_service, writer):
+    """One worker holds the lease; another takes over once it expires or is released"""
+    from app.background_tasks.leader import LeaderElector
+    from app.services.report_bus import SQLiteReportBus
+
+    now = [1000.0]
+    events = []
+
+    def elector(name):
+        async def demoted():
+            events.append(("demoted", name))
+
+        return LeaderElector(
+            writer.database,
+            lease_seconds=30,
+            heartbeat_seconds=10,
+            on_elected=lambda: events.append(("elected", name)),
+            on_demoted=demoted,
+            identity=name,
+            clock=lambda: now[0],
+            writer=writer,
+        )
+
+    a, b = elector("a"), elector("b")
+    bus = SQLiteReportBus(db_service.database, writer=writer)
+    # Lease and bus writes never commit on the connection other services
+    # hold transactions on
+    shared_changes = db_service.database.conn.total_changes
+
+    async def run():
+        assert await a.heartbeat() is True
+        assert await b.heartbeat() is False
+        now[0] += 20
+        assert await a.heartbeat() is True  # renewed before expiring
+        now[0] += 25
+        assert await b.heartbeat() is False  # a's renewed lease still valid
+        now[0] += 10  # a stalled past its lease
+        assert await b.heartbeat() is True
+        assert await a.heartbeat() is False
+        await b.stop()  # releases the lease
+        assert await a.heartbeat() is True
+        await bus.publish({"versao": 1})
+
+    asyncio.run(run())
+    assert db_service.database.conn.total_changes == shared_changes
+    assert db_service.database.cursor.execute(
+        "SELECT COUNT(*) FROM report_bus"
+    ).fetchone()[0] == 1
+    assert events == [
+        ("elected", "a"),
+        ("elected", "b"),
+        ("demoted", "a"),
+        ("demoted", "b"),
+        ("elected", "a"),
+    ]
+    assert a.status()["lider_atual"] == "a"
+
+
+def test_pipeline_emits_order_events_per_written_batch(task_service, db_service):
+    """Each written order becomes an event before the cycle's report"""
+    from app.services.order_events import OrderEventHub
+    from app.services.sku_nicho_cache import SkuNichoCache
+
+    task_service.order_events = OrderEventHub(
+        None, sku_nichos=SkuNichoCache(db_service.database)
+    )
+    subscriber = task_service.order_events.subscribe()
+    asyncio.run(task_service.run_cycle(report=False))
+    task_service.data_client.profit = 12.0
+    asyncio.run(task_service.run_cycle(report=False))
+
+    events = [subscriber.queue.get_nowait() for _ in range(subscriber.queue.qsize())]
+    today = task_service._current_api_day().strftime("%Y-%m-%d")
+    assert [e["evento"] for e in events] == ["novo", "novo", "alterado"]
+    assert events[-1]["pedido"]["order_id"] == f"ORD-{today}"
+    assert events[-1]["pedido"]["profit"] == 12.0
+    assert task_service.pipeline_status()["eventos_pedidos"]["ultimo_seq"] == 3
@@ -0,0 +1,114 @@
+import gzip
+import json
+from datetime import datetime
+
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from fastapi.testclient import TestClient
+
+from app.core.compression import (
+    ENCODING_GZIP,
+    CompressionMiddleware,
+    ResponseCompressor,
+    supported_encodings,
+)
+from app.services.report_cache import ReportSnapshot
+
+REPORT = {
+    "pedidos_lista": [{"sku": f"SKU{i:05d}", "nicho": "Casa"} for i in range(2000)]
+}
+
+
+def make_client(compressor):
+    app = FastAPI()
+    app.add_middleware(CompressionMiddleware, compressor=compressor)
+
+    @app.get("/grande")
+    def grande():
+        return JSONResponse(REPORT, headers={"ETag": '"v1"'})
+
+    @app.get("/pequena")
+    def pequena():
+        return {"ok": True}
+
+    @app.get("/stream")
+    def stream():
+        return StreamingResponse(
+            iter([b"data: 1\n\n"] * 2000), media_type="text/event-stream"
+        )
+
+    @app.get("/parcial")
+    def parcial():
+        body = json.dumps(REPORT).encode()
+        return Response(
+            body[:4096],
+            status_code=206,
+            media_type="application/json",
+            headers={"Content-Range": f"bytes 0-4095/{len(body)}"},
+        )
+
+    @app.get("/intervalo")
+    def intervalo():
+        return JSONResponse(REPORT, headers={"Content-Range": "bytes */1"})
+
+    @app.get("/nao_modificado")
+    def nao_modificado():
+        return Response(status_code=304, headers={"ETag": '"v1"'})
+
+    return TestClient(app)
+
+
+def test_negotiates_supported_encodings():
+    """Accept-Encoding q-values pick among the encodings this server supports"""
+    compressor = ResponseCompressor()
+    assert compressor.negotiate("gzip, deflate") == ENCODING_GZIP
+    assert compressor.negotiate("*") == supported_encodings()[0]
+    assert compressor.negotiate("gzip;q=0, identity") is None
+    assert compressor.negotiate("deflate") is None
+    assert compressor.negotiate(None) is None
+
+
+def test_middleware_compresses_large_complete_bodies():
+    """Large JSON is gzipped; small, streamed, 304 and ranged responses pass through"""
+    compressor = ResponseCompressor(minimum_size=1024, gzip_level=6)
+    client = make_client(compressor)
+
+    response = client.get("/grande", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert response.headers["etag"] == 'W/"v1"'
+    assert response.json() == REPORT
+    assert int(response.headers["content-length"]) < len(json.dumps(REPORT)) / 4
+
+    plain = client.get("/grande", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in plain.headers and plain.json() == REPORT
+    for path in ("/pequena", "/stream"):
+        response = client.get(path, headers={"Accept-Encoding": "gzip"})
+        assert "content-encoding" not in response.headers
+    response = client.get("/nao_modificado", headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 304 and response.content == b""
+    # Byte ranges are sent as they are
+    response = client.get("/parcial", headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 206 and "content-encoding" not in response.headers
+    assert response.content == json.dumps(REPORT).encode()[:4096]
+    response = client.get("/intervalo", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in response.headers
+
+    gzip_status = compressor.status()["codificacoes"]["gzip"]
+    assert gzip_status["respostas"] == 1
+    assert gzip_status["bytes_economizados"] > 0 and gzip_status["cpu_ms"] >= 0
+
+
+def test_snapshot_compresses_each_variant_once():
+    """The daily report snapshot keeps its compressed body for later requests"""
+    compressor = ResponseCompressor()
+    snapshot = ReportSnapshot(1, REPORT, datetime.now())
+    first = snapshot.body(ENCODING_GZIP, compressor)
+    assert json.loads(gzip.decompress(first)) == REPORT
+    assert snapshot.body(ENCODING_GZIP, compressor) is first
+    gzip_status = compressor.status()["codificacoes"]["gzip"]
+    assert gzip_status["respostas"] == 1 and gzip_status["servidas_do_cache"] == 1
+    assert (
+        snapshot.validator.etag
+        == ReportSnapshot(2, REPORT, datetime.now()).validator.etag
+    )
@@ -0,0 +1,227 @@
+import asyncio
+import gzip
+import json
+
+import pytest
+
+from app.core.connection_manager import ConnectionManager, EncodedMessage
+
+
+class FakeWebSocket:
+    """Records sent messages; ``delay`` makes every send take that long"""
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.sent = []
+        self.closed_with = None
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, text):
+        await asyncio.sleep(self.delay)
+        self.sent.append(json.loads(text))
+
+    async def send_bytes(self, data):
+        await asyncio.sleep(self.delay)
+        self.sent.append(json.loads(gzip.decompress(data)))
+
+    async def close(self, code=1000):
+        self.closed_with = code
+
+
+def test_slow_client_does_not_delay_others():
+    """A client that exceeds the send timeout is evicted; the others still get every message"""
+
+    async def run():
+        manager = ConnectionManager(max_queue_size=4, send_timeout_seconds=0.05)
+        fast, slow = FakeWebSocket(), FakeWebSocket(delay=1.0)
+        await manager.connect(fast)
+        await manager.connect(slow)
+        await manager.broadcast({"tipo": "relatorio_diario", "dados": 1})
+        await asyncio.wait_for(manager.drain(), 0.5)
+        await asyncio.sleep(0)
+        return manager, fast, slow
+
+    manager, fast, slow = asyncio.run(run())
+    assert fast.sent == [{"tipo": "relatorio_diario", "dados": 1}]
+    assert slow.sent == []
+    assert slow.closed_with == 1013
+    assert manager.active_connections == [fast]
+    assert manager.status()["clientes_removidos"] == 1
+
+
+def test_full_queue_coalesces_same_type_and_evicts_otherwise():
+    async def run():
+        manager = ConnectionManager(max_queue_size=2, send_timeout_seconds=5)
+        lagging = FakeWebSocket(delay=0.01)
+        await manager.connect(lagging)
+        for i in range(5):
+            await manager.broadcast({"tipo": "relatorio_diario", "dados": i})
+        await manager.drain()
+        coalesced = list(lagging.sent)
+
+        for i in range(3):
+            await manager.broadcast({"tipo": f"evento_{i}", "dados": i})
+        return manager, coalesced
+
+    manager, coalesced = asyncio.run(run())
+    # Older snapshots are dropped in favour of the latest one
+    assert coalesced[-1] == {"tipo": "relatorio_diario", "dados": 4}
+    assert len(coalesced) < 5
+    assert manager.metrics.coalesced == 5 - len(coalesced)
+    # Distinct message types cannot be coalesced, so the client is dropped
+    assert manager.active_connections == []
+    assert manager.metrics.evictions == 1
+
+
+def test_broadcast_serializes_once_for_all_clients(monkeypatch):
+    """Plain and gzip clients get the same message from a single encoding"""
+    from app.core import connection_manager
+
+    calls = []
+    original = connection_manager.json.dumps
+
+    def counting_dumps(*args, **kwargs):
+        calls.append(1)
+        return original(*args, **kwargs)
+
+    monkeypatch.setattr(connection_manager.json, "dumps", counting_dumps)
+
+    async def run():
+        manager = ConnectionManager()
+        clients = [FakeWebSocket() for _ in range(5)]
+        for i, client in enumerate(clients):
+            await manager.connect(client, "gzip" if i % 2 else None)
+        await manager.broadcast({"tipo": "relatorio_diario", "dados": {"a": "ç"}})
+        await manager.drain()
+        return clients
+
+    clients = asyncio.run(run())
+    assert len(calls) == 1
+    assert all(
+        c.sent == [{"tipo": "relatorio_diario", "dados": {"a": "ç"}}] for c in clients
+    )
+
+
+def test_broadcast_renders_once_per_subscription():
+    """Clients with the same subscription share one rendered message"""
+
+    async def run():
+        manager = ConnectionManager()
+        clients = [FakeWebSocket() for _ in range(4)]
+        for ws in clients:
+            await manager.connect(ws)
+        manager.set_subscription(clients[0], "casa")
+        manager.set_subscription(clients[1], "casa")
+        manager.set_subscription(clients[2], "pet")
+        rendered = []
+
+        def render(subscription):
+            rendered.append(subscription)
+            return EncodedMessage.encode(
+                {"tipo": "relatorio_diario", "dados": subscription}
+            )
+
+        await manager.broadcast_projected(render)
+        await manager.drain()
+        return manager, clients, rendered
+
+    manager, clients, rendered = asyncio.run(run())
+    assert sorted(rendered, key=str) == sorted(["casa", "pet", None], key=str)
+    assert [ws.sent[0]["dados"] for ws in clients] == ["casa", "casa", "pet", None]
+    assert manager.status()["inscricoes_distintas"] == 3
+
+
+def test_negotiated_formats_round_trip():
+    """Columnar and MessagePack frames decode back to the original message"""
+    message = {
+        "tipo": "relatorio_diario",
+        "dados": {
+            "vendas": [{"sku": "A", "lucro": 1.5}, {"sku": "B", "lucro": -2.0}],
+            "misto": [{"a": 1}, {"b": 2}],
+        },
+    }
+
+    def expand(value):
+        if isinstance(value, list):
+            return [expand(item) for item in value]
+        if isinstance(value, dict):
+            if "$colunas" in value:
+                return [
+                    dict(zip(value["$colunas"], map(expand, linha)))
+                    for linha in value["$linhas"]
+                ]
+            return {key: expand(item) for key, item in value.items()}
+        return value
+
+    async def run():
+        manager = ConnectionManager()
+        ws = FakeWebSocket()
+        await manager.connect(ws, formato="xml, colunar")
+        await manager.broadcast(message)
+        await manager.drain()
+        return ws
+
+    ws = asyncio.run(run())
+    assert ws.sent[0] == {"tipo": "formato", "formato": "colunar", "compressao": None}
+    assert ws.sent[1]["dados"]["vendas"] == {
+        "$colunas": ["sku", "lucro"],
+        "$linhas": [["A", 1.5], ["B", -2.0]],
+    }
+    assert expand(ws.sent[1]) == message
+
+    msgpack = pytest.importorskip("msgpack")
+    encoded = EncodedMessage.encode(message)
+    frame = encoded.frame("msgpack", "gzip")
+    assert encoded.frame("msgpack", "gzip") is frame
+    assert expand(msgpack.unpackb(gzip.decompress(frame))) == message
+
+
+def test_order_events_follow_subscriptions_and_sse_replay():
+    """Order events reach matching WebSocket groups; SSE clients resume and overflow"""
+    from app.services.order_events import OrderEventHub
+    from app.services.order_service import ORDER_COLUMNS, ChangeSet
+    from app.services.report_subscription import Subscription
+
+    def changes(*orders):
+        rows = [
+            tuple(
+                {"order_id": order_id, "store": store, "sku": "A"}.get(col)
+                for col in ORDER_COLUMNS
+            )
+            for order_id, store in orders
+        ]
+        return ChangeSet(rows=rows, new_order_ids={orders[0][0]})
+
+    async def run():
+        manager = ConnectionManager()
+        hub = OrderEventHub(manager, subscriber_queue_size=2)
+        clients = [FakeWebSocket() for _ in range(3)]
+        for ws in clients:
+            await manager.connect(ws)
+        manager.set_subscription(clients[1], Subscription.from_message({"loja": "2"}))
+        manager.set_subscription(
+            clients[2], Subscription.from_message({"secoes": "kpis_diarios"})
+        )
+        sse = hub.subscribe(Subscription.from_message({"loja": "1"}))
+        await hub.publish(changes(("P1", 1), ("P2", 1)))
+        await manager.drain()
+        resumed = hub.subscribe(last_event_id=1)
+        await hub.publish(changes(("P3", 1)))
+        await manager.drain()
+        return hub, clients, sse, resumed
+
+    hub, clients, sse, resumed = asyncio.run(run())
+    first = clients[0].sent[0]
+    assert first["tipo"] == "pedidos"
+    assert [(e["seq"], e["evento"]) for e in first["eventos"]] == [
+        (1, "novo"),
+        (2, "alterado"),
+    ]
+    # Store 2 had no events and the KPI-only client did not ask for them
+    assert clients[1].sent == [] and clients[2].sent == []
+    assert [e["seq"] for e in resumed.queue._queue] == [2, 3]
+    # The store-1 SSE client fell behind: its queue held two events
+    assert sse.dropped and sse not in hub.subscribers
+    assert hub.status()["ultimo_seq"] == 3
@@ -14,10 +14,10 @@ def test_full_order_workflow():
     assert response.status_code == 200
 
     # 2. Verify SKU/nicho was inserted
-    response = client.get("/sku_nicho/listar")
+    response = client.get("/sku_nicho/listar", params={"busca": "INTTEST123"})
     assert response.status_code == 200
     data = response.json()
-    sku_found = any(row[0] == "INTTEST123" for row in data["dados"])
+    sku_found = any(row["sku"] == "INTTEST123" for row in data["dados"])
     assert sku_found
 
     # 3. List orders (should work even with empty data)
@@ -52,10 +52,10 @@ def test_sku_nicho_crud_operations():
     assert response.status_code == 200
 
     # Read (verify creation)
-    response = client.get("/sku_nicho/listar")
+    response = client.get("/sku_nicho/listar", params={"busca": test_sku})
     assert response.status_code == 200
     data = response.json()
-    sku_found = any(row[0] == test_sku for row in data["dados"])
+    sku_found = any(row["sku"] == test_sku for row in data["dados"])
     assert sku_found
 
     # Update
@@ -4,7 +4,9 @@ import os
 import tempfile
 from app.services.database_service import DatabaseService
 from app.services.report_service import ReportService
-from app.services.order_service import OrderInserter
+from app.services.order_service import ORDER_COLUMNS, OrderInserter
+from app.services.order_search_service import OrderSearchService
+from app.services.data_version import DataVersionService
 from app.services.sku_nicho_service import SkuNichoInserter
 from app.services.data_service import Data
 from app.services.data_parser_service import DataParser
@@ -91,6 +93,348 @@ def test_sku_nicho_insert_many(sku_nicho_inserter):
     assert len(rows) == 2
 
 
+def test_sku_nicho_import_streams_and_upserts(sku_nicho_inserter):
+    """XLSX and CSV imports upsert in chunks and report rejected rows"""
+    import io
+    from openpyxl import Workbook
+    from app.services.sku_import_service import SkuNichoImporter
+
+    sku_nicho_inserter.insert_one("A1", "Antigo")
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append(["SKU", "Nicho"])
+    for row in [
+        ("A1", "Casa"),
+        (123, "Pet"),
+        (None, "Pet"),
+        ("B2", None),
+        (None, None),
+        ("A1", "Cozinha"),
+    ]:
+        sheet.append(row)
+    xlsx = io.BytesIO()
+    workbook.save(xlsx)
+    xlsx.seek(0)
+
+    importer = SkuNichoImporter(sku_nicho_inserter, chunk_size=4)
+    report = importer.import_file(xlsx, "catalogo.xlsx")
+    assert report.linhas_lidas == 6
+    # A1 is in both chunks: processed twice, but only the last niche is kept
+    assert (report.processadas, report.alteradas) == (3, 3)
+    assert [(e["linha"], e["erro"]) for e in report.erros] == [
+        (4, "SKU vazio"),
+        (5, "Nicho vazio"),
+    ]
+    rows = {sku: nicho for sku, nicho, _ in sku_nicho_inserter.list_all()}
+    assert rows == {"A1": "Cozinha", "123": "Pet"}
+
+    csv = io.BytesIO("sku;nicho\n123;Jardim\nC3;\n".encode("utf-8"))
+    report = SkuNichoImporter(sku_nicho_inserter, max_errors=0).import_file(
+        csv, "catalogo.csv"
+    )
+    assert (report.processadas, report.alteradas, report.erros_omitidos) == (1, 1, 1)
+    assert (
+        dict((sku, nicho) for sku, nicho, _ in sku_nicho_inserter.list_all())["123"]
+        == "Jardim"
+    )
+
+    # A failed chunk is undone alone, not other pending writes on the connection
+    conn = sku_nicho_inserter.db.conn
+    conn.execute("INSERT INTO sku_nichos (sku, nicho) VALUES ('PENDENTE', 'Casa')")
+
+    def failing_pairs():
+        yield ("D4", "Casa")
+        raise ValueError("linha inválida")
+
+    with pytest.raises(ValueError):
+        sku_nicho_inserter.upsert_many(failing_pairs())
+    assert conn.in_transaction
+    skus = {sku for sku, _, _ in sku_nicho_inserter.list_all()}
+    assert "PENDENTE" in skus and "D4" not in skus
+    conn.commit()
+
+
+def test_sku_nicho_import_writes_on_the_writer(db_service):
+    """With a writer, chunks are upserted on its thread and connection only"""
+    import io
+    import threading
+    from app.repositories.database_repository import DatabaseWriter
+    from app.services.sku_import_service import SkuNichoImporter
+
+    writer = DatabaseWriter(db_service.db_path)
+    writer.connect()
+    inserter = SkuNichoInserter(writer.database)
+    threads = []
+    original = inserter.upsert_many
+
+    def upsert_many(pairs):
+        threads.append(threading.current_thread().name)
+        return original(pairs)
+
+    inserter.upsert_many = upsert_many
+    shared_changes = db_service.database.conn.total_changes
+    try:
+        csv = io.BytesIO(b"sku,nicho\nA1,Casa\nB2,Pet\nC3,Pet\n")
+        report = SkuNichoImporter(inserter, chunk_size=2, writer=writer).import_file(
+            csv, "catalogo.csv"
+        )
+    finally:
+        writer.close()
+    assert report.alteradas == 3
+    assert len(threads) == 2 and all(t.startswith("db-writer") for t in threads)
+    assert db_service.database.conn.total_changes == shared_changes
+    assert len(SkuNichoInserter(db_service.database).list_all()) == 3
+
+
+def test_sku_nicho_cache_follows_writes(db_service, sku_nicho_inserter):
+    """The in-memory map reloads once per write, whoever made it"""
+    from app.services.sku_nicho_cache import SkuNichoCache
+
+    cache = SkuNichoCache(db_service.database)
+    sku_nicho_inserter.insert_many(
+        [{"sku": "A", "nicho": "Casa"}, {"sku": "B", "nicho": "Pet"}]
+    )
+    assert list(cache.lookup(["B", "X", "A", "A"])) == ["Pet", None, "Casa", "Casa"]
+    cache.lookup(["A"])
+    assert cache.loads == 1
+
+    sku_nicho_inserter.update_nicho("A", "Pet")
+    sku_nicho_inserter.delete_sku("B")
+    # A write through another connection is seen too
+    other = sqlite3.connect(db_service.db_path)
+    other.execute("INSERT INTO sku_nichos (sku, nicho) VALUES ('C', 'Jardim')")
+    other.commit()
+    other.close()
+    assert cache.get_many(["A", "B", "C"]) == {"A": "Pet", "C": "Jardim"}
+    assert cache.loads == 2
+    assert cache.status()["nichos"] == 2
+
+
+def test_niche_rules_classify_unmapped_skus(
+    db_service, sku_nicho_inserter, order_inserter
+):
+    """Prefix, regex and keyword rules label unmapped SKUs; a dry run writes nothing"""
+    from app.core.exceptions import ValidationException
+    from app.services.niche_rules import NicheRuleEngine
+    from app.services.order_service import ChangeSet
+    from app.services.sku_nicho_cache import SkuNichoCache
+
+    order_inserter.insert_orders(
+        [
+            {"order": "1", "sku": "CAS-001", "title": "Jogo de panelas"},
+            {"order": "2", "sku": "CAS-PET-9", "title": "Cama para cachorro"},
+            {"order": "3", "sku": "X-77", "title": "Colchão Cama Box"},
+            {"order": "4", "sku": "Z-1", "title": "Cadeira"},
+            {"order": "5", "sku": "MAP-1", "title": "Tapete"},
+        ]
+    )
+    sku_nicho_inserter.insert_one("MAP-1", "Manual")
+    engine = NicheRuleEngine(
+        db_service.database, sku_nicho_inserter, SkuNichoCache(db_service.database)
+    )
+    engine.add_rule("prefixo", "CAS", "Casa")
+    engine.add_rule("prefixo", "CAS-PET", "Pet")
+    engine.add_rule("regex", r"^X-\d+$", "Outros")
+    engine.add_rule("palavra_chave", "cama box", "Quarto", prioridade=5)
+    engine.add_rule("prefixo", "MAP", "Nunca")
+    with pytest.raises(ValidationException):
+        engine.add_rule("regex", "(", "Erro")
+
+    simulado = engine.classify_unmapped(dry_run=True)
+    assert simulado["skus_sem_nicho"] == 4
+    assert {a["sku"]: a["nicho"] for a in simulado["atribuicoes"]} == {
+        "CAS-001": "Casa",
+        "CAS-PET-9": "Pet",
+        "X-77": "Quarto",
+    }
+    assert len(sku_nicho_inserter.list_all()) == 1
+
+    aplicado = engine.classify_unmapped(dry_run=False)
+    assert aplicado["gravados"] == 3
+    rows = {sku: nicho for sku, nicho, _ in sku_nicho_inserter.list_all()}
+    assert rows["MAP-1"] == "Manual" and "Z-1" not in rows
+
+    engine.add_rule("palavra_chave", "cadeira", "Escritório")
+    changes = ChangeSet(
+        rows=[
+            tuple(
+                "Z-1" if c == "sku" else "Cadeira gamer" if c == "title" else None
+                for c in ORDER_COLUMNS
+            )
+        ]
+    )
+    assert engine.classify_changes(changes) == 1
+
+
+def test_sku_nicho_search_pages_filters_and_searches(sku_nicho_inserter):
+    """Paged listing with niche filter, prefix and substring (FTS5) search"""
+    sku_nicho_inserter.insert_many(
+        [{"sku": f"CAS-{i:03d}", "nicho": "Casa"} for i in range(30)]
+        + [{"sku": f"PET-{i:03d}", "nicho": "Pet"} for i in range(10)]
+        + [{"sku": "XCAS-9", "nicho": "Pet"}]
+    )
+    rows, total = sku_nicho_inserter.search(pagina=2, por_pagina=25)
+    assert total == 41 and len(rows) == 16
+    assert [r["sku"] for r in rows][:2] == ["CAS-025", "CAS-026"]
+    rows, total = sku_nicho_inserter.search(nicho="Pet", ordem="desc", por_pagina=3)
+    assert total == 11 and [r["sku"] for r in rows] == ["XCAS-9", "PET-009", "PET-008"]
+    assert sku_nicho_inserter.search(busca="CAS-")[1] == 30
+    rows, total = sku_nicho_inserter.search(busca="cas-00", modo="contem")
+    assert total == 10 and rows[0] == {
+        "sku": "CAS-000",
+        "nicho": "Casa",
+        "created_at": rows[0]["created_at"],
+    }
+    # Renames and deletes are reflected in the trigram index
+    sku_nicho_inserter.db.conn.execute(
+        "UPDATE sku_nichos SET sku = 'ZZ-1' WHERE sku = 'XCAS-9'"
+    )
+    sku_nicho_inserter.delete_sku("CAS-001")
+    assert sku_nicho_inserter.search(busca="CAS", modo="contem")[1] == 29
+    assert sku_nicho_inserter.search(busca="Z-", modo="contem")[1] == 1
+
+
+def test_order_search_ranks_filters_and_follows_upserts(
+    order_inserter, sku_nicho_inserter
+):
+    """Full-text order search with date range, niche filter and paging"""
+    from app.core.exceptions import ValidationException
+
+    order_inserter.insert_orders(
+        [
+            {
+                "order": "1",
+                "sku": "TAP-001",
+                "ad": "MLB100",
+                "title": "Tapete Sala Luminária",
+                "payment_date": "2024-01-10 12:00:00",
+            },
+            {
+                "order": "2",
+                "sku": "LUM-002",
+                "ad": "MLB200",
+                "title": "Luminária de mesa",
+                "payment_date": "2024-01-20 12:00:00",
+            },
+            {
+                "order": "3",
+                "sku": "LUM-002",
+                "ad": "MLB200",
+                "title": "Luminária de mesa",
+                "payment_date": "2024-02-05 12:00:00",
+            },
+            {
+                "order": "4",
+                "sku": "CAD-1",
+                "ad": "MLB300",
+                "title": "Cadeira",
+                "payment_date": "2024-02-06 12:00:00",
+            },
+        ]
+    )
+    sku_nicho_inserter.insert_one("LUM-002", "Casa")
+    search = OrderSearchService(order_inserter.db)
+
+    # Accents and case are folded; words match as prefixes
+    pedidos, total = search.search("lumin")
+    assert total == 3 and {p["order_id"] for p in pedidos} == {"1", "2", "3"}
+    # A SKU hit outweighs a title word
+    pedidos, _ = search.search("lum")
+    assert pedidos[0]["sku"] == "LUM-002" and pedidos[-1]["order_id"] == "1"
+    assert pedidos[0]["nicho"] == "Casa" and pedidos[-1]["nicho"] is None
+    assert search.search("luminaria", data_fim="2024-01-20")[1] == 2
+    assert search.search("luminaria", data_inicio="2024-01-21")[1] == 1
+    assert search.search("luminaria", nicho="Casa")[1] == 2
+    assert search.search("MLB300")[0][0]["order_id"] == "4"
+    pedidos, total = search.search("mesa", ordenar="data", por_pagina=1, pagina=2)
+    assert total == 2 and [p["order_id"] for p in pedidos] == ["2"]
+    # Relevance pages are cut from one fixed window and stop at its end
+    windowed = OrderSearchService(order_inserter.db, rank_window=2)
+    paginas = [windowed.search("lumin", pagina=p, por_pagina=1) for p in (1, 2)]
+    assert [total for _, total in paginas] == [3, 3]
+    assert [p[0]["order_id"] for p, _ in paginas] == ["3", "2"]
+    assert windowed.pageable(3) == 2 and windowed.pageable(3, "data") == 3
+    with pytest.raises(ValidationException):
+        windowed.search("lumin", pagina=3, por_pagina=1)
+    assert len(windowed.search("lumin", ordenar="data", pagina=3, por_pagina=1)[0]) == 1
+    # FTS operators typed by users are plain words
+    assert search.search('cadeira OR "tapete')[1] == 0
+    assert search.search("-- ") == ([], 0)
+
+    # Upserts that change the title move the order in the index
+    order_inserter.insert_orders(
+        [{"order": "4", "sku": "CAD-1", "ad": "MLB300", "title": "Poltrona"}]
+    )
+    assert search.search("cadeira")[1] == 0
+    assert search.search("poltrona")[1] == 1
+    order_inserter.db.cursor.execute("DELETE FROM orders WHERE order_id = '4'")
+    assert search.search("poltrona")[1] == 0
+
+
+def test_order_search_unchanged_by_failed_batch(order_inserter):
+    """A batch rolled back half way leaves the search index matching orders"""
+    import sqlite3
+
+    order = {"cart": "CART1", "order": "1", "sku": "LUM-002", "title": "Luminária de mesa"}
+    order_inserter.insert_orders([order, dict(order, order="2", title="Cadeira")])
+    search = OrderSearchService(order_inserter.db)
+
+    def matches(q):
+        pedidos, total = search.search(q)
+        return total, [(p["order_id"], p["title"]) for p in pedidos]
+
+    before = {q: matches(q) for q in ("luminaria", "cadeira", "abajur")}
+
+    bad = DataParser(
+        [dict(order, title="Abajur"), dict(order, order="2", title={"nome": "Abajur"})]
+    ).parse_orders_columnar()
+    with pytest.raises(sqlite3.Error):
+        order_inserter.insert_changed_columns(bad)
+    # The next batch commits on the same connection
+    order_inserter.insert_orders([dict(order, order="3", title="Vaso")])
+
+    assert {q: matches(q) for q in before} == before
+    assert search.search("vaso")[1] == 1
+
+
+def test_data_version_follows_order_writes(order_inserter, sku_nicho_inserter):
+    """Range versions move only when orders of the range are written or deleted"""
+    orders = {
+        "CART1": [
+            {"order_id": "V1", "sku": "SKU1", "payment_date": "2024-03-01 12:00:00"},
+            {"order_id": "V2", "sku": "SKU2", "payment_date": "2024-03-02 12:00:00"},
+        ]
+    }
+    order_inserter.insert_changed_orders(orders)
+    versions = DataVersionService(order_inserter.db)
+    marco = versions.orders_version("2024-03-01", "2024-03-31")
+    abril = versions.orders_version("2024-04-01", "2024-04-30")
+    assert marco.etag.startswith('W/"') and marco.last_modified is not None
+    assert marco.matches(f'"x", {marco.etag}') and not marco.matches(abril.etag)
+
+    # Unchanged orders are not rewritten
+    order_inserter.insert_changed_orders(orders)
+    assert versions.orders_version("2024-03-01", "2024-03-31") == marco
+
+    # Moving an order to April changes both months
+    orders["CART1"][1]["payment_date"] = "2024-04-02 12:00:00"
+    order_inserter.insert_changed_orders(orders)
+    moved = versions.orders_version("2024-03-01", "2024-03-31")
+    assert moved != marco
+    assert versions.orders_version("2024-04-01", "2024-04-30") != abril
+    assert versions.orders_version("2024-03-02", "2024-03-31").last_modified is not None
+
+    order_inserter.db.cursor.execute("DELETE FROM orders WHERE order_id = 'V1'")
+    assert versions.orders_version("2024-03-01", "2024-03-31") != moved
+
+    # Reports also follow the SKU/niche map
+    relatorio = versions.report_version("2024-03-01", "2024-03-31")
+    sku_nicho_inserter.insert_one("SKU1", "Casa")
+    assert versions.report_version("2024-03-01", "2024-03-31") != relatorio
+    with pytest.raises(ValueError):
+        versions.orders_version("01/03/2024", "2024-03-31")
+
+
 def test_sku_nicho_update(sku_nicho_inserter):
     """Test updating a SKU's nicho"""
     # Clear existing data
@@ -205,3 +549,633 @@ def test_data_parser():
     assert isinstance(parsed, list)
     assert len(parsed) == 1
     assert parsed[0]["cart_id"] == "CART123"
+
+
+@pytest.fixture
+def ml_model_paths(tmp_path, monkeypatch):
+    """Redirect ML model files to a temporary directory"""
+    from app.services import ml_service
+
+    monkeypatch.setattr(ml_service, "MODEL_PATH_STR", str(tmp_path / "model.pkl"))
+    monkeypatch.setattr(
+        ml_service, "NATIVE_MODEL_PATH_STR", str(tmp_path / "model.txt")
+    )
+    monkeypatch.setattr(
+        ml_service, "MODEL_METADATA_PATH_STR", str(tmp_path / "model.json")
+    )
+    monkeypatch.setattr(ml_service, "_model_cache", {})
+    return tmp_path
+
+
+def make_orders_df(n_orders=200, nichos=("Casa", "Pet")):
+    """Build a synthetic orders dataframe with the columns used by the ML code"""
+    import pandas as pd
+
+    rows = []
+    for i in range(n_orders):
+        rows.append(
+            {
+                "order_id": f"ORD{i}",
+                "sku": f"SKU{i % 10}",
+                "nicho": nichos[i % len(nichos)],
+                "store": i % 3,
+                "payment_date": f"2024-01-{1 + i % 28:02d} {i % 24:02d}:00:00",
+                "gross_profit": 50.0 + i % 7,
+                "taxes": 5.0,
+                "freight": 3.0 + i % 2,
+                "cost": 20.0,
+                "total_value": 100.0 + i % 5,
+                "quantity": 1 + i % 3,
+                "profit": 20.0 + i % 7,
+            }
+        )
+    return pd.DataFrame(rows)
+
+
+def test_train_exports_native_model(ml_model_paths):
+    """Training writes a native booster plus metadata and loading prefers it"""
+    import lightgbm as lgb
+    from app.services import ml_service
+
+    ml_service.train_ml_model(make_orders_df())
+
+    metadata = ml_service.load_model_metadata()
+    assert metadata["features"] == ml_service.FEATURES
+    assert metadata["janela_treino"]["inicio"].startswith("2024-01")
+    assert metadata["metricas"]["amostras"] > 0
+
+    model = ml_service.load_model()
+    assert isinstance(model, lgb.Booster)
+    assert ml_service.load_model() is model
+
+    forecast, conclusions = ml_service.predict_sales_for_df(make_orders_df())
+    assert len(forecast) == 7
+    assert conclusions
+
+
+def test_partitioned_models_route_with_global_fallback(ml_model_paths):
+    """Per-niche models are trained on a pool and small niches use the global model"""
+    import numpy as np
+    from app.services import ml_service
+
+    df = make_orders_df(n_orders=300)
+    df.loc[:4, "nicho"] = "Raro"
+    ml_service.train_ml_model(df)
+    index = ml_service.train_partitioned_models(
+        df,
+        partition="nicho",
+        max_workers=2,
+        min_samples=20,
+        model_dir=str(ml_model_paths / "particoes"),
+    )
+    assert set(index["modelos"]) == {"Casa", "Pet"}
+
+    _, models = ml_service.load_partitioned_models(str(ml_model_paths / "particoes"))
+    global_model = ml_service.load_model()
+    router = ml_service.PartitionedModelRouter("nicho", models, fallback=global_model)
+    df_feat = ml_service.extract_features(df).fillna(0)
+    predictions = router.predict(df_feat)
+
+    raro = (df_feat["nicho"] == "Raro").to_numpy()
+    pet = (df_feat["nicho"] == "Pet").to_numpy()
+    X = df_feat[ml_service.FEATURES]
+    assert np.allclose(predictions[raro], global_model.predict(X[raro]))
+    assert np.allclose(predictions[pet], models["Pet"].predict(X[pet]))
+
+    # Retraining writes a new version and swaps the index in one rename; the
+    # previous version stays for readers still loading it, older ones go
+    model_dir = ml_model_paths / "particoes"
+    (model_dir / "20000101-000000-000000").mkdir()
+    retrained = ml_service.train_partitioned_models(
+        df, partition="nicho", max_workers=2, min_samples=20, model_dir=str(model_dir)
+    )
+    assert retrained["versao"] != index["versao"]
+    assert sorted(p.name for p in model_dir.iterdir()) == sorted(
+        [index["versao"], retrained["versao"], "index.json"]
+    )
+    _, models = ml_service.load_partitioned_models(str(model_dir))
+    assert set(models) == {"Casa", "Pet"}
+
+
+def test_async_data_client_retries_transient_errors():
+    """Async client retries 5xx responses and decodes the JSON body"""
+    import asyncio
+    import httpx
+    from app.services.data_service import AsyncDataClient
+
+    calls = []
+
+    def handler(request):
+        calls.append(str(request.url))
+        if len(calls) == 1:
+            return httpx.Response(503)
+        return httpx.Response(200, json={"CART1": [{"order": "ORD1"}]})
+
+    client = AsyncDataClient(
+        "token",
+        base_url="http://api.test",
+        retry_wait_min=0,
+        retry_wait_max=0,
+        transport=httpx.MockTransport(handler),
+    )
+
+    async def run():
+        try:
+            return await client.get_sells("2024-01-01", "2024-01-02")
+        finally:
+            await client.aclose()
+
+    assert asyncio.run(run()) == {"CART1": [{"order": "ORD1"}]}
+    assert calls == ["http://api.test/sells?r=2024-01-01/2024-01-02"] * 2
+
+
+def test_async_data_client_closes_client_of_previous_loop():
+    """A new event loop gets a new pool and the previous one is closed"""
+    import asyncio
+    import httpx
+    from app.services.data_service import AsyncDataClient
+
+    client = AsyncDataClient(
+        "token",
+        base_url="http://api.test",
+        transport=httpx.MockTransport(lambda request: httpx.Response(200, json={})),
+    )
+
+    async def fetch():
+        await client.get_sells("2024-01-01")
+        return client._client
+
+    first = asyncio.run(fetch())
+    second = asyncio.run(fetch())
+    assert second is not first
+    assert first.is_closed and not second.is_closed
+    asyncio.run(client.aclose())
+
+
+def test_async_data_client_rejects_oversized_response():
+    """Async client enforces the response size limit"""
+    import asyncio
+    import httpx
+    from app.core.exceptions import APIException
+    from app.services.data_service import AsyncDataClient
+
+    client = AsyncDataClient(
+        "token",
+        base_url="http://api.test",
+        max_response_bytes=10,
+        transport=httpx.MockTransport(
+            lambda request: httpx.Response(200, json={"CART1": ["x" * 50]})
+        ),
+    )
+    with pytest.raises(APIException):
+        asyncio.run(client.get_sells("2024-01-01"))
+
+
+def test_order_insert_changed_only(order_inserter):
+    """Unchanged orders are skipped; new and changed ones are written and reported"""
+    order_inserter.db.cursor.execute("DELETE FROM orders")
+    order_inserter.db.cursor.execute("DELETE FROM order_hashes")
+    order_inserter.db.commit()
+    orders = {
+        "CART1": [
+            {
+                "order_id": "ORD1",
+                "sku": "SKU1",
+                "profit": 10.0,
+                "payment_date": "2024-01-01 10:00:00",
+            },
+            {
+                "order_id": "ORD2",
+                "sku": "SKU2",
+                "profit": 5.0,
+                "payment_date": "2024-01-01 11:00:00",
+            },
+        ]
+    }
+    changes = order_inserter.insert_changed_orders(orders)
+    assert len(changes) == 2
+    assert changes.new_order_ids == {"ORD1", "ORD2"}
+
+    assert len(order_inserter.insert_changed_orders(orders)) == 0
+
+    orders["CART1"][1]["profit"] = 7.5
+    orders["CART1"].append(
+        {"order_id": "ORD3", "sku": "SKU3", "payment_date": "2024-01-01 12:00:00"}
+    )
+    changes = order_inserter.insert_changed_orders(orders)
+    assert changes.seen == 3
+    assert [r["order_id"] for r in changes.records()] == ["ORD2", "ORD3"]
+    assert changes.new_order_ids == {"ORD3"}
+    assert changes.max_payment_date() == "2024-01-01 09:00:00"
+
+    cursor = order_inserter.db.conn.cursor()
+    cursor.execute("SELECT profit FROM orders WHERE order_id = 'ORD2'")
+    assert cursor.fetchone()[0] == 7.5
+
+
+def test_streaming_parser_matches_data_parser():
+    """Streaming parser yields the same orders as DataParser for any chunking"""
+    import json
+    from app.services.data_parser_service import StreamingOrderParser
+
+    order = {
+        "ad": "MLB1",
+        "sku": "SKU1",
+        "profit": 1.5,
+        "title": "Caneca “café” ☕",
+        "quantity": 1,
+        "total_value": 20.0,
+        "payment_date": "2024-01-01 10:00:00",
+        "status": "paid",
+        "store": 2,
+    }
+    cart_payload = {
+        "CART1": [dict(order, order="ORD1"), dict(order, order="ORD2")],
+        "CART2": [],
+        "CART3": [dict(order, order="ORD3", fraction=0.5)],
+    }
+    list_payload = [dict(order, order="ORD4", cart="CART4")]
+
+    for payload in (cart_payload, list_payload):
+        body = json.dumps(payload, indent=2, ensure_ascii=False).encode()
+        expected = DataParser(payload).parse_orders()
+        for size in (1, 7, len(body)):
+            parser = StreamingOrderParser()
+            parsed = []
+            for i in range(0, len(body), size):
+                parsed.extend(parser.feed(body[i : i + size]))
+            parsed.extend(parser.close())
+            assert parsed == expected
+
+
+def test_streaming_parser_rejects_malformed_payloads():
+    """Truncated or malformed bodies raise ValidationException"""
+    from app.core.exceptions import ValidationException
+    from app.services.data_parser_service import StreamingOrderParser
+
+    for body in (b'{"CART1": [{"order": "ORD1"', b'"texto"', b'[{"order": 1} {}]'):
+        parser = StreamingOrderParser()
+        with pytest.raises(ValidationException):
+            parser.feed(body)
+            parser.close()
+
+    parser = StreamingOrderParser(max_item_chars=10)
+    with pytest.raises(ValidationException):
+        parser.feed(b'[{"order": "' + b"x" * 50)
+
+    assert StreamingOrderParser().close() == []
+
+
+def test_streamed_ingest_writes_in_batches(order_inserter):
+    """Orders streamed by the async client are written batch by batch"""
+    import asyncio
+    import httpx
+    from app.services.data_parser_service import aiter_order_batches
+    from app.services.data_service import AsyncDataClient
+
+    order_inserter.db.cursor.execute("DELETE FROM orders")
+    order_inserter.db.cursor.execute("DELETE FROM order_hashes")
+    order_inserter.db.commit()
+    payload = {
+        "CART1": [
+            {
+                "order": f"ORD{i}",
+                "ad": "MLB1",
+                "sku": "SKU1",
+                "profit": 1.0,
+                "title": "Produto",
+                "quantity": 1,
+                "total_value": 10.0,
+                "payment_date": "2024-01-01 10:00:00",
+                "status": "paid",
+                "store": 1,
+            }
+            for i in range(5)
+        ]
+    }
+    client = AsyncDataClient(
+        "token",
+        base_url="http://api.test",
+        transport=httpx.MockTransport(
+            lambda request: httpx.Response(200, json=payload)
+        ),
+    )
+    batch_sizes = []
+    original = order_inserter.insert_changed_columns
+
+    def insert_changed_columns(columns):
+        batch_sizes.append(len(columns))
+        return original(columns)
+
+    order_inserter.insert_changed_columns = insert_changed_columns
+    downstream = []
+
+    async def on_changes(batch_changes):
+        downstream.append([r["order_id"] for r in batch_changes.records()])
+
+    async def run():
+        try:
+            return await order_inserter.insert_changed_batches(
+                aiter_order_batches(client.stream_sells("2024-01-01"), 2),
+                on_changes=on_changes,
+            )
+        finally:
+            await client.aclose()
+
+    changes = asyncio.run(run())
+    assert batch_sizes == [2, 2, 1]
+    assert downstream == [["ORD0", "ORD1"], ["ORD2", "ORD3"], ["ORD4"]]
+    # The aggregate keeps ids and days, not the written rows
+    assert changes.seen == 5 and len(changes) == 5
+    assert changes.new_order_ids == {f"ORD{i}" for i in range(5)}
+    assert changes.days == {"2024-01-01"}
+    assert changes.max_payment_date() == "2024-01-01 07:00:00"
+
+
+def test_failed_batch_is_rolled_back(order_inserter):
+    """A batch that fails half way leaves nothing behind for the next commit"""
+    import sqlite3
+    from app.services.order_service import content_hash
+
+    order = {
+        "cart": "CART1",
+        "order": "ORD1",
+        "sku": "SKU1",
+        "title": "Luminária",
+        "quantity": 1,
+        "total_value": 10.0,
+        "payment_date": "2024-01-01 10:00:00",
+    }
+    order_inserter.insert_orders([order])
+    hashes = order_inserter.db.conn.execute("SELECT * FROM order_hashes").fetchall()
+
+    # The dict path skips the row sqlite3 cannot bind and writes the rest
+    order_inserter.insert_orders(
+        [dict(order, title={"nome": "Abajur"}), dict(order, order="ORD2", title="Abajur")]
+    )
+    assert order_inserter.db.conn.execute(
+        "SELECT order_id, title FROM orders ORDER BY order_id"
+    ).fetchall() == [("ORD1", "Luminária"), ("ORD2", "Abajur")]
+
+    # A batch failing inside the write is undone before the next one commits
+    bad = DataParser([dict(order, title={"nome": "Abajur"})]).parse_orders_columnar()
+    with pytest.raises(sqlite3.Error):
+        order_inserter.insert_changed_columns(bad)
+    assert not order_inserter.db.conn.in_transaction
+    order_inserter.insert_orders([dict(order, order="ORD3", title="Vaso")])
+
+    conn = order_inserter.db.conn
+    assert conn.execute("SELECT title FROM orders WHERE order_id = 'ORD1'").fetchone() == ("Luminária",)
+    assert conn.execute(
+        "SELECT content_hash FROM order_hashes WHERE order_id = 'ORD1'"
+    ).fetchall() == [hashes[0][1:]]
+    assert conn.execute(
+        "SELECT rowid FROM orders_fts WHERE orders_fts MATCH 'luminaria'"
+    ).fetchall() == conn.execute("SELECT rowid FROM orders WHERE order_id = 'ORD1'").fetchall()
+    assert content_hash(order_inserter._build_rows([order])[0]) == hashes[0][1]
+
+
+def test_columnar_parse_matches_row_path(order_inserter):
+    """Columnar batches produce the same rows (and hashes) as the dict path"""
+    from app.services.order_service import content_hash
+
+    order = {
+        "ad": "MLB1",
+        "sku": "SKU1",
+        "profit": 1.5,
+        "title": "Produto",
+        "quantity": 2,
+        "total_value": 20.0,
+        "payment_date": "2024-01-01 02:00:00",
+        "status": "paid",
+        "store": 2,
+    }
+    cart_payload = {
+        "CART1": [dict(order, order="ORD1"), dict(order, order="ORD2", cost=3.0)],
+        "CART2": [dict(order, order="ORD3", payment_date="2024-01-02T10:30:00")],
+    }
+    list_payload = [
+        dict(order, order="ORD4", cart="CART4"),
+        {"order": "ORD5", "payment_date": ""},
+    ]
+    for payload in (cart_payload, list_payload):
+        parser = DataParser(payload)
+        expected = order_inserter._build_rows(parser.parse_orders())
+        rows = parser.parse_orders_columnar().rows()
+        assert sorted(rows) == sorted(expected)
+        assert {content_hash(r) for r in rows} == {content_hash(r) for r in expected}
+
+    assert DataParser(cart_payload).parse_orders_columnar().columns["payment_date"] == [
+        "2023-12-31 23:00:00",
+        "2023-12-31 23:00:00",
+        "2024-01-02 07:30:00",
+    ]
+
+
+def test_columnar_parse_requires_cart_order_keys():
+    """Cart payloads missing a required key raise ValidationException"""
+    from app.core.exceptions import ValidationException
+
+    with pytest.raises(ValidationException):
+        DataParser({"CART1": [{"order": "ORD1"}]}).parse_orders_columnar()
+
+
+def test_streamed_ingest_follows_pagination():
+    """Pages linked by X-Next-Page are parsed as separate JSON documents"""
+    import asyncio
+    import httpx
+    from app.services.data_parser_service import aiter_order_batches
+    from app.services.data_service import AsyncDataClient
+
+    def handler(request):
+        page = int(request.url.params.get("page", 0))
+        orders = [{"order": f"ORD{page}-{i}", "cart": f"CART{page}"} for i in range(3)]
+        headers = {"X-Next-Page": f"/sells?r=2024-01-01&page={page + 1}"}
+        return httpx.Response(200, json=orders, headers=headers if page < 2 else {})
+
+    client = AsyncDataClient(
+        "token", base_url="http://api.test", transport=httpx.MockTransport(handler)
+    )
+
+    async def run():
+        try:
+            return [
+                batch.columns["order_id"]
+                async for batch in aiter_order_batches(
+                    client.stream_sells("2024-01-01"), 2
+                )
+            ]
+        finally:
+            await client.aclose()
+
+    batches = asyncio.run(run())
+    assert [len(batch) for batch in batches] == [2, 1, 2, 1, 2, 1]
+    assert sum(batches, []) == [f"ORD{p}-{i}" for p in range(3) for i in range(3)]
+
+
+def test_report_cache_recomputes_once_for_concurrent_readers():
+    """Concurrent readers share one recomputation; stale snapshots are refreshed"""
+    import asyncio
+    import time
+    from datetime import datetime
+    from app.services.report_cache import DailyReportCache
+
+    class SlowReportService:
+        def __init__(self):
+            self.calls = 0
+
+        def get_daily_report_data(self):
+            self.calls += 1
+            time.sleep(0.05)
+            return {"dia": datetime.today().strftime("%Y-%m-%d"), "status": "sucesso"}
+
+    service = SlowReportService()
+    cache = DailyReportCache(service)
+
+    async def run():
+        return await asyncio.gather(*(cache.get() for _ in range(20)))
+
+    snapshots = asyncio.run(run())
+    assert service.calls == 1
+    assert {s.version for s in snapshots} == {1}
+    assert snapshots[0].message("relatorio_diario_inicial") is snapshots[0].message(
+        "relatorio_diario_inicial"
+    )
+
+    cache.publish({"dia": "2000-01-01", "status": "sucesso"})
+    snapshot = asyncio.run(cache.get())
+    assert service.calls == 2
+    assert snapshot.version == 3
+
+
+def test_report_cache_revalidates_against_order_writes(
+    db_service, order_inserter, report_service
+):
+    """A worker that did not write the orders (a follower) drops its stale report"""
+    import asyncio
+    from datetime import datetime
+    from app.services.data_version import DataVersionService
+    from app.services.report_cache import DailyReportCache
+
+    hoje = datetime.today().strftime("%Y-%m-%d")
+    cache = DailyReportCache(report_service, DataVersionService(db_service.database))
+    first = asyncio.run(cache.get())
+    assert asyncio.run(cache.get()) is first
+
+    order_inserter.insert_orders(
+        [{"order": "FOLLOWER-1", "sku": "SKU1", "payment_date": f"{hoje} 15:00:00"}]
+    )
+    second = asyncio.run(cache.get())
+    assert second is not first and cache.recomputations == 2
+    assert asyncio.run(cache.get()) is second
+
+
+def test_subscription_projects_daily_report(report_service, sku_nicho_inserter):
+    """Niche/store subscriptions get exact filtered KPIs and only matching sales"""
+    from datetime import datetime
+    from app.core.exceptions import ValidationException
+    from app.services.report_cache import ReportSnapshot
+    from app.services.report_subscription import Subscription, project_report
+
+    hoje = datetime.today().strftime("%Y-%m-%d")
+    db = report_service.db
+    db.cursor.execute("DELETE FROM orders")
+    db.cursor.execute("DELETE FROM sku_nichos")
+    db.commit()
+    sku_nicho_inserter.insert_one("SKU-A", "Casa")
+    sku_nicho_inserter.insert_one("SKU-B", "Pet")
+    rows = [
+        ("O1", "SKU-A", 1, 100.0, 10.0, "loja1"),
+        ("O2", "SKU-A", 2, 50.0, -5.0, "loja2"),
+        ("O3", "SKU-B", 3, 30.0, 3.0, "loja1"),
+        ("O4", "SKU-C", 1, 20.0, 2.0, "loja1"),
+    ]
+    for i, (order_id, sku, qty, value, profit, store) in enumerate(rows):
+        db.cursor.execute(
+            """
+            INSERT INTO orders (order_id, sku, quantity, total_value, payment_date, profit, store)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """,
+            (order_id, sku, qty, value, f"{hoje} 10:0{i}:00", profit, store),
+        )
+    db.commit()
+    report = report_service.get_daily_report_data()
+    assert report["status"] == "sucesso"
+
+    casa = project_report(report, Subscription(nichos=frozenset({"Casa"})))
+    assert casa["kpis_diarios"] == {
+        "lucro_liquido": 5.0,
+        "faturamento": 150.0,
+        "total_pedidos": 2,
+        "total_unidades": 3,
+    }
+    assert [n["nicho"] for n in casa["analise_por_nicho_dia"]] == ["Casa"]
+    assert {v["order_id"] for v in casa["ultimas_15_vendas"]} == {"O1", "O2"}
+    assert casa["ultima_venda"]["order_id"] == "O2"
+
+    loja1 = Subscription.from_message({"loja": "loja1", "secoes": ["kpis_diarios"]})
+    projected = project_report(report, loja1)
+    assert set(projected) == {"dia", "status", "timestamp_atualizacao", "inscricao"} | {
+        "kpis_diarios"
+    }
+    assert projected["kpis_diarios"]["total_pedidos"] == 3
+    assert projected["kpis_diarios"]["faturamento"] == 150.0
+
+    assert project_report(report, Subscription()) is report
+    with pytest.raises(ValidationException):
+        Subscription.from_message({"secoes": ["inexistente"]})
+
+    # Equal subscriptions share one encoded message per snapshot
+    snapshot = ReportSnapshot(1, report, datetime.now())
+    other = Subscription.from_message({"nichos": ["Casa"]})
+    assert snapshot.message("relatorio_diario", other) is snapshot.message(
+        "relatorio_diario", Subscription(nichos=frozenset({"Casa"}))
+    )
+
+
+def test_sqlite_report_bus_delivers_to_other_workers(db_service):
+    """Rows published by one bus reach the others, never the publisher itself"""
+    import asyncio
+    from app.services.report_bus import ReportBus, SQLiteReportBus, create_report_bus
+
+    class IncompleteBus(ReportBus):
+        backend = "incompleto"
+
+    # A backend without _publish fails when built, not on its first report
+    with pytest.raises(TypeError):
+        IncompleteBus()
+    # Under leader election the in-memory bus would never reach the followers
+    bus = create_report_bus("memoria", db_service.database, cross_process=True)
+    assert isinstance(bus, SQLiteReportBus)
+
+    producer = SQLiteReportBus(db_service.database, retention=3)
+    consumer = SQLiteReportBus(db_service.database)
+    received = {"producer": [], "consumer": []}
+
+    async def on_consumer(report):
+        received["consumer"].append(report["versao"])
+
+    async def on_producer(report):
+        received["producer"].append(report["versao"])
+
+    consumer.subscribe(on_consumer)
+    producer.subscribe(on_producer)
+
+    async def run():
+        await producer.publish({"versao": 0})
+        await consumer.start()
+        await producer.start()
+        for versao in (1, 2, 3):
+            await producer.publish({"versao": versao})
+        await consumer.poll()
+        await producer.poll()
+        await consumer.stop()
+        await producer.stop()
+
+    asyncio.run(run())
+    # Published before start: not replayed
+    assert received == {"producer": [], "consumer": [1, 2, 3]}
+    count = db_service.database.cursor.execute(
+        "SELECT COUNT(*) FROM report_bus"
+    ).fetchone()[0]
+    assert count == 3